@@ -12,7 +12,10 @@ from typing import List, Optional
 import logging
 import uuid
 
+from app.core.concurrency import run_blocking
 from app.services.rag_service import rag_service
+from app.services.llm_pool import sticky_conversation
+from app.services.llm_scheduler import LLMOverloadedError
 from app.services.agentic_rag import get_agentic_rag_service
 from app.services.state_manager import state_manager
 from app.services.pedagogical_graph import pedagogical_graph
@@ -152,7 +155,8 @@ async def chat(http_request: Request, request: ChatRequest):
         logger.info(f"Chat request from conversation {request.conversation_id}")
 
         # Get RAG service
-        result = await rag_service.query(request.message)
+        with sticky_conversation(request.conversation_id):  # Same LLM backend for the whole conversation
+            result = await rag_service.query(request.message)
 
         # Get interaction ID from analytics middleware
         interaction_id = getattr(http_request.state, 'interaction_id', str(uuid.uuid4()))
@@ -165,6 +169,8 @@ async def chat(http_request: Request, request: ChatRequest):
             interaction_id=interaction_id
         )
 
+    except LLMOverloadedError:
+        raise  # 429/503 via the handler in main.py
     except Exception as e:
         logger.error(f"Chat endpoint error: {e}")
         raise HTTPException(
@@ -177,6 +183,9 @@ class AgenticChatResponse(ChatResponse):
     workflow_path: str
     rewrites_used: int
     was_rewritten: bool
+    degradations: List[str] = Field(default_factory=list,
+                                    description="Shortcuts taken to answer within the deadline (e.g. skip_grading)")
+    token_count: Optional[int] = Field(None, description="Prompt + answer tokens of the generation call")
 
 class PedagogicalChatResponse(BaseModel):
     """
@@ -221,11 +230,12 @@ async def chat_agentic(http_request: Request, request: ChatRequest):
     try:
         logger.info(f"Agentic chat request from conversation {request.conversation_id}")
 
-        # Get agentic RAG service
-        rag_service = get_agentic_rag_service()
+        # Get agentic RAG service (first call loads models, so off the event loop too)
+        rag_service = await run_blocking(get_agentic_rag_service)
 
-        # Query with self-correction
-        result = rag_service.query(request.message, max_retries=2)
+        # Query with self-correction (blocking graph.invoke runs on the worker pool)
+        with sticky_conversation(request.conversation_id):  # Same LLM backend for the whole conversation
+            result = await run_blocking(rag_service.query, request.message, max_retries=2)
 
         # Get interaction ID from analytics middleware
         interaction_id = getattr(http_request.state, 'interaction_id', str(uuid.uuid4()))
@@ -238,9 +248,13 @@ async def chat_agentic(http_request: Request, request: ChatRequest):
             workflow_path=result["workflow_path"],
             rewrites_used=result["rewrites_used"],
             was_rewritten=result["was_rewritten"],
+            degradations=result.get("degradations", []),
+            token_count=result.get("token_count"),
             interaction_id=interaction_id
         )
 
+    except LLMOverloadedError:
+        raise  # 429/503 via the handler in main.py
     except Exception as e:
         logger.error(f"Agentic chat endpoint error: {e}")
         raise HTTPException(
@@ -260,8 +274,8 @@ async def compare_rag_types(question: str):
         simple_result = await rag_service.query(question)
 
         # Agentic RAG
-        agentic_rag = get_agentic_rag_service()
-        agentic_result = agentic_rag.query(question)
+        agentic_rag = await run_blocking(get_agentic_rag_service)
+        agentic_result = await run_blocking(agentic_rag.query, question)
 
         return {
             "question": question,
@@ -277,6 +291,8 @@ async def compare_rag_types(question: str):
             }
         }
 
+    except LLMOverloadedError:
+        raise  # 429/503 via the handler in main.py
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -347,7 +363,9 @@ async def chat_pedagogical(http_request: Request, request: ChatRequest):
 
         # Use route_phase to determine which node to execute based on user message
         # This ensures we route to the correct phase for new messages
-        target_phase = route_phase(graph_state)
+        # (routing and the nodes call the LLM, so they run on the blocking work pool)
+        with sticky_conversation(request.conversation_id):  # Same LLM backend for the whole conversation
+            target_phase = await run_blocking(route_phase, graph_state)
 
         phase_node_map = {
             "INITIAL": initial_node,
@@ -359,7 +377,8 @@ async def chat_pedagogical(http_request: Request, request: ChatRequest):
 
         # Execute the appropriate node based on routing decision
         node_function = phase_node_map.get(target_phase, initial_node)
-        result = node_function(graph_state)
+        with sticky_conversation(request.conversation_id):
+            result = await run_blocking(node_function, graph_state)
 
         # Validate response completeness
         response_text = result["generation"]
@@ -391,7 +410,9 @@ async def chat_pedagogical(http_request: Request, request: ChatRequest):
             problem_statement=updated_state.problem_statement,
             last_user_message=updated_state.last_user_message,
             last_ai_response=updated_state.last_ai_response,
-            phase_history=updated_state.phase_history
+            phase_history=updated_state.phase_history,
+            routed_from=updated_state.routed_from,
+            routed_by=updated_state.routed_by
         )
 
         # Get interaction ID from analytics middleware
@@ -408,6 +429,8 @@ async def chat_pedagogical(http_request: Request, request: ChatRequest):
             interaction_id=interaction_id
         )
 
+    except LLMOverloadedError:
+        raise  # 429/503 via the handler in main.py
     except Exception as e:
         logger.error(f"Pedagogical chat endpoint error: {e}")
         raise HTTPException(
@@ -11,9 +11,14 @@ import json
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import AsyncGenerator
 
+from ..core.concurrency import run_blocking
 from ..services.agentic_rag import get_agentic_rag_service_async
+from ..services.llm_pool import sticky_conversation
+from ..services.llm_scheduler import LLMOverloadedError
 from ..services.state_manager import state_manager
 from ..services.pedagogical_graph import pedagogical_graph
+from ..models.pedagogical_state import TutoringPhase
+from ..middleware.analytics_middleware import log_websocket_interaction
 
 logger = logging.getLogger(__name__)
 
@@ -29,9 +34,11 @@ async def websocket_chat_endpoint(websocket: WebSocket):
     - Client sends: JSON {"message": "user question", "max_retries": 2}
     - Server sends: JSON events with type field:
         - {"type": "workflow", "node": "retrieve", "message": "Running retrieve..."}
+        - {"type": "queue", "position": 3, "message": "Waiting for the tutor model..."}
         - {"type": "token", "content": "word"}
-        - {"type": "complete", "answer": "...", "sources": [...], ...}
+        - {"type": "complete", "answer": "...", "sources": [...], "degradations": [...], ...}
         - {"type": "error", "message": "error description"}
+          (with "code": 429/503 and "retry_after" when the LLM server is overloaded)
     """
     await websocket.accept()
     logger.info(f"WebSocket connection established")
@@ -59,9 +66,25 @@ async def websocket_chat_endpoint(websocket: WebSocket):
                 rag_service = await get_agentic_rag_service_async()
 
                 # Stream the response
-                async for event in rag_service.query_stream(user_message, max_retries):
-                    # Send each event to client
-                    await websocket.send_json(event)
+                complete = None
+                with sticky_conversation(message_data.get("conversation_id")):  # Same LLM backend per conversation
+                    async for event in rag_service.query_stream(user_message, max_retries):
+                        # Send each event to client
+                        await websocket.send_json(event)
+                        if event["type"] == "complete":
+                            complete = event
+
+                if complete is not None and complete["answer"]:
+                    await log_websocket_interaction(
+                        conversation_id=message_data.get("conversation_id") or "unknown",
+                        user_message=user_message,
+                        ai_response=complete["answer"],
+                        source_materials=complete.get("sources"),
+                        workflow_events=complete.get("workflow_path", "").split(" → "),
+                        slm_prompt=complete.get("slm_prompt"),
+                        degradations=complete.get("degradations"),
+                        token_count=complete.get("token_count")
+                    )
 
                 logger.info("Response streaming completed")
 
@@ -101,14 +124,15 @@ async def websocket_pedagogical_chat_endpoint(websocket: WebSocket, conversation
     - Server sends: JSON events with type field:
         - {"type": "phase_change", "phase": "explanation", "message": "Breaking down the problem"}
         - {"type": "workflow", "node": "EXPLANATION", "message": "Running explanation phase..."}
-        - {"type": "token", "content": "word"}
+        - {"type": "queue", "position": 3, "message": "Waiting for the tutor model..."}
+        - {"type": "token", "content": "word"}  (streamed as the LLM generates)
         - {"type": "complete", "answer": "...", "current_phase": "explanation", ...}
         - {"type": "error", "message": "error description"}
 
     Features:
     - Tracks tutoring phase across messages
     - Provides phase change notifications
-    - Maintains conversation state
+    - Maintains conversation state (saved once the answer has finished streaming)
     - Socratic guidance instead of direct answers
     """
     await websocket.accept()
@@ -152,65 +176,52 @@ async def websocket_pedagogical_chat_endpoint(websocket: WebSocket, conversation
                     "generation": ""
                 }
 
-                # Import node functions and route_phase function
-                from ..services.pedagogical_graph import (
-                    initial_node, explanation_node, implementation_node,
-                    debugging_node, reflection_node, route_phase
-                )
+                from ..services.pedagogical_graph import route_phase, stream_phase_node
 
                 # Use route_phase to determine which node to execute
-                target_phase = route_phase(graph_state)
-
-                phase_node_map = {
-                    "INITIAL": initial_node,
-                    "EXPLANATION": explanation_node,
-                    "IMPLEMENTATION": implementation_node,
-                    "DEBUGGING": debugging_node,
-                    "REFLECTION": reflection_node
-                }
+                # (routing may call the LLM, so it runs on the blocking work pool)
+                with sticky_conversation(conversation_id):  # Every LLM call for this conversation goes to one backend
+                    target_phase = await run_blocking(route_phase, graph_state)
+                phase = TutoringPhase[target_phase] if target_phase in TutoringPhase.__members__ else TutoringPhase.INITIAL
 
-                # Execute the appropriate node
-                node_function = phase_node_map.get(target_phase, initial_node)
-                result = node_function(graph_state)
-                updated_state = result["pedagogical_state"]
+                # Notify about phase change before the answer starts streaming
+                if previous_phase != phase.value:
+                    await websocket.send_json({
+                        "type": "phase_change",
+                        "phase": phase.value,
+                        "message": pedagogical_state.model_copy(update={"current_phase": phase}).get_phase_summary()
+                    })
 
-                # Update state with results
+                # Send workflow step notification
+                await websocket.send_json({
+                    "type": "workflow",
+                    "node": phase.name,
+                    "message": f"Running {phase.value} phase..."
+                })
+
+                # Forward queue positions and tokens as the LLM produces them
+                result = None
+                with sticky_conversation(conversation_id):
+                    async for event in stream_phase_node(phase.name, graph_state):
+                        if event["type"] == "result":
+                            result = event
+                        else:
+                            await websocket.send_json(event)
+
+                # Commit the state only once the whole answer has been streamed
+                updated_state = result["pedagogical_state"]
                 state_manager.update_state(
                     conversation_id,
                     current_phase=updated_state.current_phase,
                     problem_statement=updated_state.problem_statement,
                     last_user_message=updated_state.last_user_message,
                     last_ai_response=updated_state.last_ai_response,
-                    phase_history=updated_state.phase_history
+                    phase_history=updated_state.phase_history,
+                    routed_from=updated_state.routed_from,
+                    routed_by=updated_state.routed_by
                 )
-
-                # Notify about phase change if it occurred
-                if previous_phase != updated_state.current_phase.value:
-                    await websocket.send_json({
-                        "type": "phase_change",
-                        "phase": updated_state.current_phase.value,
-                        "message": updated_state.get_phase_summary()
-                    })
-
-                # Send workflow step notification
-                if updated_state.phase_history:
-                    last_phase = updated_state.phase_history[-1]
-                    await websocket.send_json({
-                        "type": "workflow",
-                        "node": last_phase.upper(),
-                        "message": f"Completed {last_phase} phase"
-                    })
-
-                # Stream the response tokens
                 answer_text = result["generation"]
 
-                # For now, send the complete answer as a single token
-                # In the future, we could implement actual token streaming from LLM
-                await websocket.send_json({
-                    "type": "token",
-                    "content": answer_text
-                })
-
                 # Send completion event with full context
                 await websocket.send_json({
                     "type": "complete",
@@ -229,6 +240,13 @@ async def websocket_pedagogical_chat_endpoint(websocket: WebSocket, conversation
                     "type": "error",
                     "message": "Invalid JSON format"
                 })
+            except LLMOverloadedError as e:
+                await websocket.send_json({
+                    "type": "error",
+                    "code": e.status_code,
+                    "retry_after": e.retry_after,
+                    "message": str(e)
+                })
             except Exception as e:
                 logger.error(f"Error processing pedagogical message: {e}")
                 import traceback
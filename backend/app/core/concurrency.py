@@ -0,0 +1,87 @@
+"""
+Bounded thread pool for blocking work called from async code
+
+LangGraph invoke, LlamaIndex query engines, the pedagogical nodes and
+embedding calls are synchronous. Called directly inside an `async def`
+handler they freeze the uvicorn worker for every other user until they
+return. run_blocking() moves them onto a dedicated pool instead:
+
+    result = await run_blocking(rag_service.query, question, max_retries=2)
+
+The pool is bounded (settings.blocking_pool_workers) so a burst of
+requests queues here rather than spawning unbounded threads against a
+single LLM server. Context variables are copied into the worker thread.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """The process-wide pool (created on first use)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.blocking_pool_workers,
+                    thread_name_prefix="blocking"
+                )
+                logger.info(f"✓ Blocking work pool started with {settings.blocking_pool_workers} workers")
+    return _executor
+
+
+def _tracked(func: Callable[..., T]) -> Callable[..., T]:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _in_flight
+        with _in_flight_lock:
+            _in_flight += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with _in_flight_lock:
+                _in_flight -= 1
+    return wrapper
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call on the pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _tracked(func), *args, **kwargs)
+    return await loop.run_in_executor(get_blocking_executor(), call)
+
+
+def blocking_pool_stats() -> Dict[str, Any]:
+    """Pool size, calls running now and calls waiting for a worker"""
+    queued = _executor._work_queue.qsize() if _executor is not None else 0
+    return {
+        "workers": settings.blocking_pool_workers,
+        "running": _in_flight,
+        "queued": queued,
+    }
+
+
+def shutdown_blocking_executor():
+    """Stop the pool (app shutdown); running calls are allowed to finish"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -18,13 +18,35 @@ class Settings(BaseSettings):
 
     # LLM Server Configuration
     llm_base_url: str = "http://localhost:8080/v1"
+    llm_base_urls: str = ""  # Comma-separated llama.cpp servers to load-balance over (empty = llm_base_url only)
+    llm_health_probe_interval_seconds: float = 10  # GET /v1/models on every backend (multi-backend only)
+    llm_eject_after_failures: int = 2  # Consecutive failed calls before a backend is taken out of rotation
+    llm_eject_seconds: float = 30  # How long an ejected backend stays out (a passing probe re-admits it sooner)
     llm_model_name: str = "mistral-7b-instruct-v0.2.q5_k_m.gguf"
     llm_temperature: float = 0.7
     llm_max_tokens: int = 1536  # IMPROVEMENT: Increased from 768 to fix incomplete responses in pedagogical mode
+    llm_timeout_seconds: float = 300  # Per-request read timeout (generation can be slow)
+    llm_connect_timeout_seconds: float = 10
+    llm_pool_max_connections: int = 16  # Max concurrent connections to the LLM server per process
+    llm_pool_max_keepalive: int = 8  # Idle connections kept open for reuse
+    llm_keepalive_expiry_seconds: float = 30
+    blocking_pool_workers: int = 32  # Threads for blocking RAG/LLM calls from async endpoints (most just wait for an LLM slot)
+    llm_max_concurrency: int = 2  # Concurrent calls admitted per LLM backend (match llama.cpp -np; 0 = unlimited)
+    llm_max_queue: int = 32  # Calls allowed to wait for a slot; beyond this requests fail fast with 429
+    llm_queue_timeout_seconds: float = 60  # Max wait for a slot before failing with 503
+    llm_cache_prompt: bool = True  # Ask llama.cpp to reuse the KV cache of the longest matching prompt prefix
+    llm_classify_max_tokens: int = 8  # Output cap for grammar-constrained grading/routing labels
+    llm_prefix_slots: int = 0  # Pin each static prompt prefix to slot crc32(prefix) % N (0 = server picks by similarity)
+    llm_context_window: int = 4096  # Context size the llama.cpp server runs with (-c); prompt + max_tokens must fit
 
     # Embedding Configuration
     embedding_model_name: str = "all-MiniLM-L6-v2"  # Fast, lightweight embedding model
     embedding_dimension: int = 384
+    embedding_backend: str = "auto"  # "torch" (sentence-transformers), "onnx" (onnxruntime CPU) or "auto" (torch on CUDA, else onnx)
+    embedding_device: str = "auto"  # Device for the torch backend: "auto", "cuda" or "cpu"
+    embedding_onnx_quantize: bool = True  # Dynamic int8 weight quantization for the onnx backend
+    embedding_num_threads: int = 0  # CPU threads for embedding inference (0 = library default)
+    embedding_onnx_dir: str = str(Path(__file__).parent.parent.parent / "onnx_models")
 
     # ChromaDB Configuration (file-based, no server needed)
     # Use absolute path to ensure it works from any directory (e.g., evaluation/)
@@ -35,6 +57,59 @@ class Settings(BaseSettings):
     chunk_overlap: int = 50  # IMPROVEMENT: Increased from 25 to match chunk size increase
     top_k_retrieval: int = 3  # IMPROVEMENT: Increased from 1 for multi-source support
     similarity_threshold: float = 0.4  # IMPROVEMENT: Lowered from 0.7 for broader retrieval
+    retrieval_mode: str = "hybrid"  # "hybrid" (BM25 + dense, fused with RRF) or "dense"
+    bm25_index_path: str = str(Path(__file__).parent.parent.parent / "bm25_index.npz")
+    hybrid_candidate_k: int = 20  # Candidates taken from each ranking before fusion
+    hybrid_rrf_k: int = 60  # RRF damping constant (standard value from the RRF paper)
+    rerank_endpoints: str = ""  # Comma-separated endpoints whose retrieval is reranked by the cross-encoder ("simple", "agentic"; empty = off)
+    rerank_model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 30  # Chunks fetched from the dense/hybrid retriever before reranking down to top_k_retrieval
+    rerank_max_length: int = 256  # Max tokens per (question, chunk) pair fed to the cross-encoder
+    rerank_cache_size: int = 4096  # Cached (query, chunk) scores (least recently used evicted first)
+    context_tokenizer: str = "cl100k_base"  # tiktoken encoding for counting prompt tokens (approximates the model's vocabulary)
+    context_token_margin: float = 1.15  # Counted tokens are scaled by this to stay under the real context window
+    context_max_tokens: int = 0  # Cap on packed document tokens per prompt (0 = whatever fits in the context window)
+
+    # Grading Gate Configuration (agentic RAG)
+    grading_gate_enabled: bool = True  # Decide relevance from retrieval scores when they are clear-cut
+    grading_accept_score: float = 0.6  # Top score at or above this: relevant without an LLM call
+    grading_reject_score: float = 0.3  # Top score below this: not relevant without an LLM call
+    grading_per_document: bool = True  # LLM grades each chunk in its own call; chunks graded irrelevant are dropped
+    grading_min_relevant: int = 2  # Stop grading once this many chunks are confirmed relevant (0 = grade all)
+    agentic_rewrite_mode: str = "serial"  # On a "no" grade: "serial" (rewrite -> retrieve -> grade, up to max_retries times) or "fanout" (one round of fused multi-query retrieval)
+    fanout_queries: int = 3  # Reformulations requested in fan-out mode (searched together with the original question)
+    agentic_deadline_seconds: float = 90  # End-to-end budget for one agentic query (0 = no deadline)
+    agentic_generation_reserve_seconds: float = 30  # Kept for the answer: grading/rewrites are skipped once less than this remains
+    llm_generation_tokens_per_second: float = 20  # Expected decode speed; caps max_tokens to what fits in the remaining budget
+    grading_workers: int = 8  # Threads issuing per-document grading calls (shared; the LLM scheduler still caps admission)
+
+    # Phase Classifier Configuration (pedagogical routing)
+    phase_classifier_enabled: bool = True  # Route phases with the local classifier; LLM only when it is unsure
+    phase_classifier_min_confidence: float = 0.6  # Below this class probability the LLM router decides
+    phase_classifier_history_limit: int = 2000  # Recent LLM-routed turns from analytics added to the training set
+    phase_routing_examples_path: str = str(Path(__file__).parent.parent.parent / "routing_examples.json")
+
+    # Retrieval Cache Configuration
+    retrieval_cache_enabled: bool = True  # Cache retrieval results and query embeddings per normalized question
+    retrieval_cache_size: int = 512  # Max entries per cache (least recently used evicted first)
+    retrieval_cache_ttl_seconds: int = 3600
+    collection_version_path: str = str(Path(__file__).parent.parent.parent / "collection_version.json")
+
+    # Semantic Answer Cache Configuration
+    semantic_cache_enabled: bool = False  # Serve answers of near-duplicate questions without calling the LLM
+    semantic_cache_threshold: float = 0.95  # Min cosine similarity between question embeddings for a hit
+    semantic_cache_size: int = 2000  # Max cached answers (least frequently used evicted first)
+    semantic_cache_snapshot_interval: int = 50  # Snapshot to disk after this many new answers (0 = shutdown only)
+    semantic_cache_path: str = str(Path(__file__).parent.parent.parent / "semantic_cache.json")
+
+    # Ingestion Pipeline Configuration
+    ingest_batch_size: int = 64  # Chunks per embedding forward pass and vector store write
+    ingest_queue_size: int = 8  # Max batches buffered between pipeline stages (bounds memory)
+    ingest_parse_workers: int = 1  # >1 parses PDFs in a process pool (one PDF per worker)
+    ingest_manifest_path: str = str(Path(__file__).parent.parent.parent / "ingest_manifest.json")
+    ingest_checkpoint_path: str = str(Path(__file__).parent.parent.parent / "ingest_checkpoint.jsonl")
+    embedding_cache_enabled: bool = True  # Reuse embeddings of identical chunk text across ingestion runs
+    embedding_cache_dir: str = str(Path(__file__).parent.parent.parent / "embedding_cache")
 
     # File paths
     course_materials_dir: str = "../course_materials"
@@ -58,6 +58,19 @@ class AnalyticsMiddleware(BaseHTTPMiddleware):
         return response
 
 
+def pedagogical_state_snapshot(state: PedagogicalState) -> Dict[str, Any]:
+    """Pedagogical state logged with an interaction (taken after the turn)"""
+    return {
+        'current_phase': state.current_phase.value,
+        'phase_history': state.phase_history,
+        'problem_statement': state.problem_statement,
+        'last_user_message': state.last_user_message,
+        # Routing provenance: the phase classifier trains on LLM-routed turns only
+        'routed_from': state.routed_from,
+        'routed_by': state.routed_by
+    }
+
+
 def log_interaction(endpoint_type: EndpointType):
     """
     Decorator to log detailed interaction data for chat endpoints
@@ -145,6 +158,7 @@ def log_interaction(endpoint_type: EndpointType):
                 workflow_path = None
                 was_rewritten = False
                 rewrites_count = 0
+                degradations = None
                 token_count = None
                 retrieval_count = None
 
@@ -172,6 +186,7 @@ def log_interaction(endpoint_type: EndpointType):
                         workflow_path = result_dict.get('workflow_path', '')
                         was_rewritten = result_dict.get('was_rewritten', False)
                         rewrites_count = result_dict.get('rewrites_used', 0)
+                        degradations = result_dict.get('degradations') or None
 
                         # Try to get SLM prompt from agentic service if available
                         if 'slm_prompt' in result_dict:
@@ -183,12 +198,7 @@ def log_interaction(endpoint_type: EndpointType):
                             from ..services.state_manager import state_manager
                             state = state_manager.get_state(conversation_id)
                             if state:
-                                pedagogical_state = {
-                                    'current_phase': state.current_phase.value,
-                                    'phase_history': state.phase_history,
-                                    'problem_statement': state.problem_statement,
-                                    'last_user_message': state.last_user_message
-                                }
+                                pedagogical_state = pedagogical_state_snapshot(state)
                         except Exception as e:
                             logger.warning(f"Failed to get pedagogical state: {e}")
 
@@ -220,7 +230,8 @@ def log_interaction(endpoint_type: EndpointType):
                         token_count=token_count,
                         retrieval_count=retrieval_count,
                         was_rewritten=was_rewritten,
-                        rewrites_count=rewrites_count
+                        rewrites_count=rewrites_count,
+                        degradations=degradations
                     )
 
                     await analytics_service.log_interaction(interaction)
@@ -261,7 +272,9 @@ async def log_websocket_interaction(
     source_materials: List[Dict] = None,
     workflow_events: List[str] = None,
     endpoint_type: EndpointType = EndpointType.AGENTIC,
-    slm_prompt: str = None
+    slm_prompt: str = None,
+    degradations: List[str] = None,
+    token_count: int = None
 ):
     """
     Log WebSocket interaction data for streaming endpoints
@@ -275,6 +288,8 @@ async def log_websocket_interaction(
         workflow_events: List of workflow events/stages
         endpoint_type: Type of endpoint
         slm_prompt: Prompt sent to SLM
+        degradations: Deadline shortcuts applied (agentic)
+        token_count: Prompt + answer tokens of the generation call
     """
     if not settings.analytics_enabled:
         return
@@ -290,12 +305,7 @@ async def log_websocket_interaction(
                 from ..services.state_manager import state_manager
                 state = state_manager.get_state(conversation_id)
                 if state:
-                    pedagogical_state = {
-                        'current_phase': state.current_phase.value,
-                        'phase_history': state.phase_history,
-                        'problem_statement': state.problem_statement,
-                        'last_user_message': state.last_user_message
-                    }
+                    pedagogical_state = pedagogical_state_snapshot(state)
             except Exception as e:
                 logger.warning(f"Failed to get pedagogical state for WebSocket: {e}")
 
@@ -312,9 +322,11 @@ async def log_websocket_interaction(
             source_materials=source_materials,
             endpoint_type=endpoint_type,
             workflow_path=workflow_path,
+            token_count=token_count,
             retrieval_count=len(source_materials) if source_materials else 0,
             was_rewritten=bool(workflow_events and "rewrite" in str(workflow_events).lower()),
-            rewrites_count=sum(1 for event in workflow_events or [] if "rewrite" in str(event).lower())
+            rewrites_count=sum(1 for event in workflow_events or [] if "rewrite" in str(event).lower()),
+            degradations=degradations or None
         )
 
         await analytics_service.log_interaction(interaction)
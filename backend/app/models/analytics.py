@@ -51,6 +51,7 @@ class InteractionLog(BaseModel):
     retrieval_count: Optional[int] = Field(None, ge=0)
     was_rewritten: bool = False
     rewrites_count: int = 0
+    degradations: Optional[List[str]] = None  # Deadline shortcuts applied (agentic)
 
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow)
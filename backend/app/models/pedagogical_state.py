@@ -47,6 +47,14 @@ class PedagogicalState(BaseModel):
         default_factory=list,
         description="History of phases visited in order"
     )
+    routed_from: Optional[str] = Field(
+        default=None,
+        description="Phase the last turn was routed from"
+    )
+    routed_by: Optional[str] = Field(
+        default=None,
+        description="What routed the last turn: classifier, llm, keywords or default"
+    )
 
     def get_phase_summary(self) -> str:
         """Get a human-readable summary of the current phase"""
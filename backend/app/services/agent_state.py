@@ -1,15 +1,33 @@
 """
 Agent State Definition for Agentic RAG
 """
+from enum import Enum
 from typing import TypedDict, List, Annotated
 from langgraph.graph.message import add_messages
 
+
+class Relevance(str, Enum):
+    """Grading labels (the values are what relevance_decision stores)"""
+    YES = "yes"
+    NO = "no"
+
+
+class Degradation(str, Enum):
+    """Shortcuts taken to answer within the request deadline (the values are what gets recorded)"""
+    SKIP_GRADING = "skip_grading"              # Documents used without relevance grading
+    GRADING_CUT_SHORT = "grading_cut_short"    # Per-document grading stopped at its budget
+    SKIP_REWRITE = "skip_rewrite"              # Irrelevant retrieval answered instead of rewritten
+    CAP_MAX_TOKENS = "cap_max_tokens"          # Answer length capped to the remaining budget
+    NO_ANSWER_SLOT = "no_answer_slot"          # Deadline passed waiting for an LLM slot: sources, no answer
+
+
 class AgentState(TypedDict):
     """Shared state for agentic RAG workflow"""
 
     # Question management
     question: str                          # Original user question
     rewritten_question: str | None         # Query after rewrite
+    fanout_queries: List[str] | None       # Reformulations searched together (fan-out mode)
 
     # Retrieved context
     documents: List[str]                   # Document chunks
@@ -17,6 +35,7 @@ class AgentState(TypedDict):
 
     # Generation output
     generation: str                        # Final answer
+    token_count: int | None                # Prompt + answer tokens (server usage, else counted)
 
     # Conversation history
     messages: Annotated[list, add_messages]
@@ -25,8 +44,13 @@ class AgentState(TypedDict):
     retry_count: int                       # Rewrite attempts
     max_retries: int                       # Maximum allowed (default: 2)
 
+    # Latency budget
+    deadline: float | None                 # time.monotonic() by which the answer must be complete
+    degradations: List[str]                # Degradation values applied to meet the deadline
+
     # Metadata
     relevance_decision: str | None         # "yes" or "no" from grading
     workflow_path: List[str]               # Visited nodes
     document_metadata: List[dict]          # Document metadata (filenames, page numbers, etc.)
-    slm_prompt: str | None                 # The actual prompt sent to SLM (for analytics)
\ No newline at end of file
+    slm_prompt: str | None                 # The actual prompt sent to SLM (for analytics)
+    generation_failed: bool | None         # LLM call failed; the answer is an apology, never cache it
\ No newline at end of file
@@ -2,66 +2,95 @@
 Agentic RAG Service with LangGraph
 Self-correcting RAG workflow: retrieve → grade → rewrite → generate
 """
+import contextvars
 import logging
-from typing import Dict, List
-
-from llama_index.core import VectorStoreIndex, Settings
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from .mistral_llm import MistralLLM
-import chromadb
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.query_engine import RetrieverQueryEngine
+from .hybrid_retriever import MultiQueryRetriever, create_retriever
+from .model_registry import model_registry
+from .reranker import rerank_enabled
+from .semantic_cache import embed_question, replay_tokens, semantic_cache
+from .llm_scheduler import LLMDeadlineError, LLMOverloadedError, LLMPriority, llm_scheduler
+from .grading_gate import grading_gate
+from .context_packer import context_budget, context_packer, token_counter
+from .prompts import (DOCUMENT_GRADING_PREFIX, FANOUT_PREFIX, GENERATION_PREFIX, GRADING_PREFIX,
+                      REWRITE_PREFIX, build_document_grading_prompt, build_fanout_prompt,
+                      build_generation_prompt, build_grading_prompt, build_rewrite_prompt)
+from ..core.concurrency import run_blocking
 
 from langgraph.graph import StateGraph, END
-from .agent_state import AgentState
+from .agent_state import AgentState, Degradation, Relevance
 from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Global pool for per-document grading calls (graph nodes run on worker threads already,
+# so these must not share the blocking pool they are waiting on)
+_grading_executor = ThreadPoolExecutor(max_workers=settings.grading_workers, thread_name_prefix="grading")
+
+MIN_ANSWER_TOKENS = 64  # Floor for the deadline cap on max_tokens (a truncated answer beats none)
+NO_ANSWER_MESSAGE = ("The tutor is busy right now and could not answer in time. "
+                     "The most relevant course materials are listed below; please try again shortly.")
+
+
+def parse_reformulations(text: str, count: int) -> List[str]:
+    """Up to count distinct queries from a one-per-line completion (numbering/bullets stripped)"""
+    queries, seen = [], set()
+    for line in text.splitlines():
+        query = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip().strip('"').strip()
+        if query and query.lower() not in seen:
+            seen.add(query.lower())
+            queries.append(query)
+    return queries[:count]
+
+
 class AgenticRAGService:
     """Agentic RAG with self-correction capabilities"""
 
+    retriever = None  # Set by _initialize; without it _retrieve falls back to query_engine
+    fanout_retriever = None  # Set by _initialize (multi-query retrieval for agentic_rewrite_mode="fanout")
+
     def __init__(self):
         self.index = None
         self.query_engine = None
         self.llm = None
         self.graph = None
+        self.retrieval_graph = None
         self._initialize()
 
     def _initialize(self):
         """Initialize all components"""
         logger.info("Initializing Agentic RAG service...")
 
-        # Configure embedding model (using sentence-transformers on GPU)
-        logger.info("  Configuring embeddings via sentence-transformers...")
+        # Embedding model and LLM client are shared with RAGService (loaded once per process)
+        logger.info("  Configuring embeddings and LLM client...")
         import os
         # Disable hf_transfer to avoid dependency issues
         os.environ.pop('HF_HUB_ENABLE_HF_TRANSFER', None)
 
-        embed_model = HuggingFaceEmbedding(
-            model_name=settings.embedding_model_name,
-            device="cuda"  # Use GPU for fast embeddings
-        )
-        Settings.embed_model = embed_model
-
-        # Configure LLM
-        logger.info("  Connecting to LLM server...")
-        self.llm = MistralLLM(
-            server_url=settings.llm_base_url.replace("/v1", ""),
-            temperature=settings.llm_temperature,
-            num_output=settings.llm_max_tokens,
-        )
-        Settings.llm = self.llm
+        model_registry.configure_llama_index()
+        self.llm = model_registry.get_llm()
 
         # Connect to ChromaDB
         logger.info("  Connecting to ChromaDB...")
         try:
-            chroma_client = chromadb.PersistentClient(path=settings.chroma_db_path)
-            chroma_collection = chroma_client.get_or_create_collection(name=settings.chroma_collection_name)
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+            vector_store = model_registry.get_vector_store()
 
             self.index = VectorStoreIndex.from_vector_store(vector_store)
-            self.query_engine = self.index.as_query_engine(
-                similarity_top_k=settings.top_k_retrieval
+            self.retriever = create_retriever(
+                self.index, vector_store, model_registry.get_embed_model(),
+                rerank=rerank_enabled("agentic")
+            )
+            self.query_engine = RetrieverQueryEngine.from_args(self.retriever)
+            self.fanout_retriever = MultiQueryRetriever(
+                vector_store, model_registry.get_embed_model(),
+                lexical=settings.retrieval_mode == "hybrid"
             )
         except Exception as e:
             logger.error(f"Failed to connect to ChromaDB: {e}")
@@ -74,20 +103,35 @@ class AgenticRAGService:
 
         # Build LangGraph workflow
         logger.info("  Building LangGraph workflow...")
-        self._build_graph()
+        self.graph = self._build_graph()
+        # Streaming generates the answer itself, token by token, so its graph
+        # stops where "generate" would run (one generation per question, not two)
+        self.retrieval_graph = self._build_graph(include_generate=False)
 
         logger.info("✓ Agentic RAG service initialized")
 
-    def _build_graph(self):
-        """Build the LangGraph state machine"""
+    def _build_graph(self, include_generate: bool = True):
+        """
+        Build the LangGraph state machine
+
+        With include_generate=False the graph ends after grading (query_stream
+        streams the answer from the final state). In fan-out mode a "no"
+        grade leads to one fan_out node instead of the rewrite loop.
+        """
+        fanout = settings.agentic_rewrite_mode == "fanout"
+
         # Create graph
         workflow = StateGraph(AgentState)
 
         # Add nodes
         workflow.add_node("retrieve", self._retrieve)
         workflow.add_node("grade_documents", self._grade_documents)
-        workflow.add_node("rewrite_query", self._rewrite_query)
-        workflow.add_node("generate", self._generate)
+        if fanout:
+            workflow.add_node("fan_out", self._fan_out)
+        else:
+            workflow.add_node("rewrite_query", self._rewrite_query)
+        if include_generate:
+            workflow.add_node("generate", self._generate)
 
         # Set entry point
         workflow.set_entry_point("retrieve")
@@ -99,18 +143,25 @@ class AgenticRAGService:
             "grade_documents",
             self._decide_after_grading,
             {
-                "generate": "generate",
-                "rewrite": "rewrite_query"
+                "generate": "generate" if include_generate else END,
+                "rewrite": "fan_out" if fanout else "rewrite_query"
             }
         )
 
-        workflow.add_edge("rewrite_query", "retrieve")  # Loop back
-        workflow.add_edge("generate", END)
+        if fanout:
+            workflow.add_edge("fan_out", "grade_documents")  # Fused retrieval, graded once
+        else:
+            workflow.add_edge("rewrite_query", "retrieve")  # Loop back
+        if include_generate:
+            workflow.add_edge("generate", END)
 
         # Compile graph
-        self.graph = workflow.compile()
+        graph = workflow.compile()
 
-        logger.info("  Graph compiled with nodes: retrieve -> grade_documents -> [rewrite_query] -> retrieve -> generate")
+        logger.info("  Graph compiled with nodes: retrieve -> grade_documents -> "
+                    + ("[fan_out -> grade_documents]" if fanout else "[rewrite_query] -> retrieve")
+                    + (" -> generate" if include_generate else " (streaming: generation outside the graph)"))
+        return graph
 
     # === NODE IMPLEMENTATIONS ===
 
@@ -125,25 +176,14 @@ class AgenticRAGService:
         state["workflow_path"].append("retrieve")
 
         try:
-            # Query the vector store
-            response = self.query_engine.query(question)
-
-            # Extract documents, scores, and metadata
-            documents = []
-            scores = []
-            metadata_list = []
-
-            if hasattr(response, 'source_nodes'):
-                for node in response.source_nodes:
-                    documents.append(node.node.text)
-                    scores.append(float(node.score) if node.score else 0.0)
-                    metadata_list.append(node.node.metadata)
-
-            state["documents"] = documents
-            state["document_scores"] = scores
-            state["document_metadata"] = metadata_list
+            # Retrieval only: generation happens later in _generate, so don't
+            # pay for a query_engine synthesis call here
+            if self.retriever is not None:
+                source_nodes = self.retriever.retrieve(question)
+            else:
+                source_nodes = getattr(self.query_engine.query(question), 'source_nodes', [])
 
-            logger.info(f"  Retrieved {len(documents)} documents (avg score: {sum(scores)/len(scores):.2f})")
+            self._set_documents(state, source_nodes)
 
         except Exception as e:
             logger.error(f"  Retrieval failed: {e}")
@@ -153,60 +193,232 @@ class AgenticRAGService:
 
         return state
 
+    @staticmethod
+    def _set_documents(state: AgentState, source_nodes):
+        """Store retrieved documents, scores, and metadata in the state"""
+        documents = []
+        scores = []
+        metadata_list = []
+
+        for node in source_nodes:
+            documents.append(node.node.text)
+            scores.append(float(node.score) if node.score else 0.0)
+            metadata_list.append(node.node.metadata)
+
+        state["documents"] = documents
+        state["document_scores"] = scores
+        state["document_metadata"] = metadata_list
+
+        logger.info(f"  Retrieved {len(documents)} documents (avg score: {sum(scores)/max(len(scores), 1):.2f})")
+
     def _grade_documents(self, state: AgentState) -> AgentState:
         """
         Grade Documents Node: LLM evaluates relevance of retrieved context
 
         This is the critical self-reflection step that enables self-correction.
+        Clear-cut retrieval scores are decided by the grading gate without
+        an LLM call; only the uncertain band is graded by the LLM.
         """
+        logger.info(f"[GRADE] Evaluating {len(state['documents'])} documents for relevance...")
+        state["workflow_path"].append("grade")
+
+        state = self._judge_relevance(state)
+
+        # Not enough time left for another retrieval round: answer from what we have
+        if (state["relevance_decision"] == "no" and state["retry_count"] < state["max_retries"]
+                and not state.get("fanout_queries") and self._over_budget(state)):
+            self._degrade(state, Degradation.SKIP_REWRITE)
+        return state
+
+    def _judge_relevance(self, state: AgentState) -> AgentState:
+        """Set relevance_decision (and drop chunks graded irrelevant)"""
         question = state.get("rewritten_question") or state["question"]
         documents = state["documents"]
 
-        logger.info(f"[GRADE] Evaluating {len(documents)} documents for relevance...")
-        state["workflow_path"].append("grade")
-
         if not documents:
             logger.warning("  No documents to grade")
             state["relevance_decision"] = "no"
             return state
 
-        # Construct grading prompt
-        docs_text = "\n\n".join([f"Document {i+1}:\n{doc[:300]}..."
-                                  for i, doc in enumerate(documents)])
-
-        grading_prompt = f"""You are a grading assistant. Your task is to determine if the retrieved documents are relevant to answer the user's question.
-
-Question: {question}
-
-Retrieved Documents:
-{docs_text}
+        gated = grading_gate.decide(state.get("document_scores") or [])
+        if gated is not None:
+            state["relevance_decision"] = gated
+            logger.info(f"  Decision: {'RELEVANT ✓' if gated == 'yes' else 'NOT RELEVANT ✗'} (score gate)")
+            return state
 
-Are these documents relevant to answering the question? Respond with ONLY "yes" or "no".
+        if self._over_budget(state):
+            self._degrade(state, Degradation.SKIP_GRADING)
+            state["relevance_decision"] = "yes"
+            return state
 
-If the documents contain information that could help answer the question, respond "yes".
-If the documents are off-topic or unhelpful, respond "no".
+        if settings.grading_per_document:
+            budget = self._grading_budget(state)
+            verdicts = self._grade_each_document(question, documents, timeout=budget)
+            if budget is not None and self._over_budget(state):
+                self._degrade(state, Degradation.GRADING_CUT_SHORT)
+            relevant = any(verdicts)
+            if relevant:
+                # Chunks graded irrelevant are dropped; ungraded ones (early stop) keep their rank
+                kept = [i for i, verdict in enumerate(verdicts) if verdict is not False]
+                for key in ("documents", "document_scores", "document_metadata"):
+                    if state.get(key):
+                        state[key] = [state[key][i] for i in kept]
+            state["relevance_decision"] = "yes" if relevant else "no"
+            logger.info(f"  Decision: {'RELEVANT ✓' if relevant else 'NOT RELEVANT ✗'} "
+                        f"({len(state['documents'])}/{len(documents)} documents kept)")
+            return state
 
-Response:"""
+        grading_prompt = build_grading_prompt(question, documents)
 
         try:
-            # Call LLM for grading (non-streaming)
-            response = self.llm.complete(grading_prompt)
-            decision = response.text.strip().lower()
-
-            # Parse yes/no (handle variations)
-            if "yes" in decision:
-                state["relevance_decision"] = "yes"
-                logger.info("  Decision: RELEVANT ✓")
-            else:
-                state["relevance_decision"] = "no"
-                logger.info("  Decision: NOT RELEVANT ✗")
-
+            # Grammar-constrained yes/no call (a few tokens at temperature 0)
+            decision = self.llm.classify(grading_prompt, Relevance, priority=LLMPriority.GRADING,
+                                         prompt_prefix=GRADING_PREFIX, deadline=self._stage_deadline(state))
+            state["relevance_decision"] = decision.value
+            logger.info(f"  Decision: {'RELEVANT ✓' if decision is Relevance.YES else 'NOT RELEVANT ✗'}")
+
+        except LLMDeadlineError:
+            self._degrade(state, Degradation.SKIP_GRADING)  # Budget spent waiting for a slot
+            state["relevance_decision"] = "yes"
+        except LLMOverloadedError:
+            raise  # Fail fast; the endpoint reports 429/503
         except Exception as e:
             logger.error(f"  Grading failed: {e}, defaulting to 'yes'")
             state["relevance_decision"] = "yes"  # Fail safe
 
         return state
 
+    def _grade_document(self, question: str, document: str, deadline: Optional[float] = None) -> bool:
+        """Grammar-constrained yes/no call for one chunk (failures count as relevant)"""
+        try:
+            decision = self.llm.classify(build_document_grading_prompt(question, document), Relevance,
+                                         priority=LLMPriority.GRADING, prompt_prefix=DOCUMENT_GRADING_PREFIX,
+                                         deadline=deadline)
+            return decision is Relevance.YES
+        except LLMDeadlineError:
+            return True  # Still queued when the grading budget ran out: ungraded, so kept
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"  Grading failed: {e}, keeping the document")
+            return True  # Fail safe
+
+    def _grade_each_document(self, question: str, documents: List[str],
+                             timeout: Optional[float] = None) -> List[Optional[bool]]:
+        """
+        Grade every chunk concurrently, stopping early once
+        settings.grading_min_relevant of them are confirmed relevant.
+
+        Returns one verdict per document: True/False, or None when grading
+        stopped before it was decided. Chunks still undecided after timeout
+        seconds count as relevant, like failed calls.
+        """
+        stop_at = time.monotonic() + timeout if timeout is not None else None
+        futures = {
+            _grading_executor.submit(contextvars.copy_context().run, self._grade_document,
+                                     question, document, stop_at): i
+            for i, document in enumerate(documents)
+        }
+        verdicts: List[Optional[bool]] = [None] * len(documents)
+        pending = set(futures)
+        try:
+            while pending:
+                remaining = stop_at - time.monotonic() if stop_at is not None else None
+                done, pending = wait(pending, timeout=max(remaining, 0.0) if remaining is not None else None,
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    logger.warning(f"  Grading budget spent, keeping {len(pending)} ungraded documents")
+                    for future in pending:
+                        verdicts[futures[future]] = True
+                    break
+                for future in done:
+                    verdicts[futures[future]] = future.result()
+                if 0 < settings.grading_min_relevant <= sum(1 for verdict in verdicts if verdict):
+                    logger.info(f"  {settings.grading_min_relevant} relevant documents confirmed, "
+                                f"skipping {len(pending)} more")
+                    break
+        finally:
+            for future in pending:
+                future.cancel()  # Calls already admitted to the LLM finish in the background
+        return verdicts
+
+    # === LATENCY BUDGET ===
+
+    @staticmethod
+    def _remaining(state: AgentState) -> Optional[float]:
+        """Seconds until the request deadline (None without a deadline)"""
+        deadline = state.get("deadline")
+        return deadline - time.monotonic() if deadline is not None else None
+
+    def _over_budget(self, state: AgentState) -> bool:
+        """True once only the generation reserve (or less) is left"""
+        remaining = self._remaining(state)
+        return remaining is not None and remaining <= settings.agentic_generation_reserve_seconds
+
+    def _grading_budget(self, state: AgentState) -> Optional[float]:
+        remaining = self._remaining(state)
+        return remaining - settings.agentic_generation_reserve_seconds if remaining is not None else None
+
+    @staticmethod
+    def _stage_deadline(state: AgentState) -> Optional[float]:
+        """Deadline for grading and rewrite calls: the request deadline minus the generation reserve"""
+        deadline = state.get("deadline")
+        return deadline - settings.agentic_generation_reserve_seconds if deadline is not None else None
+
+    @staticmethod
+    def _degrade(state: AgentState, degradation: Degradation):
+        remaining = AgenticRAGService._remaining(state)
+        logger.warning(f"  Deadline: {degradation.value} ({remaining:.1f}s left)")
+        state.setdefault("degradations", []).append(degradation.value)
+
+    def _generation_limits(self, state: AgentState) -> Dict:
+        """
+        max_tokens / t_max_predict_ms so the answer finishes before the deadline
+        (computed once the generation slot is granted, so queueing time is accounted for)
+        """
+        remaining = self._remaining(state)
+        if remaining is None:
+            return {}
+        max_tokens = max(MIN_ANSWER_TOKENS, min(settings.llm_max_tokens,
+                                                int(remaining * settings.llm_generation_tokens_per_second)))
+        if max_tokens < settings.llm_max_tokens:
+            self._degrade(state, Degradation.CAP_MAX_TOKENS)
+        return {"max_tokens": max_tokens, "t_max_predict_ms": int(max(remaining, 1.0) * 1000)}
+
+    def _answer_unavailable(self, state: AgentState):
+        """Deadline passed before a generation slot was free: return the sources without an answer"""
+        self._degrade(state, Degradation.NO_ANSWER_SLOT)
+        state["generation"] = NO_ANSWER_MESSAGE
+        state["generation_failed"] = True
+        state["slm_prompt"] = ""
+        state["token_count"] = 0
+
+    def _packed_prompt(self, state: AgentState, question: str, max_tokens: int) -> str:
+        """
+        Generation prompt with the documents packed into what the context window leaves
+        after the template, question and max_tokens. The state keeps the documents that
+        made it into the prompt (in retrieval order), so sources match what the answer used.
+        """
+        documents = state["documents"]
+        scores = state["document_scores"]
+        metadata = state.get("document_metadata") or [{}] * len(documents)
+
+        budget = context_budget(build_generation_prompt(question, []), max_tokens)
+        packed = context_packer.pack(documents, budget, question=question)
+
+        state["documents"] = [documents[i] for i in packed.indices]
+        state["document_scores"] = [scores[i] if i < len(scores) else 0.0 for i in packed.indices]
+        state["document_metadata"] = [metadata[i] if i < len(metadata) else {} for i in packed.indices]
+        return build_generation_prompt(question, packed.documents)
+
+    @staticmethod
+    def _token_count(prompt: str, answer: str, raw) -> int:
+        """Tokens the server reports in usage, else counted locally"""
+        usage = raw.get("usage") if isinstance(raw, dict) else None
+        if isinstance(usage, dict) and usage.get("total_tokens"):
+            return int(usage["total_tokens"])
+        return token_counter.count(prompt) + token_counter.count(answer)
+
     def _rewrite_query(self, state: AgentState) -> AgentState:
         """
         Rewrite Query Node: Reformulate question for better retrieval
@@ -217,17 +429,12 @@ Response:"""
         logger.info(f"[REWRITE] Attempt {state['retry_count'] + 1}/{state['max_retries']}")
         state["workflow_path"].append("rewrite")
 
-        rewrite_prompt = f"""You are a query reformulation assistant. The original question did not retrieve relevant documents.
-
-Original question: {original_question}
-
-Your task: Rewrite this question to improve retrieval results. Make it more specific, add context, or rephrase for clarity.
-
-Rewritten question:"""
+        rewrite_prompt = build_rewrite_prompt(original_question)
 
         try:
             # Call LLM for query rewrite (non-streaming)
-            response = self.llm.complete(rewrite_prompt)
+            response = self.llm.complete(rewrite_prompt, priority=LLMPriority.REWRITE,
+                                         prompt_prefix=REWRITE_PREFIX, deadline=self._stage_deadline(state))
             rewritten = response.text.strip()
 
             state["rewritten_question"] = rewritten
@@ -236,12 +443,51 @@ Rewritten question:"""
             logger.info(f"  Original: {original_question[:80]}...")
             logger.info(f"  Rewritten: {rewritten[:80]}...")
 
+        except LLMDeadlineError:
+            self._degrade(state, Degradation.SKIP_REWRITE)  # Keep the current question
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"  Rewrite failed: {e}")
             # Keep current question
 
         return state
 
+    def _fan_out(self, state: AgentState) -> AgentState:
+        """
+        Fan-out Node: several reformulations from one LLM call, retrieved
+        together (batched embedding, one vector search, RRF) and graded once
+        """
+        original_question = state["question"]
+
+        logger.info(f"[FAN-OUT] Reformulating into {settings.fanout_queries} queries")
+        state["workflow_path"].append("fan_out")
+
+        reformulations = []
+        try:
+            response = self.llm.complete(build_fanout_prompt(original_question, settings.fanout_queries),
+                                         priority=LLMPriority.REWRITE, prompt_prefix=FANOUT_PREFIX,
+                                         stop=["\n\n"], deadline=self._stage_deadline(state))
+            reformulations = parse_reformulations(response.text, settings.fanout_queries)
+            for query in reformulations:
+                logger.info(f"  Query: {query[:80]}...")
+        except LLMDeadlineError:
+            self._degrade(state, Degradation.SKIP_REWRITE)  # Search the original question only
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"  Fan-out reformulation failed: {e}")
+
+        state["fanout_queries"] = reformulations
+        state["retry_count"] += 1
+
+        try:
+            self._set_documents(state, self.fanout_retriever.retrieve([original_question] + reformulations))
+        except Exception as e:
+            logger.error(f"  Fan-out retrieval failed: {e}")  # Keep the documents from the first retrieval
+
+        return state
+
     def _generate(self, state: AgentState) -> AgentState:
         """
         Generate Node: Synthesize final answer from validated documents
@@ -252,41 +498,37 @@ Rewritten question:"""
         logger.info(f"[GENERATE] Creating answer from {len(documents)} documents")
         state["workflow_path"].append("generate")
 
-        # Construct context from documents
-        context = "\n\n".join([f"Source {i+1}:\n{doc}"
-                               for i, doc in enumerate(documents)])
-
-        generation_prompt = f"""You are an expert Computer Science mentor helping students learn.
-
-Context Documents:
-{context}
-
-Question: {question}
-
-Instructions:
-- Provide a clear, concise answer based STRICTLY on the context above
-- If context is insufficient, acknowledge it honestly
-- Cite sources by mentioning "Source 1", "Source 2", etc.
-- Use analogies to make concepts accessible
-- Be encouraging and supportive
-
-Answer:"""
+        # The slot wait counts against the deadline, so the limits are worked out once it is granted
+        try:
+            ticket = llm_scheduler.acquire(LLMPriority.GENERATION, timeout=self._remaining(state))
+        except LLMDeadlineError:
+            self._answer_unavailable(state)
+            return state
 
         try:
+            limits = self._generation_limits(state)
+            generation_prompt = self._packed_prompt(state, question,
+                                                    limits.get("max_tokens", settings.llm_max_tokens))
+
             # CAPTURE: Store the actual prompt sent to SLM for analytics
             state["slm_prompt"] = generation_prompt
 
             # Call LLM for generation (non-streaming)
-            response = self.llm.complete(generation_prompt)
+            response = self.llm.complete(generation_prompt, ticket=ticket, prompt_prefix=GENERATION_PREFIX,
+                                         deadline=state.get("deadline"), **limits)
             state["generation"] = response.text.strip()
+            state["token_count"] = self._token_count(generation_prompt, state["generation"], response.raw)
 
             logger.info(f"  Generated {len(state['generation'])} character answer")
 
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"  Generation failed: {e}")
             state["generation"] = f"I apologize, but I encountered an error generating the answer: {str(e)}"
-            # Still capture the prompt even if generation failed
-            state["slm_prompt"] = generation_prompt
+            state["generation_failed"] = True
+        finally:
+            ticket.release()
 
         return state
 
@@ -309,6 +551,16 @@ Answer:"""
             logger.info(f"[ROUTE] → generate (documents are relevant)")
             return "generate"
 
+        # Out of time for another retrieval round (recorded by _grade_documents)
+        if Degradation.SKIP_REWRITE.value in state.get("degradations", []):
+            logger.info(f"[ROUTE] → generate (deadline)")
+            return "generate"
+
+        # Fan-out searched every reformulation already; a second round would not help
+        if state.get("fanout_queries") is not None:
+            logger.info(f"[ROUTE] → generate (fan-out retrieval graded)")
+            return "generate"
+
         # If not relevant but retries exhausted, give up and generate anyway
         if retry_count >= max_retries:
             logger.info(f"[ROUTE] → generate (max retries {max_retries} reached)")
@@ -320,13 +572,22 @@ Answer:"""
 
     # === PUBLIC API ===
 
-    def query(self, question: str, max_retries: int = 2) -> Dict:
+    @staticmethod
+    def _deadline(deadline_seconds: Optional[float]) -> Optional[float]:
+        seconds = settings.agentic_deadline_seconds if deadline_seconds is None else deadline_seconds
+        return time.monotonic() + seconds if seconds > 0 else None
+
+    def query(self, question: str, max_retries: int = 2, deadline_seconds: Optional[float] = None) -> Dict:
         """
         Query the agentic RAG system
 
         Args:
             question: User's question
             max_retries: Maximum query rewrites allowed (default: 2)
+            deadline_seconds: End-to-end budget (default: settings.agentic_deadline_seconds; 0 = none).
+                Grading and rewrites are skipped and the answer length is capped to meet it, and
+                no LLM call waits for a slot past it (without a slot in time the answer is replaced
+                by the sources); the result's "degradations" lists what was applied.
 
         Returns:
             Dict with answer, sources, metadata, workflow path
@@ -334,18 +595,29 @@ Answer:"""
         logger.info(f"\n{'='*60}")
         logger.info(f"AGENTIC RAG QUERY: {question[:100]}...")
         logger.info(f"{'='*60}")
+        deadline = self._deadline(deadline_seconds)
+
+        cache_embedding = embed_question(question) if settings.semantic_cache_enabled else None
+        if cache_embedding is not None:
+            cached = semantic_cache.lookup("agentic", cache_embedding)
+            if cached is not None:
+                return self._cached_result(cached, question)
 
         # Initialize state
         initial_state: AgentState = {
             "question": question,
             "rewritten_question": None,
+            "fanout_queries": None,
             "documents": [],
             "document_scores": [],
             "document_metadata": [],
             "generation": "",
+            "token_count": None,
             "messages": [],
             "retry_count": 0,
             "max_retries": max_retries,
+            "deadline": deadline,
+            "degradations": [],
             "relevance_decision": None,
             "workflow_path": []
         }
@@ -369,7 +641,9 @@ Answer:"""
                 "num_sources": len(final_state["documents"]),
                 "workflow_path": " → ".join(final_state["workflow_path"]),
                 "rewrites_used": final_state["retry_count"],
-                "was_rewritten": final_state["rewritten_question"] is not None,
+                "was_rewritten": final_state["rewritten_question"] is not None or bool(final_state.get("fanout_queries")),
+                "degradations": final_state.get("degradations", []),
+                "token_count": final_state.get("token_count"),
                 "slm_prompt": final_state.get("slm_prompt", "")  # Include captured prompt for analytics
             }
 
@@ -378,6 +652,9 @@ Answer:"""
             logger.info(f"Rewrites: {result['rewrites_used']}/{max_retries}")
             logger.info(f"{'='*60}\n")
 
+            if cache_embedding is not None and self._is_cacheable(final_state):
+                semantic_cache.store("agentic", question, cache_embedding, self._cache_payload(result))
+
             return result
 
         except Exception as e:
@@ -386,20 +663,41 @@ Answer:"""
             traceback.print_exc()
             raise
 
+    # === SEMANTIC CACHE ===
+
+    @staticmethod
+    def _is_cacheable(final_state: AgentState) -> bool:
+        """Only grounded, successfully generated, undegraded answers are reused"""
+        return bool(final_state["documents"] and final_state["generation"]
+                    and not final_state.get("generation_failed") and not final_state.get("degradations"))
+
+    @staticmethod
+    def _cache_payload(result: Dict) -> Dict:
+        return {key: value for key, value in result.items() if key not in ("type", "question", "slm_prompt")}
+
+    @staticmethod
+    def _cached_result(payload: Dict, question: str) -> Dict:
+        """Cached answer in query() result shape (no prompt was sent to the LLM)"""
+        return {**payload, "question": question, "workflow_path": "semantic_cache", "degradations": [],
+                "token_count": 0, "slm_prompt": ""}
+
     # === STREAMING API ===
 
-    async def query_stream(self, question: str, max_retries: int = 2):
+    async def query_stream(self, question: str, max_retries: int = 2, deadline_seconds: Optional[float] = None):
         """
         Query with streaming support - yields workflow events and tokens
 
         Yields workflow updates as the agent progresses through nodes:
         - type: "workflow" - node transitions (retrieve, grade, rewrite)
+        - type: "queue" - waiting for an LLM slot (position in queue)
         - type: "token" - answer tokens during generation
         - type: "complete" - final result with sources and metadata
+        - type: "error" - failure; code 429/503 when the LLM server is overloaded
 
         Args:
             question: User's question
             max_retries: Maximum query rewrites allowed (default: 2)
+            deadline_seconds: End-to-end budget, as in query()
 
         Yields:
             Dict with type and content (workflow event, token, or complete result)
@@ -407,18 +705,34 @@ Answer:"""
         logger.info(f"\n{'='*60}")
         logger.info(f"AGENTIC RAG STREAMING QUERY: {question[:100]}...")
         logger.info(f"{'='*60}")
+        deadline = self._deadline(deadline_seconds)
+
+        cache_embedding = await run_blocking(embed_question, question) if settings.semantic_cache_enabled else None
+        if cache_embedding is not None:
+            cached = semantic_cache.lookup("agentic", cache_embedding)
+            if cached is not None:
+                # Replay the cached answer through the normal event protocol
+                yield {"type": "workflow", "node": "semantic_cache", "message": "Found an answer to a similar question"}
+                for token in replay_tokens(cached["answer"]):
+                    yield {"type": "token", "content": token}
+                yield {"type": "complete", **self._cached_result(cached, question)}
+                return
 
         # Initialize state
         initial_state: AgentState = {
             "question": question,
             "rewritten_question": None,
+            "fanout_queries": None,
             "documents": [],
             "document_scores": [],
             "document_metadata": [],
             "generation": "",
+            "token_count": None,
             "messages": [],
             "retry_count": 0,
             "max_retries": max_retries,
+            "deadline": deadline,
+            "degradations": [],
             "relevance_decision": None,
             "workflow_path": []
         }
@@ -428,7 +742,8 @@ Answer:"""
             workflow_events = []
             final_state = None
 
-            async for event in self.graph.astream(initial_state):
+            # Retrieval/grading/rewrite only: the answer is generated once, below, as a stream
+            async for event in self.retrieval_graph.astream(initial_state):
                 # Event structure: {node_name: state}
                 for node_name, state in event.items():
                     workflow_events.append(node_name)
@@ -443,55 +758,70 @@ Answer:"""
                     # Store final state
                     final_state = state
 
-            # After graph completes, stream the answer using real LLM streaming
-            if final_state and final_state["documents"]:
-                # Reconstruct the generation prompt from final state
+            # After grading, generate the answer with real LLM streaming (same prompt as _generate)
+            if final_state:
                 question = final_state.get("rewritten_question") or final_state["question"]
-                documents = final_state["documents"]
-
-                context = "\n\n".join([f"Source {i+1}:\n{doc}"
-                                       for i, doc in enumerate(documents)])
-
-                generation_prompt = f"""You are an expert Computer Science mentor helping students learn.
-
-Context Documents:
-{context}
-
-Question: {question}
-
-Instructions:
-- Provide a clear, concise answer based STRICTLY on the context above
-- If context is insufficient, acknowledge it honestly
-- Cite sources by mentioning "Source 1", "Source 2", etc.
-- Use analogies to make concepts accessible
-- Be encouraging and supportive
-
-Answer:"""
-
-                # CAPTURE: Store the actual prompt sent to SLM for analytics
-                final_state["slm_prompt"] = generation_prompt
 
-                # Stream tokens from LLM
-                logger.info("  Streaming answer tokens from LLM...")
-                stream_response = self.llm.stream_complete(generation_prompt)
-
-                answer_buffer = ""
-                for chunk in stream_response:
-                    # Extract token from CompletionResponse
-                    token = chunk.text if hasattr(chunk, 'text') else str(chunk)
-
-                    answer_buffer += token
-                    yield {
-                        "type": "token",
-                        "content": token
-                    }
+                workflow_events.append("generate")
+                final_state["workflow_path"].append("generate")
+                yield {
+                    "type": "workflow",
+                    "node": "generate",
+                    "message": "Running generate..."
+                }
 
-                # Store the streamed answer in final_state for metadata
-                final_state["generation"] = answer_buffer.strip()
+                # Wait for a generation slot (at most until the deadline), telling the client
+                # where it is in the queue
+                ticket = llm_scheduler.submit(LLMPriority.GENERATION, timeout=self._remaining(final_state))
+                try:
+                    try:
+                        while not await ticket.wait_async(poll_seconds=1.0):
+                            yield {
+                                "type": "queue",
+                                "position": ticket.position(),
+                                "message": f"Waiting for the tutor model (position {ticket.position()} in queue)..."
+                            }
+                    except LLMDeadlineError:
+                        self._answer_unavailable(final_state)
+                        yield {"type": "token", "content": final_state["generation"]}
+                    else:
+                        # Limits and packing follow the budget left once the slot is granted
+                        limits = self._generation_limits(final_state)
+                        generation_prompt = self._packed_prompt(final_state, question,
+                                                                limits.get("max_tokens", settings.llm_max_tokens))
+
+                        # CAPTURE: Store the actual prompt sent to SLM for analytics
+                        final_state["slm_prompt"] = generation_prompt
+
+                        # Stream tokens from LLM (async client: the event loop keeps serving other sockets)
+                        logger.info("  Streaming answer tokens from LLM...")
+                        stream_response = await self.llm.astream_complete(
+                            generation_prompt, ticket=ticket, prompt_prefix=GENERATION_PREFIX,
+                            deadline=final_state.get("deadline"), **limits)
+
+                        answer_buffer = ""
+                        last_raw = None
+                        async for chunk in stream_response:
+                            # Extract token from CompletionResponse
+                            token = chunk.text if hasattr(chunk, 'text') else str(chunk)
+                            last_raw = getattr(chunk, 'raw', None) or last_raw  # Final chunk carries usage
+
+                            answer_buffer += token
+                            yield {
+                                "type": "token",
+                                "content": token
+                            }
+
+                        # Store the streamed answer in final_state for metadata
+                        final_state["generation"] = answer_buffer.strip()
+                        final_state["token_count"] = self._token_count(generation_prompt, final_state["generation"],
+                                                                       last_raw)
+                finally:
+                    ticket.release()
 
             # Yield final completion event with metadata
             if final_state:
-                yield {
+                complete_event = {
                     "type": "complete",
                     "answer": final_state["generation"],
                     "sources": [
@@ -506,14 +836,30 @@ Answer:"""
                     "num_sources": len(final_state["documents"]),
                     "workflow_path": " → ".join(final_state["workflow_path"]),
                     "rewrites_used": final_state["retry_count"],
-                    "was_rewritten": final_state["rewritten_question"] is not None,
+                    "was_rewritten": final_state["rewritten_question"] is not None or bool(final_state.get("fanout_queries")),
+                    "degradations": final_state.get("degradations", []),
+                    "token_count": final_state.get("token_count"),
                     "slm_prompt": final_state.get("slm_prompt", "")  # Include captured prompt for analytics
                 }
+                yield complete_event
+
+                if cache_embedding is not None and self._is_cacheable(final_state):
+                    semantic_cache.store("agentic", final_state["question"], cache_embedding,
+                                         self._cache_payload(complete_event))
 
             logger.info(f"\n{'='*60}")
             logger.info(f"STREAMING COMPLETE: {' → '.join(workflow_events)}")
             logger.info(f"{'='*60}\n")
 
+        except LLMOverloadedError as e:
+            logger.warning(f"Agentic RAG streaming rejected: {e}")
+            yield {
+                "type": "error",
+                "code": e.status_code,
+                "retry_after": e.retry_after,
+                "message": str(e)
+            }
+
         except Exception as e:
             logger.error(f"Agentic RAG streaming failed: {e}")
             import traceback
@@ -528,17 +874,21 @@ Answer:"""
 
 # Global singleton
 _agentic_rag_service = None
+_agentic_rag_service_lock = threading.Lock()
 
 def get_agentic_rag_service() -> AgenticRAGService:
     """Get or create the global agentic RAG service"""
     global _agentic_rag_service
     if _agentic_rag_service is None:
-        _agentic_rag_service = AgenticRAGService()
+        # Concurrent first requests (now on worker threads) must not build it twice
+        with _agentic_rag_service_lock:
+            if _agentic_rag_service is None:
+                _agentic_rag_service = AgenticRAGService()
     return _agentic_rag_service
 
 async def get_agentic_rag_service_async() -> AgenticRAGService:
     """Get or create the global agentic RAG service (async version)"""
-    global _agentic_rag_service
-    if _agentic_rag_service is None:
-        _agentic_rag_service = AgenticRAGService()
-    return _agentic_rag_service
\ No newline at end of file
+    if _agentic_rag_service is not None:
+        return _agentic_rag_service
+    # Building the service loads models; keep that off the event loop
+    return await run_blocking(get_agentic_rag_service)
\ No newline at end of file
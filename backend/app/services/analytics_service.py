@@ -84,12 +84,18 @@ class AnalyticsService:
                     retrieval_count INTEGER,
                     was_rewritten BOOLEAN DEFAULT FALSE,
                     rewrites_count INTEGER DEFAULT 0,
+                    degradations TEXT,
 
                     -- Timestamps
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
 
+            # Databases created before the degradations column
+            cursor = await db.execute("PRAGMA table_info(interactions)")
+            if "degradations" not in [row[1] for row in await cursor.fetchall()]:
+                await db.execute("ALTER TABLE interactions ADD COLUMN degradations TEXT")
+
             # Create user_feedback table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS user_feedback (
@@ -220,8 +226,8 @@ class AnalyticsService:
                         (interaction_id, conversation_id, session_id, user_github_id,
                          user_query, ai_response, slm_prompt, pedagogical_state,
                          source_materials, endpoint_type, workflow_path, response_time_ms,
-                         token_count, retrieval_count, was_rewritten, rewrites_count)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                         token_count, retrieval_count, was_rewritten, rewrites_count, degradations)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """, [
                         (
                             interaction.interaction_id, interaction.conversation_id,
@@ -233,7 +239,8 @@ class AnalyticsService:
                             interaction.endpoint_type.value, interaction.workflow_path,
                             interaction.response_time_ms, interaction.token_count,
                             interaction.retrieval_count, interaction.was_rewritten,
-                            interaction.rewrites_count
+                            interaction.rewrites_count,
+                            json.dumps(interaction.degradations) if interaction.degradations else None
                         ) for interaction in interactions
                     ])
 
@@ -0,0 +1,162 @@
+"""
+In-process BM25 index over the ingested chunks
+
+Complements dense retrieval for exact-term queries ("Big-O of heapify",
+Python keywords, function names) that embeddings tend to blur.
+
+The index is built by ingest.py from the ChromaDB collection and saved as
+a single .npz file next to chroma_db:
+
+    terms          vocabulary, newline-joined UTF-8 (term id = line number)
+    doc_ids        Chroma chunk ids, newline-joined UTF-8
+    doc_lengths    int32[n_docs]           tokens per chunk
+    offsets        int64[n_terms + 1]      postings of term t are [offsets[t], offsets[t+1])
+    posting_docs   int32[n_postings]       chunk index, ascending within a term
+    posting_tfs    int32[n_postings]       term frequency in that chunk
+
+Everything is a flat NumPy array (CSR layout), so loading is a few array
+reads rather than unpickling millions of Python objects.
+"""
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Identifiers like heapify, __init__, range, o(n) → "o", "n"
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by do does for from how i in is it its of on or that the this to was what
+when where which who why will with you your can
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word/identifier tokens without stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _encode_strings(values: Sequence[str]) -> np.ndarray:
+    return np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_strings(array: np.ndarray) -> List[str]:
+    text = array.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+class BM25Index:
+    """Okapi BM25 over a CSR inverted index"""
+
+    def __init__(self, terms: List[str], doc_ids: List[str], doc_lengths: np.ndarray,
+                 offsets: np.ndarray, posting_docs: np.ndarray, posting_tfs: np.ndarray,
+                 k1: float = 1.2, b: float = 0.75):
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.offsets = offsets
+        self.posting_docs = posting_docs
+        self.posting_tfs = posting_tfs
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, doc_ids: Sequence[str], texts: Sequence[str]) -> "BM25Index":
+        """Build the index from chunk ids and texts"""
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = np.zeros(len(doc_ids), dtype=np.int32)
+
+        for doc_index, text in enumerate(texts):
+            tokens = tokenize(text or "")
+            doc_lengths[doc_index] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_index, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+
+        posting_docs = np.empty(offsets[-1], dtype=np.int32)
+        posting_tfs = np.empty(offsets[-1], dtype=np.int32)
+        for i, term in enumerate(terms):
+            entries = np.asarray(postings[term], dtype=np.int32)
+            posting_docs[offsets[i]:offsets[i + 1]] = entries[:, 0]
+            posting_tfs[offsets[i]:offsets[i + 1]] = entries[:, 1]
+
+        return cls(terms, list(doc_ids), doc_lengths, offsets, posting_docs, posting_tfs)
+
+    def save(self, path: str):
+        """Atomically write the index as one .npz file"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=_encode_strings(self.terms),
+                doc_ids=_encode_strings(self.doc_ids),
+                doc_lengths=self.doc_lengths,
+                offsets=self.offsets,
+                posting_docs=self.posting_docs,
+                posting_tfs=self.posting_tfs,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Load a saved index (None if it does not exist)"""
+        if not Path(path).exists():
+            return None
+
+        start = time.perf_counter()
+        with np.load(path) as data:
+            index = cls(
+                terms=_decode_strings(data["terms"]),
+                doc_ids=_decode_strings(data["doc_ids"]),
+                doc_lengths=data["doc_lengths"],
+                offsets=data["offsets"],
+                posting_docs=data["posting_docs"],
+                posting_tfs=data["posting_tfs"],
+            )
+        logger.info(f"✓ BM25 index loaded: {index.num_docs} chunks, {len(index.terms)} terms "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return index
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (chunk id, BM25 score), best first"""
+        if not self.num_docs:
+            return []
+
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.posting_docs[start:end]
+            tfs = self.posting_tfs[start:end].astype(np.float32)
+
+            df = end - start
+            idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / (self.avg_doc_length or 1.0))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        top_k = min(top_k, self.num_docs)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(self.doc_ids[i], float(scores[i])) for i in ranked if scores[i] > 0]
@@ -0,0 +1,68 @@
+"""
+Collection version stamp
+
+ingest.py bumps a small stamp file next to chroma_db whenever it changes
+the collection (new, changed or removed PDFs, --overwrite). Caches in the
+API process include the current version in their keys, so everything
+cached before an ingestion run is ignored afterwards - without the API
+and the ingestion script having to talk to each other.
+
+Reading the version costs one stat() call; the file is only re-read when
+its mtime changes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def bump_collection_version(path: Optional[str] = None) -> str:
+    """Record that the collection changed; returns the new version"""
+    path = Path(path or settings.collection_version_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    version = uuid.uuid4().hex
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "updated_at": time.time()}, f)
+    os.replace(tmp_path, path)
+    logger.info(f"✓ Collection version bumped to {version[:8]}")
+    return version
+
+
+class CollectionVersion:
+    """Cheap, cached reader for the version stamp"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or settings.collection_version_path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._version = "initial"  # No stamp yet: collection predates versioning
+
+    def current(self) -> str:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return self._version
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        with open(self.path, "r") as f:
+                            self._version = json.load(f)["version"]
+                        self._mtime = mtime
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.warning(f"Could not read collection version {self.path}: {e}")
+        return self._version
+
+
+# Global reader instance
+collection_version = CollectionVersion()
@@ -0,0 +1,197 @@
+"""
+Token-budgeted context packing for generation prompts
+
+The generation prompt used to join the full text of every retrieved chunk,
+with no check against the model's context window (llm_context_window
+tokens, of which llm_max_tokens are reserved for the answer). Long chunks
+overflowed silently or spent prompt-eval time on text the answer never
+used. pack() fits the documents into a token budget:
+
+  1. keep the retriever's order, which is already best first (similarity,
+     RRF or cross-encoder order; the dense similarity left on reranked or
+     lexical-only hits is not a ranking, so it is not re-sorted on)
+  2. drop chunks contained in a better one and cut the text a chunk shares
+     with its neighbour (the splitter's chunk_overlap repeats it)
+  3. take chunks whole while they fit; the first one that does not is
+     reduced to its sentences sharing the most terms with the question
+     (in document order), truncated only if a single sentence is too long;
+     chunks after the budget is spent are dropped
+
+Tokens are counted with a tiktoken encoding (settings.context_tokenizer,
+downloaded once and cached by tiktoken) scaled by context_token_margin,
+since the llama.cpp model uses its own SentencePiece vocabulary. Without
+tiktoken (or offline on first use) it falls back to ~4 characters/token.
+The server loads the encoding at startup (TokenCounter.warm_up) so the
+first streamed answer does not fetch it on the event loop.
+"""
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence
+
+from .bm25_index import tokenize
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MIN_EXCERPT_TOKENS = 48  # Smaller leftovers are not worth an excerpt
+MIN_OVERLAP_CHARS = 20  # Shorter shared edges are coincidence, not splitter overlap
+DOCUMENT_OVERHEAD_TOKENS = 8  # "Source N:" header and separators around each document
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+class TokenCounter:
+    """Cached token counts for prompt text"""
+
+    def __init__(self, encoding_name: str = settings.context_tokenizer,
+                 margin: float = settings.context_token_margin):
+        self.encoding_name = encoding_name
+        self.margin = margin
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.count = lru_cache(maxsize=4096)(self._count)
+
+    @property
+    def encoding(self):
+        """The tiktoken encoding (None when unavailable; counts are then estimated)"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                        logger.info(f"✓ Context token counter using tiktoken {self.encoding_name}")
+                    except Exception as e:
+                        logger.warning(f"tiktoken {self.encoding_name} unavailable ({e}); "
+                                       f"estimating tokens as characters / 4")
+                    self._loaded = True
+        return self._encoding
+
+    def warm_up(self):
+        """Load the encoding now (it may be downloaded) rather than on the first count"""
+        self.encoding
+
+    def _count(self, text: str) -> int:
+        encoding = self.encoding
+        raw = len(encoding.encode(text, disallowed_special=())) if encoding is not None else len(text) / 4
+        return int(raw * self.margin + 0.999)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text within max_tokens"""
+        if self.count(text) <= max_tokens:
+            return text
+        encoding = self.encoding
+        if encoding is None:
+            return text[:int(max_tokens / self.margin * 4)]
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:int(max_tokens / self.margin)])
+
+
+@dataclass
+class PackedContext:
+    documents: List[str]              # Text to put in the prompt, in retrieval order
+    indices: List[int]                # Position of each packed document in the input
+    tokens: int = 0                   # Counted tokens of the packed documents (with their headers)
+    trimmed: int = 0                  # Documents reduced to an excerpt
+    dropped: List[int] = field(default_factory=list)  # Inputs left out (duplicate or over budget)
+
+
+def overlap_length(earlier: str, later: str, max_chars: int) -> int:
+    """Characters at the end of earlier repeated at the start of later"""
+    for size in range(min(len(earlier), len(later), max_chars), MIN_OVERLAP_CHARS - 1, -1):
+        if earlier.endswith(later[:size]):
+            return size
+    return 0
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+class ContextPacker:
+    """Fits retrieved chunks into a token budget"""
+
+    def __init__(self, count: Optional[Callable[[str], int]] = None,
+                 truncate: Optional[Callable[[str, int], str]] = None,
+                 max_overlap_chars: int = settings.chunk_overlap * 8):
+        self.count = count or token_counter.count
+        self.truncate = truncate or token_counter.truncate
+        self.max_overlap_chars = max_overlap_chars  # chunk_overlap is in tokens; ~4-8 characters each
+
+    def pack(self, documents: Sequence[str], budget: int, question: str = "") -> PackedContext:
+        """Fit documents (best first, as retrieved) into budget tokens"""
+        packed = PackedContext(documents=[], indices=[])
+        question_terms = set(tokenize(question))
+
+        for i in range(len(documents)):
+            text = self._without_overlap(documents[i], packed.documents)
+            if not text.strip():
+                packed.dropped.append(i)
+                continue
+
+            tokens = self.count(text)
+            left = budget - packed.tokens - DOCUMENT_OVERHEAD_TOKENS
+            if tokens > left:
+                if left < MIN_EXCERPT_TOKENS:
+                    packed.dropped.append(i)
+                    continue
+                text = self._excerpt(text, question_terms, left)
+                tokens = self.count(text)
+                packed.trimmed += 1
+
+            packed.documents.append(text)
+            packed.indices.append(i)
+            packed.tokens += tokens + DOCUMENT_OVERHEAD_TOKENS
+
+        if packed.dropped or packed.trimmed:
+            logger.info(f"  Context packed into {packed.tokens}/{budget} tokens: {len(packed.documents)} documents "
+                        f"({packed.trimmed} excerpted), {len(packed.dropped)} dropped")
+        return packed
+
+    def _without_overlap(self, text: str, kept: List[str]) -> str:
+        """text minus anything already in the kept documents"""
+        for other in kept:
+            if text.strip() in other:
+                return ""
+            size = overlap_length(other, text, self.max_overlap_chars)
+            if size:
+                text = text[size:]
+            size = overlap_length(text, other, self.max_overlap_chars)
+            if size:
+                text = text[:-size]
+        return text
+
+    def _excerpt(self, text: str, question_terms: set, budget: int) -> str:
+        """The sentences most related to the question that fit in budget, in document order"""
+        sentences = split_sentences(text)
+        ranked = sorted(range(len(sentences)),
+                        key=lambda i: len(question_terms & set(tokenize(sentences[i]))), reverse=True)
+        chosen, used = [], 0
+        for i in ranked:
+            tokens = self.count(sentences[i])
+            if used + tokens <= budget:
+                chosen.append(i)
+                used += tokens
+        if not chosen:
+            return self.truncate(sentences[ranked[0]] if sentences else text, budget)
+        return " ".join(sentences[i].strip() for i in sorted(chosen))
+
+
+def context_budget(prompt_without_context: str, max_tokens: int = settings.llm_max_tokens,
+                   count: Optional[Callable[[str], int]] = None) -> int:
+    """Tokens left for documents once the template, question and answer are accounted for"""
+    count = count or token_counter.count
+    budget = settings.llm_context_window - max_tokens - count(prompt_without_context)
+    if settings.context_max_tokens > 0:
+        budget = min(budget, settings.context_max_tokens)
+    return max(budget, 0)
+
+
+# Global token counter (the tiktoken encoding is loaded on first use)
+token_counter = TokenCounter()
+
+# Global packer instance
+context_packer = ContextPacker()
@@ -0,0 +1,237 @@
+"""
+Pluggable embedding backends
+
+All services and ingest.py build their embedding model through
+create_embedding_model(), so the same code runs on GPU machines and on
+CPU-only replicas:
+
+    torch  sentence-transformers via HuggingFaceEmbedding (cuda or cpu)
+    onnx   the same model exported to ONNX and run with onnxruntime on CPU,
+           optionally with dynamic int8 weight quantization
+    auto   torch on CUDA when available, otherwise onnx (falling back to
+           torch on CPU when the ONNX export or quantization fails)
+
+The ONNX export is done once (needs torch) and stored under
+settings.embedding_onnx_dir; later starts only load the tokenizer and the
+.onnx file.
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "torch", "onnx")
+
+
+def cuda_available() -> bool:
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def resolve_device(device: str = "auto") -> str:
+    """Map "auto" to cuda when a GPU is present, else cpu"""
+    if device == "auto":
+        return "cuda" if cuda_available() else "cpu"
+    if device == "cuda" and not cuda_available():
+        logger.warning("CUDA requested for embeddings but not available, falling back to CPU")
+        return "cpu"
+    return device
+
+
+def resolve_backend(backend: str = "auto", device: str = "auto") -> str:
+    """Pick the concrete backend ("torch" or "onnx")"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+    if backend != "auto":
+        return backend
+    return "torch" if resolve_device(device) == "cuda" else "onnx"
+
+
+def embedding_model_id(embed_model: BaseEmbedding) -> str:
+    """Identifies the exact vectors a model produces (used as embedding cache key)"""
+    variant = getattr(embed_model, "variant", None)
+    return f"{embed_model.model_name}+{variant}" if variant else embed_model.model_name
+
+
+def mean_pool_normalize(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """sentence-transformers mean pooling followed by L2 normalization"""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    pooled = summed / counts
+    norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled / norms
+
+
+def export_onnx_model(model_name: str, export_dir: Path, quantize: bool) -> Path:
+    """
+    Export a sentence-transformers model to ONNX (once) and return the model file.
+
+    The transformer is exported with dynamic batch and sequence axes; pooling
+    and normalization are done in numpy (see mean_pool_normalize).
+    """
+    fp32_path = export_dir / "model.onnx"
+    int8_path = export_dir / "model.int8.onnx"
+    target = int8_path if quantize else fp32_path
+    if target.exists():
+        return target
+
+    export_dir.mkdir(parents=True, exist_ok=True)
+
+    if not fp32_path.exists():
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Exporting {model_name} to ONNX (one-time)...")
+        st_model = SentenceTransformer(model_name, device="cpu")
+        pooling = st_model[1]
+        if not getattr(pooling, "pooling_mode_mean_tokens", False):
+            raise ValueError(f"{model_name} does not use mean pooling; the ONNX backend only supports mean pooling")
+
+        transformer = st_model[0].auto_model.eval()
+        tokenizer = st_model.tokenizer
+        tokenizer.save_pretrained(str(export_dir))
+
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in input_names),
+                str(fp32_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                dynamo=False,  # TorchScript exporter; the dynamo one needs onnxscript
+            )
+        with open(export_dir / "export_config.json", "w") as f:
+            json.dump({"model_name": model_name, "max_seq_length": st_model.max_seq_length}, f)
+        logger.info(f"✓ Exported ONNX model to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info("Quantizing ONNX model weights to int8...")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+        logger.info(f"✓ Quantized ONNX model saved to {int8_path}")
+
+    return target
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """Sentence embeddings computed with onnxruntime on CPU"""
+
+    variant: str = Field(default="onnx", description="Backend variant, part of the embedding cache key")
+    max_length: int = Field(default=256, description="Max tokens per text (matches sentence-transformers)")
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: List[str] = PrivateAttr()
+
+    def __init__(self, model_name: str, export_dir: str, quantize: bool = True,
+                 num_threads: int = 0, embed_batch_size: int = 32, **kwargs: Any):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        export_path = Path(export_dir) / model_name.replace("/", "_")
+        model_path = export_onnx_model(model_name, export_path, quantize)
+        with open(export_path / "export_config.json", "r") as f:
+            export_config = json.load(f)
+
+        super().__init__(
+            model_name=model_name,
+            embed_batch_size=embed_batch_size,
+            variant="onnx-int8" if quantize else "onnx-fp32",
+            max_length=export_config["max_seq_length"],
+            **kwargs,
+        )
+
+        options = ort.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = [node.name for node in self._session.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(str(export_path))
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        encoded = self._tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self._input_names}
+        token_embeddings = self._session.run(None, inputs)[0]
+        return mean_pool_normalize(token_embeddings, encoded["attention_mask"]).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+
+def create_embedding_model(backend: Optional[str] = None, device: Optional[str] = None,
+                           batch_size: Optional[int] = None) -> BaseEmbedding:
+    """
+    Build the configured embedding model.
+
+    Args:
+        backend: "auto", "torch" or "onnx" (default: settings.embedding_backend)
+        device: "auto", "cuda" or "cpu" for the torch backend (default: settings.embedding_device)
+        batch_size: Texts per forward pass (default: the backend's default)
+    """
+    requested = backend or settings.embedding_backend
+    backend = resolve_backend(requested, device or settings.embedding_device)
+    kwargs = {"embed_batch_size": batch_size} if batch_size else {}
+
+    if backend == "onnx":
+        quantize = settings.embedding_onnx_quantize
+        logger.info(f"Loading embedding model {settings.embedding_model_name} "
+                    f"(onnxruntime, {'int8' if quantize else 'fp32'}, CPU)")
+        try:
+            return OnnxEmbedding(
+                model_name=settings.embedding_model_name,
+                export_dir=settings.embedding_onnx_dir,
+                quantize=quantize,
+                num_threads=settings.embedding_num_threads,
+                **kwargs,
+            )
+        except Exception as e:
+            if requested != "auto":
+                raise
+            # A replica must still start when the ONNX path is broken (e.g. export dependencies missing)
+            logger.warning(f"ONNX embedding backend unavailable ({e}); using sentence-transformers on CPU")
+
+    # Imported lazily so ONNX-only replicas don't pay for loading it
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    device = resolve_device(device or settings.embedding_device)
+    if device == "cpu" and settings.embedding_num_threads > 0:
+        import torch
+        torch.set_num_threads(settings.embedding_num_threads)
+    logger.info(f"Loading embedding model {settings.embedding_model_name} (sentence-transformers on {device})")
+    return HuggingFaceEmbedding(model_name=settings.embedding_model_name, device=device, **kwargs)
@@ -0,0 +1,170 @@
+"""
+Persistent on-disk embedding cache
+
+Maps (embedding model, normalized chunk text) to its embedding so
+re-ingesting identical text (chunk-size experiments, --overwrite rebuilds,
+re-added PDFs) costs no GPU/CPU time.
+
+Layout, one directory per model:
+    keys.bin     16-byte BLAKE2b digests, one per row (append-only)
+    vectors.f16  float16 rows of `dim` values, memory-mapped for reads
+    meta.json    model name and dimension
+
+Rows are appended vectors-first, keys-second; on load both files are cut
+back to the number of complete rows, so a crash mid-write loses at most
+the last batch.
+"""
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 16
+DTYPE = np.float16
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-extracted text with different line breaks still hits"""
+    return " ".join(text.split())
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """Cache key for a chunk: hash of model name and normalized text"""
+    digest = hashlib.blake2b(digest_size=KEY_BYTES)
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """
+    Append-only embedding store with an in-memory hash index.
+
+    Vectors are stored as float16 (half the size of float32; the precision
+    loss is far below what changes nearest-neighbour rankings for
+    normalized sentence embeddings). Single writer: ingestion only.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.model_name = model_name
+        self.dir = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.keys_path = self.dir / "keys.bin"
+        self.vectors_path = self.dir / "vectors.f16"
+        self.meta_path = self.dir / "meta.json"
+
+        self.dim: Optional[int] = None
+        self.index: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.index)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def load(self) -> "EmbeddingCache":
+        """Build the hash index from disk (missing cache = empty)"""
+        if not self.meta_path.exists():
+            return self
+
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read embedding cache metadata {self.meta_path}: {e}. Starting empty.")
+            return self
+        if meta.get("model_name") != self.model_name:
+            logger.warning(f"Embedding cache {self.dir} belongs to {meta.get('model_name')}, ignoring it")
+            return self
+
+        self.dim = int(meta["dim"])
+        row_bytes = self.dim * np.dtype(DTYPE).itemsize
+        key_count = self.keys_path.stat().st_size // KEY_BYTES if self.keys_path.exists() else 0
+        vector_count = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+        rows = min(key_count, vector_count)
+
+        # Drop a partially written tail
+        if self.keys_path.exists():
+            with open(self.keys_path, "r+b") as f:
+                f.truncate(rows * KEY_BYTES)
+        if self.vectors_path.exists():
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+
+        if rows:
+            keys = self.keys_path.read_bytes()
+            for row in range(rows):
+                self.index[keys[row * KEY_BYTES:(row + 1) * KEY_BYTES]] = row
+        logger.info(f"✓ Embedding cache loaded: {rows} vectors ({self.dir})")
+        return self
+
+    def _mapped_vectors(self) -> np.memmap:
+        """Memory-map the vector file, remapping after it has grown"""
+        if self._vectors is None or self._vectors.shape[0] < self.size:
+            self._vectors = np.memmap(self.vectors_path, dtype=DTYPE, mode="r", shape=(self.size, self.dim))
+        return self._vectors
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings; None for texts not in the cache"""
+        keys = [cache_key(self.model_name, text) for text in texts]
+        rows = [self.index.get(key) for key in keys]
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        found = [i for i, row in enumerate(rows) if row is not None]
+        if found:
+            vectors = self._mapped_vectors()[[rows[i] for i in found]].astype(np.float32)
+            for i, vector in zip(found, vectors):
+                results[i] = vector.tolist()
+
+        self.hits += len(found)
+        self.misses += len(texts) - len(found)
+        return results
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Append new embeddings (texts already cached are skipped)"""
+        new_keys, new_vectors, seen = [], [], set()
+        for text, embedding in zip(texts, embeddings):
+            key = cache_key(self.model_name, text)
+            if key in self.index or key in seen:
+                continue
+            seen.add(key)
+            new_keys.append(key)
+            new_vectors.append(embedding)
+        if not new_keys:
+            return
+
+        vectors = np.asarray(new_vectors, dtype=DTYPE)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.meta_path, "w") as f:
+                json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.keys_path, "ab") as f:
+            f.write(b"".join(new_keys))
+
+        start = self.size
+        for offset, key in enumerate(new_keys):
+            self.index[key] = start + offset
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        return (f"Embedding cache: {self.hits}/{lookups} hits ({self.hit_rate:.1%}), "
+                f"{self.misses} chunks embedded, {self.size} vectors stored")
@@ -0,0 +1,83 @@
+"""
+Score gate in front of the LLM relevance grader
+
+Retrieval scores are dense similarities on ChromaVectorStore's
+exp(-L2 distance) scale (HybridRetriever keeps the same scale). When the
+best retrieved chunk is clearly on topic or clearly off topic, the yes/no
+grading completion adds a round-trip without changing the outcome:
+
+  top score >= grading_accept_score   auto-accept ("yes", no LLM call)
+  top score <  grading_reject_score   auto-reject ("no", rewrite follows)
+  in between                          ask the LLM as before
+
+Documents without scores (all 0.0) always go to the LLM. The counters are
+logged with every decision and exposed in /api/metrics, so the thresholds
+can be tuned from real traffic.
+"""
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+AUTO_ACCEPT = "auto_accept"
+AUTO_REJECT = "auto_reject"
+LLM = "llm"
+
+
+class GradingGate:
+    """Decides from retrieval scores alone when it can, counting each path"""
+
+    def __init__(self, enabled: bool = settings.grading_gate_enabled,
+                 accept_score: float = settings.grading_accept_score,
+                 reject_score: float = settings.grading_reject_score):
+        if reject_score > accept_score:
+            raise ValueError(f"grading_reject_score ({reject_score}) must not exceed "
+                             f"grading_accept_score ({accept_score})")
+        self.enabled = enabled
+        self.accept_score = accept_score
+        self.reject_score = reject_score
+        self._lock = threading.Lock()
+        self.counts = {AUTO_ACCEPT: 0, AUTO_REJECT: 0, LLM: 0}
+
+    def path_for(self, scores: List[float]) -> str:
+        """AUTO_ACCEPT, AUTO_REJECT or LLM for these retrieval scores"""
+        top = max(scores, default=0.0)
+        if not self.enabled or top <= 0.0:
+            return LLM
+        if top >= self.accept_score:
+            return AUTO_ACCEPT
+        if top < self.reject_score:
+            return AUTO_REJECT
+        return LLM
+
+    def decide(self, scores: List[float]) -> Optional[str]:
+        """"yes"/"no" when the scores settle it, None when the LLM has to grade"""
+        path = self.path_for(scores)
+        with self._lock:
+            self.counts[path] += 1
+            total = sum(self.counts.values())
+            summary = ", ".join(f"{name} {count / total:.0%}" for name, count in self.counts.items())
+        logger.info(f"  Grading gate: {path} (top score {max(scores, default=0.0):.2f}; {summary} of {total})")
+        if path == AUTO_ACCEPT:
+            return "yes"
+        if path == AUTO_REJECT:
+            return "no"
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                "enabled": self.enabled,
+                "accept_score": self.accept_score,
+                "reject_score": self.reject_score,
+                **self.counts,
+                "llm_calls_saved_rate": (total - self.counts[LLM]) / total if total else 0.0,
+            }
+
+
+# Global gate instance (counters aggregate over all agentic queries)
+grading_gate = GradingGate()
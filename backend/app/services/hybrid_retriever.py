@@ -0,0 +1,191 @@
+"""
+Hybrid (BM25 + dense) retriever with reciprocal-rank fusion
+
+Runs the dense Chroma query and the BM25 search for the same question and
+fuses the two rankings with RRF: score(d) = sum over rankings of
+1 / (rrf_k + rank). RRF only uses ranks, so the incomparable BM25 and
+cosine scales never need to be normalized against each other.
+
+The returned NodeWithScore.score stays a dense similarity (same
+exp(-L2 distance) scale ChromaVectorStore reports), so downstream
+thresholds and grading keep their meaning; for chunks only BM25 found,
+it is computed from the chunk's stored embedding.
+
+MultiQueryRetriever applies the same fusion to several phrasings of one
+question at once (the agentic fan-out mode): one batched embedding call,
+one Chroma query for all query vectors, BM25 per phrasing, one RRF.
+"""
+import logging
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+from llama_index.core import QueryBundle, VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+from .bm25_index import BM25Index
+from .reranker import RerankingRetriever
+from .retrieval_cache import CachedRetriever, retrieval_cache
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> Dict[str, float]:
+    """Fuse ranked id lists; higher is better"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, 1):
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (rrf_k + rank)
+    return fused
+
+
+def shared_bm25_index() -> Optional[BM25Index]:
+    """The registry's BM25 index, reloaded after each ingestion run (None before the first)"""
+    from .model_registry import model_registry
+    return model_registry.get_bm25_index()
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense + BM25 retrieval over the same Chroma collection"""
+
+    def __init__(self, vector_store, embed_model, bm25_index: Optional[BM25Index] = None,
+                 top_k: int = settings.top_k_retrieval,
+                 candidate_k: int = settings.hybrid_candidate_k,
+                 rrf_k: int = settings.hybrid_rrf_k):
+        super().__init__()
+        self.vector_store = vector_store
+        self.embed_model = embed_model
+        self.bm25_index = bm25_index  # Fixed index; None reads the shared one on every query
+        self.top_k = top_k
+        self.candidate_k = candidate_k
+        self.rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query_embedding = query_bundle.embedding or self.embed_model.get_query_embedding(query_bundle.query_str)
+
+        dense = self.vector_store.query(
+            VectorStoreQuery(query_embedding=query_embedding, similarity_top_k=self.candidate_k)
+        )
+        dense_nodes = {node.node_id: NodeWithScore(node=node, score=similarity)
+                       for node, similarity in zip(dense.nodes, dense.similarities)}
+        bm25_index = self.bm25_index or shared_bm25_index()
+        lexical_ids = ([node_id for node_id, _ in bm25_index.search(query_bundle.query_str, self.candidate_k)]
+                       if bm25_index is not None else [])
+
+        fused = reciprocal_rank_fusion([list(dense_nodes), lexical_ids], self.rrf_k)
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:self.top_k]
+
+        missing = [node_id for node_id in top_ids if node_id not in dense_nodes]
+        if missing:
+            dense_nodes.update(self._fetch_nodes(missing, query_embedding))
+
+        # Ids deleted since the BM25 index was built are simply dropped
+        results = [dense_nodes[node_id] for node_id in top_ids if node_id in dense_nodes]
+        logger.debug(f"Hybrid retrieval: {len(dense.nodes)} dense, {len(lexical_ids)} lexical candidates, "
+                     f"{len(missing)} lexical-only in top {self.top_k}")
+        return results
+
+    def _fetch_nodes(self, node_ids: List[str], query_embedding: List[float]) -> Dict[str, NodeWithScore]:
+        """Load lexical-only hits from Chroma and score them like dense hits"""
+        return fetch_scored_nodes(self.vector_store, node_ids, [query_embedding])
+
+
+def _chroma_node(node_id: str, text: str, metadata: Optional[dict]) -> TextNode:
+    try:
+        node = metadata_dict_to_node(metadata)
+        node.set_content(text)
+    except Exception:
+        node = TextNode(text=text, id_=node_id, metadata=metadata or {})
+    return node
+
+
+def fetch_scored_nodes(vector_store, node_ids: List[str],
+                       query_embeddings: List[List[float]]) -> Dict[str, NodeWithScore]:
+    """Load chunks from Chroma, scored exp(-L2 distance) to the closest query embedding"""
+    result = vector_store.client.get(ids=node_ids, include=["documents", "metadatas", "embeddings"])
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+
+    nodes = {}
+    for node_id, text, metadata, embedding in zip(
+        result["ids"], result["documents"], result["metadatas"], result["embeddings"]
+    ):
+        distance = float(np.min(np.sum((queries - np.asarray(embedding, dtype=np.float32)) ** 2, axis=1)))
+        nodes[node_id] = NodeWithScore(node=_chroma_node(node_id, text, metadata), score=math.exp(-distance))
+    return nodes
+
+
+class MultiQueryRetriever:
+    """Fused retrieval for several phrasings of the same question"""
+
+    def __init__(self, vector_store, embed_model, bm25_index: Optional[BM25Index] = None,
+                 lexical: bool = True,
+                 top_k: int = settings.top_k_retrieval,
+                 candidate_k: int = settings.hybrid_candidate_k,
+                 rrf_k: int = settings.hybrid_rrf_k):
+        self.vector_store = vector_store
+        self.embed_model = embed_model
+        self.bm25_index = bm25_index  # Fixed index; None reads the shared one on every query
+        self.lexical = lexical  # False: dense rankings only
+        self.top_k = top_k
+        self.candidate_k = candidate_k
+        self.rrf_k = rrf_k
+
+    def retrieve(self, queries: List[str]) -> List[NodeWithScore]:
+        embeddings = retrieval_cache.get_query_embeddings(self.embed_model, queries)
+
+        # One Chroma query for every query vector
+        dense = self.vector_store.client.query(query_embeddings=embeddings, n_results=self.candidate_k,
+                                               include=["documents", "metadatas", "distances"])
+        rankings, dense_nodes = [], {}
+        for ids, texts, metadatas, distances in zip(dense["ids"], dense["documents"],
+                                                    dense["metadatas"], dense["distances"]):
+            rankings.append(ids)
+            for node_id, text, metadata, distance in zip(ids, texts, metadatas, distances):
+                similarity = math.exp(-distance)
+                if node_id not in dense_nodes or similarity > dense_nodes[node_id].score:
+                    dense_nodes[node_id] = NodeWithScore(node=_chroma_node(node_id, text, metadata),
+                                                         score=similarity)
+        bm25_index = (self.bm25_index or shared_bm25_index()) if self.lexical else None
+        if bm25_index is not None:
+            rankings += [[node_id for node_id, _ in bm25_index.search(query, self.candidate_k)]
+                         for query in queries]
+
+        fused = reciprocal_rank_fusion(rankings, self.rrf_k)
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:self.top_k]
+
+        missing = [node_id for node_id in top_ids if node_id not in dense_nodes]
+        if missing:
+            dense_nodes.update(fetch_scored_nodes(self.vector_store, missing, embeddings))
+
+        logger.debug(f"Multi-query retrieval: {len(queries)} queries, {len(fused)} candidates, "
+                     f"{len(missing)} lexical-only in top {self.top_k}")
+        return [dense_nodes[node_id] for node_id in top_ids if node_id in dense_nodes]
+
+
+def create_retriever(index: VectorStoreIndex, vector_store, embed_model,
+                     top_k: int = settings.top_k_retrieval,
+                     bm25_index: Optional[BM25Index] = None,
+                     rerank: bool = False) -> BaseRetriever:
+    """Hybrid retriever when enabled (over bm25_index, or the shared index reloaded after
+    each ingestion run), otherwise dense only; with rerank, it over-fetches
+    rerank_candidates and the cross-encoder keeps top_k; wrapped in the retrieval
+    cache when that is enabled"""
+    fetch_k = max(top_k, settings.rerank_candidates) if rerank else top_k
+    if settings.retrieval_mode == "hybrid":
+        if (bm25_index or shared_bm25_index()) is None:
+            logger.warning(f"Hybrid retrieval enabled but no BM25 index at {settings.bm25_index_path} yet; "
+                           f"dense results only until 'python ingest.py' builds it.")
+        retriever = HybridRetriever(vector_store, embed_model, bm25_index, top_k=fetch_k,
+                                    candidate_k=max(fetch_k, settings.hybrid_candidate_k))
+    else:
+        retriever = index.as_retriever(similarity_top_k=fetch_k)
+    if rerank:
+        retriever = RerankingRetriever(retriever, top_k=top_k)
+
+    if settings.retrieval_cache_enabled:
+        retriever = CachedRetriever(retriever, embed_model, top_k=top_k)
+    return retriever
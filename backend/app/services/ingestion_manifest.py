@@ -0,0 +1,334 @@
+"""
+Ingestion Manifest for incremental re-ingestion
+
+Records, for every PDF already in the vector store, its path, size, mtime,
+SHA-256, the chunk ids written for it and the chunking parameters used.
+ingest.py diffs the current directory against this manifest so a rerun only
+parses and embeds PDFs that are new or changed, and deletes the chunks of
+PDFs that were changed or removed.
+
+Also provides the checkpoint journal used by `ingest.py --resume` and the
+deterministic chunk ids that make replayed batches idempotent upserts.
+"""
+import hashlib
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Hash a file in fixed-size blocks (PDFs can be hundreds of MB)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(file_sha256: str, chunk_size: int, chunk_overlap: int, index: int) -> str:
+    """
+    Deterministic id for the index-th chunk of a PDF.
+
+    Splitting is deterministic for a given file and chunking config, so a
+    re-parsed PDF yields the same ids and re-written batches overwrite
+    (upsert) instead of duplicating.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"aimentor:{file_sha256}:{chunk_size}:{chunk_overlap}:{index}"))
+
+
+@dataclass
+class ManifestEntry:
+    """One ingested PDF"""
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+    chunk_ids: List[str] = field(default_factory=list)
+    chunk_size: int = 0
+    chunk_overlap: int = 0
+
+
+@dataclass
+class ManifestDiff:
+    """Result of comparing the PDFs on disk with the manifest"""
+    new: List[Path] = field(default_factory=list)
+    changed: List[Path] = field(default_factory=list)
+    unchanged: List[Path] = field(default_factory=list)
+    removed: List[ManifestEntry] = field(default_factory=list)
+    digests: Dict[str, str] = field(default_factory=dict)  # Manifest key -> SHA-256 computed during the diff
+    dirty: bool = False  # Entries were refreshed in place; the manifest needs saving
+
+    @property
+    def to_ingest(self) -> List[Path]:
+        return self.new + self.changed
+
+    def summary(self) -> str:
+        return (f"{len(self.new)} new, {len(self.changed)} changed, "
+                f"{len(self.unchanged)} unchanged, {len(self.removed)} removed")
+
+
+class IngestionManifest:
+    """
+    Persistent JSON manifest of ingested PDFs.
+
+    An entry is only reused when the chunking parameters and embedding model
+    match the current run; otherwise the PDF is treated as changed.
+    """
+
+    def __init__(self, path: str, chunk_size: int, chunk_overlap: int, embedding_model: str):
+        self.path = Path(path)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedding_model = embedding_model
+        self.stored_embedding_model = embedding_model  # Model the stored entries were embedded with
+        self.entries: Dict[str, ManifestEntry] = {}
+
+    @staticmethod
+    def key_for(pdf_path: Path) -> str:
+        """Manifest key for a PDF (absolute path)"""
+        return str(Path(pdf_path).resolve())
+
+    def load(self) -> "IngestionManifest":
+        """Load entries from disk (missing or unreadable manifest = empty)"""
+        if not self.path.exists():
+            return self
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read ingestion manifest {self.path}: {e}. Starting fresh.")
+            return self
+
+        self.stored_embedding_model = data.get("embedding_model")
+        if self.stored_embedding_model != self.embedding_model:
+            # Vectors from another model are useless; every entry is stale
+            logger.info(f"Embedding model changed ({self.stored_embedding_model} -> {self.embedding_model}), "
+                        f"all PDFs will be re-ingested")
+
+        for raw in data.get("files", []):
+            entry = ManifestEntry(**raw)
+            self.entries[entry.path] = entry
+        return self
+
+    def save(self):
+        """Atomically write the manifest (never leaves a half-written file)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embedding_model,
+            "files": [asdict(entry) for entry in self.entries.values()],
+        }
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """Forget everything (used with --overwrite)"""
+        self.entries.clear()
+        self.stored_embedding_model = self.embedding_model
+
+    def _is_reusable(self, entry: ManifestEntry) -> bool:
+        return (entry.chunk_size == self.chunk_size
+                and entry.chunk_overlap == self.chunk_overlap
+                and self.stored_embedding_model == self.embedding_model)
+
+    def diff(self, pdf_files: List[Path], root: Optional[Path] = None) -> ManifestDiff:
+        """
+        Compare PDFs on disk with the manifest.
+
+        Size and mtime are checked first; the file is only hashed when they
+        differ, so an unchanged corpus is diffed without reading any PDFs.
+
+        Args:
+            pdf_files: PDFs found in the ingestion directory
+            root: Ingestion directory. Only entries under it can be reported as
+                removed, so ingesting a different directory never deletes the
+                rest of the collection.
+        """
+        result = ManifestDiff()
+        seen = set()
+
+        for pdf_path in pdf_files:
+            key = self.key_for(pdf_path)
+            seen.add(key)
+            stat = pdf_path.stat()
+            entry = self.entries.get(key)
+
+            if entry is None:
+                result.new.append(pdf_path)
+                continue
+
+            if not self._is_reusable(entry):
+                result.changed.append(pdf_path)
+                result.removed.append(entry)
+                continue
+
+            if entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+                result.unchanged.append(pdf_path)
+                continue
+
+            digest = file_sha256(pdf_path)
+            if digest == entry.sha256:
+                # Touched but identical content: refresh mtime, keep chunks
+                entry.mtime = stat.st_mtime
+                result.dirty = True
+                result.unchanged.append(pdf_path)
+            else:
+                result.digests[key] = digest
+                result.changed.append(pdf_path)
+                result.removed.append(entry)
+
+        root_key = self.key_for(root) if root is not None else None
+        for key, entry in self.entries.items():
+            if key in seen:
+                continue
+            if root_key is None or key.startswith(root_key.rstrip(os.sep) + os.sep):
+                result.removed.append(entry)
+
+        return result
+
+    def record(self, pdf_path: Path, chunk_ids: List[str], sha256: Optional[str] = None):
+        """Record a fully ingested PDF"""
+        stat = pdf_path.stat()
+        key = self.key_for(pdf_path)
+        self.entries[key] = ManifestEntry(
+            path=key,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            sha256=sha256 or file_sha256(pdf_path),
+            chunk_ids=list(chunk_ids),
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+        )
+
+    def remove(self, key: str) -> Optional[ManifestEntry]:
+        """Drop an entry (after its chunks were deleted)"""
+        return self.entries.pop(key, None)
+
+
+class IngestionCheckpoint:
+    """
+    Append-only journal of ingestion progress (JSON lines).
+
+    Records every committed batch and every completed PDF, fsync'd as it
+    happens, so `ingest.py --resume` can continue after a crash or OOM from
+    the last committed batch instead of re-embedding finished work.
+
+    Batch positions are only meaningful for the same file content, chunking
+    config and batch size, so the header records the latter two and every
+    record carries the file's SHA-256.
+    """
+
+    def __init__(self, path: str, chunk_size: int, chunk_overlap: int, batch_size: int):
+        self.path = Path(path)
+        self.params = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "batch_size": batch_size}
+        self.last_batch: Dict[Tuple[str, str], int] = {}  # (key, sha256) -> last committed batch index
+        self.completed: Dict[str, str] = {}               # key -> sha256
+        self._file = None
+
+    def load(self) -> "IngestionCheckpoint":
+        """Replay the journal from a previous (interrupted) run"""
+        if not self.path.exists():
+            return self
+
+        with open(self.path, "r") as f:
+            lines = f.readlines()
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn final line from a crash mid-write
+                continue
+
+            event = record.get("event")
+            if event == "start":
+                if record.get("params") != self.params:
+                    logger.warning(f"Checkpoint {self.path} was written with {record.get('params')}, "
+                                   f"current run uses {self.params}; ignoring it")
+                    self.last_batch.clear()
+                    self.completed.clear()
+                    return self
+            elif event == "batch":
+                self.last_batch[(record["path"], record["sha256"])] = record["batch"]
+            elif event == "pdf_done":
+                self.completed[record["path"]] = record["sha256"]
+                self.last_batch.pop((record["path"], record["sha256"]), None)
+            elif event == "pdf_reset":
+                self._forget(record["path"], record.get("sha256"))
+
+        return self
+
+    def open(self, resume: bool):
+        """Start journaling. Without resume, the previous journal is discarded."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not resume:
+            self.last_batch.clear()
+            self.completed.clear()
+        self._file = open(self.path, "a" if resume else "w")
+        if resume and self._file.tell() > 0:
+            # Terminate a possibly torn last line before appending
+            self._file.write("\n")
+        self._append({"event": "start", "params": self.params, "resume": resume})
+
+    def close(self, remove: bool = False):
+        """Stop journaling; remove the journal once a run finished cleanly"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove and self.path.exists():
+            self.path.unlink()
+
+    def _append(self, record: dict):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def resume_after(self, key: str, sha256: str) -> int:
+        """Index of the last committed batch for this file content (-1 = none)"""
+        return self.last_batch.get((key, sha256), -1)
+
+    def has_progress(self, key: str) -> bool:
+        return any(k[0] == key for k in self.last_batch)
+
+    def committed_chunk_ids(self, key: str, sha256: str) -> List[str]:
+        """Ids of the chunks an earlier run wrote for this file content (empty = no progress)"""
+        num_chunks = (self.resume_after(key, sha256) + 1) * self.params["batch_size"]
+        return [chunk_id(sha256, self.params["chunk_size"], self.params["chunk_overlap"], index)
+                for index in range(num_chunks)]
+
+    def batch_committed(self, key: str, sha256: str, batch_index: int):
+        self.last_batch[(key, sha256)] = batch_index
+        self._append({"event": "batch", "path": key, "sha256": sha256, "batch": batch_index})
+
+    def pdf_completed(self, key: str, sha256: str):
+        self.completed[key] = sha256
+        self.last_batch.pop((key, sha256), None)
+        self._append({"event": "pdf_done", "path": key, "sha256": sha256})
+
+    def pdf_reset(self, key: str, sha256: Optional[str] = None):
+        """
+        Forget partial progress (its chunks were rolled back), for one file content or all of them.
+        Journaled only while the journal is open.
+        """
+        self._forget(key, sha256)
+        if self._file is None:
+            return
+        record = {"event": "pdf_reset", "path": key}
+        if sha256 is not None:
+            record["sha256"] = sha256
+        self._append(record)
+
+    def _forget(self, key: str, sha256: Optional[str]):
+        self.last_batch = {k: v for k, v in self.last_batch.items()
+                           if k[0] != key or (sha256 is not None and k[1] != sha256)}
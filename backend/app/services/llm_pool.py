@@ -0,0 +1,255 @@
+"""
+Load-balanced pool of llama.cpp backends
+
+settings.llm_base_urls lists several llama.cpp servers (comma-separated;
+empty means just settings.llm_base_url). Each MistralLLM call leases one:
+
+  - sticky by conversation: a conversation keeps going to the same backend
+    while it is healthy, so the server's KV/prompt cache for that
+    conversation stays warm
+  - otherwise least outstanding requests (ties: fewest requests served)
+  - at most llm_max_concurrency calls per backend (its -np slots): a
+    backend is only leased while it has a free slot, so a sticky
+    conversation moves elsewhere rather than overfilling a busy server.
+    The scheduler (llm_scheduler.py) admits capacity() calls, i.e. the
+    slots of the healthy backends, so a free slot exists for every
+    admitted call
+  - backends that fail llm_eject_after_failures calls in a row (connection
+    errors, timeouts, 5xx) are ejected for llm_eject_seconds
+  - a background probe of GET /v1/models every llm_health_probe_interval_seconds
+    ejects unreachable backends early and re-admits recovered ones
+
+The conversation id is taken from the llm_conversation context variable
+(the chat endpoints wrap their LLM work in sticky_conversation(), which
+resets it afterwards), so LlamaIndex and LangGraph internals that call
+the LLM route correctly without threading an extra argument through
+them. run_blocking() copies it into worker threads.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+llm_conversation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_conversation", default=None)
+
+# Conversation ids that do not identify a conversation (ChatRequest default)
+ANONYMOUS_CONVERSATIONS = frozenset({"", "default", "unknown"})
+
+
+def configured_backend_urls() -> List[str]:
+    """LLM server base URLs without the /v1 suffix"""
+    urls = [url.strip() for url in settings.llm_base_urls.split(",") if url.strip()]
+    urls = urls or [settings.llm_base_url]
+    return [url.rstrip("/").removesuffix("/v1") for url in urls]
+
+
+@contextmanager
+def sticky_conversation(conversation_id: Optional[str]) -> Iterator[None]:
+    """Route LLM calls made inside the block by conversation id"""
+    token = llm_conversation.set(conversation_id)
+    try:
+        yield
+    finally:
+        llm_conversation.reset(token)
+
+
+class LLMBackend:
+    """One llama.cpp server and its health/load counters"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "available": self.available,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class BackendLease:
+    """A backend chosen for one call; mark_failed() on transport errors"""
+
+    def __init__(self, pool: "LLMBackendPool", backend: LLMBackend):
+        self.pool = pool
+        self.backend = backend
+        self.url = backend.url
+        self.failed = False
+
+    def mark_failed(self, error: Exception):
+        self.failed = True
+        self.pool.record_failure(self.backend, error)
+
+
+class LLMBackendPool:
+    """Least-outstanding, conversation-sticky selection with ejection and health probes"""
+
+    def __init__(self, urls: List[str],
+                 eject_after_failures: int = settings.llm_eject_after_failures,
+                 eject_seconds: float = settings.llm_eject_seconds,
+                 probe_interval: float = settings.llm_health_probe_interval_seconds,
+                 max_sticky_conversations: int = 10000,
+                 slots_per_backend: int = settings.llm_max_concurrency):
+        if not urls:
+            raise ValueError("LLMBackendPool needs at least one backend URL")
+        self.backends = [LLMBackend(url) for url in urls]
+        self.slots_per_backend = slots_per_backend  # 0 = unlimited
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.probe_interval = probe_interval
+        self.max_sticky_conversations = max_sticky_conversations
+        self._sticky: "OrderedDict[str, LLMBackend]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+
+    @property
+    def max_attempts(self) -> int:
+        """Tries per non-streaming call: fail over once when there is somewhere to go"""
+        return 2 if len(self.backends) > 1 else 1
+
+    def capacity(self) -> int:
+        """Concurrent calls the healthy backends can take (0 = unlimited)"""
+        if self.slots_per_backend <= 0:
+            return 0
+        with self._lock:
+            healthy = sum(1 for b in self.backends if b.available)
+        return self.slots_per_backend * max(healthy, 1)
+
+    def _has_free_slot(self, backend: LLMBackend) -> bool:
+        return self.slots_per_backend <= 0 or backend.outstanding < self.slots_per_backend
+
+    # === Selection ===
+
+    def choose(self, conversation_id: Optional[str] = None,
+               exclude: Optional[LLMBackend] = None) -> LLMBackend:
+        self._ensure_probing()
+        if conversation_id in ANONYMOUS_CONVERSATIONS:
+            conversation_id = None
+
+        with self._lock:
+            candidates = [b for b in self.backends if b.available and b is not exclude]
+            if not candidates:
+                # Everything is ejected: try whichever comes back first rather than failing outright
+                candidates = [min((b for b in self.backends if b is not exclude),
+                                  key=lambda b: b.ejected_until, default=self.backends[0])]
+
+            # Only backends with a free slot; if none has one (a failover retry), the least loaded
+            candidates = [b for b in candidates if self._has_free_slot(b)] or candidates
+
+            backend = self._sticky.get(conversation_id) if conversation_id else None
+            if backend is None or backend not in candidates:
+                backend = min(candidates, key=lambda b: (b.outstanding, b.requests))
+
+            if conversation_id:
+                self._sticky[conversation_id] = backend
+                self._sticky.move_to_end(conversation_id)
+                while len(self._sticky) > self.max_sticky_conversations:
+                    self._sticky.popitem(last=False)
+
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    @contextmanager
+    def lease(self, conversation_id: Optional[str] = None,
+              exclude: Optional[LLMBackend] = None) -> Iterator[BackendLease]:
+        """Lease a backend for one call (conversation defaults to the context variable)"""
+        backend = self.choose(conversation_id or llm_conversation.get(), exclude=exclude)
+        lease = BackendLease(self, backend)
+        try:
+            yield lease
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+            if not lease.failed:
+                self.record_success(backend)
+
+    # === Health ===
+
+    def record_success(self, backend: LLMBackend):
+        with self._lock:
+            backend.consecutive_failures = 0
+
+    def record_failure(self, backend: LLMBackend, error: Exception):
+        with self._lock:
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            backend.last_error = str(error)[:200]
+            if backend.consecutive_failures >= self.eject_after_failures and len(self.backends) > 1:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+                logger.warning(f"LLM backend {backend.url} ejected for {self.eject_seconds:.0f}s "
+                               f"after {backend.consecutive_failures} failures: {backend.last_error}")
+
+    def probe(self, backend: LLMBackend) -> bool:
+        """GET /v1/models; ejects on failure, re-admits on success"""
+        try:
+            response = requests.get(f"{backend.url}/v1/models", timeout=2)
+            healthy = response.ok
+            error = None if healthy else f"health probe returned {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            healthy, error = False, f"health probe failed: {e}"
+
+        with self._lock:
+            if healthy:
+                if not backend.available:
+                    logger.info(f"✓ LLM backend {backend.url} is healthy again")
+                backend.ejected_until = 0.0
+                backend.consecutive_failures = 0
+            elif len(self.backends) > 1:
+                backend.last_error = error
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+        return healthy
+
+    def probe_all(self) -> Dict[str, bool]:
+        return {backend.url: self.probe(backend) for backend in self.backends}
+
+    def _ensure_probing(self):
+        """Start the background health probe (only useful with more than one backend)"""
+        if self._probe_thread is not None or len(self.backends) < 2 or self.probe_interval <= 0:
+            return
+        with self._lock:
+            if self._probe_thread is None:
+                self._probe_thread = threading.Thread(target=self._probe_loop, name="llm-health-probe", daemon=True)
+                self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                self.probe_all()
+            except Exception as e:
+                logger.error(f"LLM health probe error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backends": [backend.as_dict() for backend in self.backends],
+                "slots_per_backend": self.slots_per_backend,
+                "sticky_conversations": len(self._sticky),
+            }
+
+
+# Global pool of the configured backends, shared by the LLM client and the scheduler
+llm_backend_pool = LLMBackendPool(configured_backend_urls())
@@ -0,0 +1,321 @@
+"""
+LLM request scheduler (admission control + priority queue)
+
+Each llama.cpp server only serves a few generations at once (its -np
+slots). Without admission control a burst of
+students piles requests onto it until they hit the HTTP timeout. Every
+MistralLLM call now takes a slot from this scheduler first:
+
+  - at most llm_max_concurrency calls per backend run at once: the
+    scheduler admits as many calls as the healthy backends have slots
+    (LLMBackendPool.capacity()), and the pool only leases a backend with
+    a free slot
+  - waiting calls are served by priority, then arrival order, so short
+    routing/grading calls overtake long answer generations
+  - overload fails fast: a full queue (llm_max_queue) is rejected with 429
+    immediately, and a call still queued after llm_queue_timeout_seconds
+    with 503, both as LLMOverloadedError
+  - callers with a deadline of their own pass timeout=<seconds left>; when
+    that runs out first the wait ends with LLMDeadlineError (a subclass),
+    so they can fall back instead of reporting overload
+
+A slot is an LLMTicket. Sync callers block in ticket.wait(); async callers
+poll ticket.wait_async() and can report ticket.position() in between (the
+WebSocket stream sends these as "queue" events).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .llm_pool import llm_backend_pool
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMPriority(IntEnum):
+    """Lower value is served first"""
+    ROUTING = 0      # Phase routing / classification: a handful of tokens
+    GRADING = 1      # Relevance grading: "yes" / "no"
+    REWRITE = 2      # Query rewrite: one sentence
+    GENERATION = 3   # Full answers
+
+
+class LLMOverloadedError(RuntimeError):
+    """The LLM server is saturated; maps to HTTP 429 (queue full) or 503 (queue timeout)"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMDeadlineError(LLMOverloadedError):
+    """The caller's own deadline passed while it was queued for a slot"""
+
+
+class LLMTicket:
+    """A queued or granted slot on the LLM server"""
+
+    def __init__(self, scheduler: "LLMScheduler", priority: LLMPriority, seq: int, timeout: float):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.seq = seq
+        self.timeout = timeout  # Longest wait for a grant (queue timeout or the caller's deadline)
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.released = False
+        self._event = threading.Event()
+        self._futures: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def __lt__(self, other: "LLMTicket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def deadline(self) -> float:
+        return self.enqueued_at + self.timeout
+
+    def position(self) -> int:
+        """1-based place in the queue (0 once granted)"""
+        return self.scheduler.position(self)
+
+    def wait(self):
+        """Block until granted; raises LLMOverloadedError (503) at the deadline"""
+        if not self._event.wait(max(0.0, self.deadline - time.monotonic())):
+            self.scheduler.expire(self)
+
+    async def wait_async(self, poll_seconds: float = 1.0) -> bool:
+        """Wait up to poll_seconds; True once granted, False if still queued
+
+        Raises LLMOverloadedError (503) once the deadline has passed.
+        """
+        future = self.scheduler.register_future(self)
+        if future is None:
+            return True
+        remaining = self.deadline - time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(0.0, min(poll_seconds, remaining)))
+            return True
+        except asyncio.TimeoutError:
+            if time.monotonic() >= self.deadline:
+                self.scheduler.expire(self)
+            return self.granted
+
+    def release(self):
+        """Give the slot back (or leave the queue); safe to call twice"""
+        self.scheduler.release(self)
+
+    def _notify(self) -> bool:
+        """Wake the waiters; False if the only waiters were on event loops that have closed"""
+        self._event.set()
+        woken = not self._futures  # Sync waiters (or none yet) pick up the event
+        for loop, future in self._futures:
+            try:
+                loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(True))
+                woken = True
+            except RuntimeError:
+                pass  # Loop closed: the client disconnected or its worker shut down
+        self._futures.clear()
+        return woken
+
+    def __enter__(self) -> "LLMTicket":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class LLMScheduler:
+    """Bounded concurrency with a priority queue in front of the LLM server"""
+
+    def __init__(self, max_concurrency: int = settings.llm_max_concurrency,
+                 max_queue: int = settings.llm_max_queue,
+                 queue_timeout: float = settings.llm_queue_timeout_seconds,
+                 capacity: Optional[Callable[[], int]] = None):
+        """
+        Args:
+            max_concurrency: Calls admitted at once (0 = unlimited)
+            capacity: Replaces max_concurrency with a live limit, e.g. the
+                slots of the healthy backends in an LLMBackendPool
+        """
+        self._max_concurrency = max_concurrency
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._queue: List[LLMTicket] = []  # Heap ordered by (priority, seq)
+        self._seq = itertools.count()
+        self._running = 0
+        self._waits = deque(maxlen=1000)  # Seconds from submit to grant
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.expired_deadline = 0  # Callers whose own deadline passed in the queue
+
+    @property
+    def max_concurrency(self) -> int:
+        return self.capacity() if self.capacity is not None else self._max_concurrency
+
+    # === Admission ===
+
+    def submit(self, priority: LLMPriority = LLMPriority.GENERATION,
+               timeout: Optional[float] = None) -> LLMTicket:
+        """
+        Ticket that is granted now or queued; raises LLMOverloadedError (429) if the queue is full
+
+        Args:
+            timeout: Seconds the caller can wait at most (e.g. what is left of its
+                deadline); the wait never exceeds queue_timeout either way
+        """
+        wait = self.queue_timeout if timeout is None else min(self.queue_timeout, max(timeout, 0.0))
+        with self._lock:
+            ticket = LLMTicket(self, LLMPriority(priority), next(self._seq), wait)
+            self._dispatch()  # Capacity may have grown since the last release (a backend came back)
+            max_concurrency = self.max_concurrency
+            if max_concurrency <= 0 or (self._running < max_concurrency and not self._queue):
+                self._grant(ticket)
+            elif len(self._queue) >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise LLMOverloadedError(
+                    f"The tutor is at capacity ({self._running} answers in progress, "
+                    f"{len(self._queue)} waiting). Please try again shortly.",
+                    status_code=429,
+                    retry_after=self._retry_after()
+                )
+            else:
+                heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def acquire(self, priority: LLMPriority = LLMPriority.GENERATION,
+                timeout: Optional[float] = None) -> LLMTicket:
+        """Blocking submit + wait"""
+        ticket = self.submit(priority, timeout)
+        ticket.wait()
+        return ticket
+
+    async def acquire_async(self, priority: LLMPriority = LLMPriority.GENERATION,
+                            timeout: Optional[float] = None) -> LLMTicket:
+        """Non-blocking submit + wait"""
+        ticket = self.submit(priority, timeout)
+        try:
+            while not await ticket.wait_async(poll_seconds=ticket.timeout):
+                pass
+        except BaseException:
+            ticket.release()
+            raise
+        return ticket
+
+    # === Ticket callbacks ===
+
+    def release(self, ticket: LLMTicket):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self._running -= 1
+                self._dispatch()
+            else:
+                self._remove(ticket)
+
+    def expire(self, ticket: LLMTicket):
+        """Called by a waiter at its deadline; raises unless it was granted meanwhile"""
+        with self._lock:
+            if ticket.granted:
+                return
+            ticket.released = True
+            self._remove(ticket)
+            retry_after = self._retry_after()
+            if ticket.timeout < self.queue_timeout:
+                self.expired_deadline += 1
+            else:
+                self.rejected_timeout += 1
+        if ticket.timeout < self.queue_timeout:
+            raise LLMDeadlineError(
+                f"Ran out of time after {ticket.timeout:.1f}s waiting for the tutor model.",
+                status_code=503,
+                retry_after=retry_after
+            )
+        raise LLMOverloadedError(
+            f"Timed out after {self.queue_timeout:.0f}s waiting for the tutor model. Please try again shortly.",
+            status_code=503,
+            retry_after=retry_after
+        )
+
+    def register_future(self, ticket: LLMTicket) -> Optional[asyncio.Future]:
+        """Future resolved on grant (None if already granted)"""
+        with self._lock:
+            if ticket.granted:
+                return None
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            ticket._futures.append((loop, future))
+            return future
+
+    def position(self, ticket: LLMTicket) -> int:
+        with self._lock:
+            if ticket.granted:
+                return 0
+            return 1 + sum(1 for other in self._queue if other < ticket)
+
+    # === Internals (lock held) ===
+
+    def _grant(self, ticket: LLMTicket):
+        ticket.granted = True
+        if not ticket._notify():
+            # Nobody is left to use (or release) the slot: give it to the next ticket
+            logger.warning(f"Dropping abandoned {ticket.priority.name.lower()} LLM ticket")
+            ticket.released = True
+            return
+        self._running += 1
+        self.admitted += 1
+        self._waits.append(time.monotonic() - ticket.enqueued_at)
+
+    def _dispatch(self):
+        max_concurrency = self.max_concurrency
+        while self._queue and (max_concurrency <= 0 or self._running < max_concurrency):
+            self._grant(heapq.heappop(self._queue))
+
+    def _remove(self, ticket: LLMTicket):
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+
+    def _retry_after(self) -> int:
+        """Rough seconds until a slot frees up, for the Retry-After header"""
+        recent = list(self._waits)[-50:]
+        return max(1, int(statistics.median(recent))) if recent else 5
+
+    # === Metrics ===
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            by_priority = {p.name.lower(): 0 for p in LLMPriority}
+            for ticket in self._queue:
+                by_priority[ticket.priority.name.lower()] += 1
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": self._running,
+                "queue_depth": len(self._queue),
+                "queued_by_priority": by_priority,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "expired_deadline": self.expired_deadline,
+                "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+            }
+
+
+# Global scheduler instance shared by every MistralLLM call in the process
+# (llm_max_concurrency slots per healthy backend in the pool)
+llm_scheduler = LLMScheduler(capacity=llm_backend_pool.capacity)
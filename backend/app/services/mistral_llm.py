@@ -1,22 +1,99 @@
 """
 Custom LLM wrapper for llama.cpp server running Mistral-7B
+
+Connections are pooled: the sync methods share a requests.Session and the
+async methods (acomplete / astream_complete) a keep-alive httpx.AsyncClient,
+so grading, rewrite and generation calls reuse TCP connections instead of
+opening one per call. Pool size and timeouts come from settings.llm_*.
+
+Every call first takes a slot from the LLM scheduler (llm_scheduler.py).
+Callers pass priority=LLMPriority.X (default GENERATION), or ticket=... when
+they already hold a slot (e.g. to report queue position while waiting).
+deadline=<time.monotonic() value> bounds both the wait for a slot (raising
+LLMDeadlineError) and the HTTP read timeout.
+
+Calls are spread over the backends in llm_pool.py; conversation_id=... (or
+the llm_conversation context variable) keeps a conversation on one backend.
+
+Requests ask llama.cpp to cache_prompt, so a prompt sharing its static
+prefix with the slot's previous prompt (see prompts.py) only evaluates the
+new tokens. prompt_prefix=... additionally pins that prefix to a slot when
+settings.llm_prefix_slots is set.
+
+classify(prompt, SomeEnum) is for one-word decisions (grading, routing): a
+GBNF grammar restricts the output to the enum's labels, with temperature 0
+and a few tokens, and the parsed enum member is returned.
 """
-from typing import Any
+from enum import Enum
+from typing import Any, Dict, List, Optional, Type, TypeVar
+import asyncio
 import json
+import logging
+import re
+import threading
+import time
+import zlib
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
 from llama_index.core.llms.callbacks import llm_completion_callback
 from app.core.config import settings
+from app.services.llm_pool import LLMBackendPool, llm_conversation
+from app.services.llm_scheduler import LLMPriority, LLMTicket, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+E = TypeVar("E", bound=Enum)
+
+
+def _labels(labels: Type[E]) -> Dict[str, E]:
+    """Accepted spellings (member name and value, as given and lowercase) -> member"""
+    spellings: Dict[str, E] = {}
+    for member in labels:
+        for text in (member.name, str(member.value)):
+            spellings.setdefault(text, member)
+            spellings.setdefault(text.lower(), member)
+    return spellings
+
+
+def label_grammar(labels: Type[Enum]) -> str:
+    """GBNF grammar that only admits one of the labels (optionally after a space)"""
+    def literal(text: str) -> str:
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return 'root ::= " "? (' + " | ".join(literal(text) for text in _labels(labels)) + ")"
+
+
+def parse_label(text: str, labels: Type[E]) -> E:
+    """The enum member named by text; raises ValueError if it names none or several"""
+    spellings = _labels(labels)
+    cleaned = text.strip().strip(".\"'").lower()
+    if cleaned in spellings:
+        return spellings[cleaned]
+    # Servers without grammar support may wrap the label in a sentence
+    found = {member for spelling, member in spellings.items()
+             if re.search(rf"\b{re.escape(spelling.lower())}\b", text.lower())}
+    if len(found) == 1:
+        return found.pop()
+    raise ValueError(f"LLM output {text[:80]!r} is not one of {[m.name for m in labels]}")
 
 
 class MistralLLM(CustomLLM):
     """Custom LLM that connects to llama.cpp server"""
 
-    context_window: int = 4096  # Keep as reasonable default for LLaMA-based models
+    context_window: int = settings.llm_context_window
     num_output: int = settings.llm_max_tokens
     model_name: str = settings.llm_model_name
     server_url: str = settings.llm_base_url.rstrip('/v1')  # Remove /v1 suffix if present
     temperature: float = settings.llm_temperature
+    timeout: float = settings.llm_timeout_seconds
+
+    _session: Optional[requests.Session] = PrivateAttr(default=None)
+    _async_clients: Dict[Any, httpx.AsyncClient] = PrivateAttr(default_factory=dict)  # Event loop -> client
+    _client_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _pool: Optional[LLMBackendPool] = PrivateAttr(default=None)
 
     @property
     def metadata(self) -> LLMMetadata:
@@ -26,117 +103,372 @@ class MistralLLM(CustomLLM):
             model_name=self.model_name,
         )
 
-    @llm_completion_callback()
-    def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
-        """Call llama.cpp server for completion"""
-        try:
-            request_data = {
-                "prompt": prompt,
-                "max_tokens": kwargs.get("max_tokens", self.num_output),
-                "temperature": kwargs.get("temperature", self.temperature),
-                "stop": kwargs.get("stop", []),  # IMPROVEMENT: Removed "\n\n" stop sequence for fuller responses
-            }
-
-            # Debug logging
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"LLM Request - Prompt length: {len(prompt)} chars")
-            logger.info(f"LLM Request - Prompt preview: {prompt[:200]}...")
-            logger.info(f"LLM Request - Max tokens: {request_data['max_tokens']}, Temp: {request_data['temperature']}")
-
-            response = requests.post(
-                f"{self.server_url}/v1/completions",
-                json=request_data,
-                timeout=300
-            )
-            response.raise_for_status()
-            result = response.json()
+    # === Connection pools ===
 
-            response_text = result["choices"][0]["text"]
-            logger.info(f"LLM Response - Text length: {len(response_text)} chars")
-            logger.info(f"LLM Response - Text preview: {repr(response_text[:200])}")
-            logger.info(f"LLM Response - Finish reason: {result['choices'][0].get('finish_reason', 'unknown')}")
+    @property
+    def session(self) -> requests.Session:
+        """Pooled keep-alive session for the sync methods"""
+        if self._session is None:
+            with self._client_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.llm_pool_max_connections)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
 
-            return CompletionResponse(
-                text=response_text,
-                raw=result,
-            )
-        except requests.exceptions.ConnectionError as e:
-            raise RuntimeError(
-                f"Failed to connect to LLM server at {self.server_url}. "
-                f"Make sure the llama.cpp server is running on port {self.server_url.split(':')[-1].split('/')[0]}. "
-                f"Error: {str(e)}"
-            )
-        except requests.exceptions.Timeout as e:
-            raise RuntimeError(
-                f"LLM server request timed out after 300 seconds. "
-                f"The model may be overloaded or the request may be too complex. "
-                f"Error: {str(e)}"
-            )
-        except requests.exceptions.HTTPError as e:
-            raise RuntimeError(
-                f"LLM server returned error status {response.status_code}: {response.text}. "
-                f"Error: {str(e)}"
-            )
+    @property
+    def backend_pool(self) -> LLMBackendPool:
+        """Backends to balance over (just server_url unless a pool was attached)"""
+        if self._pool is None:
+            self._pool = LLMBackendPool([self.server_url])
+        return self._pool
+
+    def use_backends(self, urls: List[str]) -> "MistralLLM":
+        """Balance calls over several llama.cpp servers (see llm_pool.py)"""
+        return self.use_pool(LLMBackendPool(urls))
+
+    def use_pool(self, pool: LLMBackendPool) -> "MistralLLM":
+        """Balance calls over an existing pool (e.g. the global one the scheduler sizes itself by)"""
+        self._pool = pool
+        self.server_url = pool.backends[0].url
+        return self
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Pooled keep-alive client for the async methods (one per event loop)"""
+        loop = asyncio.get_running_loop()
+        with self._client_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                # Connections belong to the loop that opened them. Clients of closed loops
+                # can no longer be awaited; dropping them lets their transports be collected.
+                for closed in [other for other in self._async_clients if other.is_closed()]:
+                    del self._async_clients[closed]
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    timeout=self._httpx_timeout(self.timeout),
+                    limits=httpx.Limits(
+                        max_connections=settings.llm_pool_max_connections,
+                        max_keepalive_connections=settings.llm_pool_max_keepalive,
+                        keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+                    ),
+                )
+        return client
+
+    @staticmethod
+    def _httpx_timeout(timeout: float) -> httpx.Timeout:
+        return httpx.Timeout(timeout, connect=settings.llm_connect_timeout_seconds)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        """Close the session and every loop's async client (app shutdown)"""
+        self.close()
+        current = asyncio.get_running_loop()
+        with self._client_lock:
+            clients, self._async_clients = self._async_clients, {}
+        for loop, client in clients.items():
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    # === Scheduling ===
+
+    @staticmethod
+    def _slot_timeout(deadline: Optional[float]) -> Optional[float]:
+        """Longest wait for a slot: what is left of the caller's deadline (None = queue timeout)"""
+        return deadline - time.monotonic() if deadline is not None else None
+
+    @staticmethod
+    def _take_slot(kwargs: Dict[str, Any]) -> Optional[LLMTicket]:
+        """Queue for a slot (None if the caller passed one in via ticket=)"""
+        priority = kwargs.pop("priority", LLMPriority.GENERATION)
+        if kwargs.pop("ticket", None) is not None:
+            return None
+        return llm_scheduler.acquire(priority, timeout=MistralLLM._slot_timeout(kwargs.get("deadline")))
+
+    @staticmethod
+    async def _atake_slot(kwargs: Dict[str, Any]) -> Optional[LLMTicket]:
+        priority = kwargs.pop("priority", LLMPriority.GENERATION)
+        if kwargs.pop("ticket", None) is not None:
+            return None
+        return await llm_scheduler.acquire_async(priority, timeout=MistralLLM._slot_timeout(kwargs.get("deadline")))
+
+    def _request_timeout(self, deadline: Optional[float]) -> float:
+        """HTTP read timeout: self.timeout, cut to what is left of the caller's deadline (at least 1s)"""
+        if deadline is None:
+            return self.timeout
+        return min(self.timeout, max(deadline - time.monotonic(), 1.0))
+
+    # === Request helpers ===
+
+    def _request_body(self, prompt: str, stream: bool, **kwargs: Any) -> Dict[str, Any]:
+        body = {
+            "prompt": prompt,
+            "max_tokens": kwargs.get("max_tokens", self.num_output),
+            "temperature": kwargs.get("temperature", self.temperature),
+            # IMPROVEMENT: Removed "\n\n" stop sequence for fuller responses (non-streaming)
+            "stop": kwargs.get("stop", ["\n\n"] if stream else []),
+            "cache_prompt": kwargs.get("cache_prompt", settings.llm_cache_prompt),
+        }
+        if kwargs.get("grammar"):
+            body["grammar"] = kwargs["grammar"]
+        if kwargs.get("t_max_predict_ms"):
+            body["t_max_predict_ms"] = kwargs["t_max_predict_ms"]  # Server-side generation time limit
+        prefix = kwargs.get("prompt_prefix")
+        if prefix and settings.llm_prefix_slots > 0:
+            body["id_slot"] = zlib.crc32(prefix.encode("utf-8")) % settings.llm_prefix_slots
+        if stream:
+            body["stream"] = True
+        return body
+
+    def _log_request(self, prompt: str, body: Dict[str, Any]):
+        logger.info(f"LLM Request - Prompt length: {len(prompt)} chars")
+        logger.info(f"LLM Request - Prompt preview: {prompt[:200]}...")
+        logger.info(f"LLM Request - Max tokens: {body['max_tokens']}, Temp: {body['temperature']}")
+
+    def _parse_completion(self, result: Dict[str, Any]) -> CompletionResponse:
+        try:
+            response_text = result["choices"][0]["text"]
         except (KeyError, IndexError) as e:
             raise RuntimeError(
                 f"LLM server returned unexpected response format. "
-                f"Response: {result if 'result' in locals() else 'No response'}. "
+                f"Response: {result}. "
                 f"Error: {str(e)}"
             )
+        logger.info(f"LLM Response - Text length: {len(response_text)} chars")
+        logger.info(f"LLM Response - Text preview: {repr(response_text[:200])}")
+        logger.info(f"LLM Response - Finish reason: {result['choices'][0].get('finish_reason', 'unknown')}")
+        return CompletionResponse(text=response_text, raw=result)
 
-    @llm_completion_callback()
-    def stream_complete(self, prompt: str, **kwargs: Any):
-        """Streaming completion with error handling"""
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[CompletionResponse]:
+        """CompletionResponse for one SSE line (None for keep-alives and [DONE])"""
+        if not line.startswith('data: '):
+            return None
+        json_data = line[6:]
+        if json_data == "[DONE]":
+            return None
         try:
-            response = requests.post(
-                f"{self.server_url}/v1/completions",
-                json={
-                    "prompt": prompt,
-                    "max_tokens": kwargs.get("max_tokens", self.num_output),
-                    "temperature": kwargs.get("temperature", self.temperature),
-                    "stop": kwargs.get("stop", ["\n\n"]),
-                    "stream": True,
-                },
-                timeout=300,
-                stream=True,
-            )
-            response.raise_for_status()
-            for line in response.iter_lines():
-                if line:
-                    decoded_line = line.decode('utf-8')
-                    if decoded_line.startswith('data: '):
-                        json_data = decoded_line[6:]
-                        if json_data != "[DONE]":
-                            data = json.loads(json_data)
-                            yield CompletionResponse(
-                                text=data["choices"][0]["text"],
-                                raw=data,
-                            )
-        except requests.exceptions.ConnectionError as e:
-            raise RuntimeError(
-                f"Failed to connect to LLM server at {self.server_url}. "
-                f"Make sure the llama.cpp server is running. "
-                f"Error: {str(e)}"
-            )
-        except requests.exceptions.Timeout as e:
-            raise RuntimeError(
-                f"LLM server streaming request timed out. "
-                f"Error: {str(e)}"
-            )
-        except requests.exceptions.HTTPError as e:
-            raise RuntimeError(
-                f"LLM server returned error status {response.status_code}: {response.text}. "
-                f"Error: {str(e)}"
-            )
+            data = json.loads(json_data)
+            return CompletionResponse(text=data["choices"][0]["text"], raw=data)
         except (json.JSONDecodeError, KeyError, IndexError) as e:
             raise RuntimeError(
                 f"LLM server returned malformed streaming response. "
                 f"Error: {str(e)}"
             )
 
+    @staticmethod
+    def _connection_error(e: Exception, url: str) -> RuntimeError:
+        return RuntimeError(
+            f"Failed to connect to LLM server at {url}. "
+            f"Make sure the llama.cpp server is running on port {url.split(':')[-1].split('/')[0]}. "
+            f"Error: {str(e)}"
+        )
+
+    @staticmethod
+    def _timeout_error(e: Exception, timeout: float) -> RuntimeError:
+        return RuntimeError(
+            f"LLM server request timed out after {timeout:.0f} seconds. "
+            f"The model may be overloaded or the request may be too complex. "
+            f"Error: {str(e)}"
+        )
+
+    @staticmethod
+    def _status_error(status_code: int, text: str, e: Exception) -> RuntimeError:
+        return RuntimeError(
+            f"LLM server returned error status {status_code}: {text}. "
+            f"Error: {str(e)}"
+        )
+
+    # === Sync API ===
+
+    def _post(self, body: Dict[str, Any], conversation_id: Optional[str],
+              timeout: Optional[float] = None) -> Dict[str, Any]:
+        """POST /v1/completions to a pooled backend, failing over once on connection errors"""
+        timeout = timeout or self.timeout
+        failed_backend = None
+        for attempt in range(self.backend_pool.max_attempts):
+            last_attempt = attempt + 1 == self.backend_pool.max_attempts
+            with self.backend_pool.lease(conversation_id, exclude=failed_backend) as lease:
+                try:
+                    response = self.session.post(f"{lease.url}/v1/completions", json=body, timeout=timeout)
+                    response.raise_for_status()
+                    return response.json()
+                except requests.exceptions.ConnectionError as e:
+                    lease.mark_failed(e)
+                    if last_attempt:
+                        raise self._connection_error(e, lease.url)
+                    failed_backend = lease.backend
+                    logger.warning(f"LLM backend {lease.url} unreachable, failing over")
+                except requests.exceptions.Timeout as e:
+                    if timeout >= self.timeout:  # A deadline-shortened timeout says nothing about the backend
+                        lease.mark_failed(e)
+                    raise self._timeout_error(e, timeout)
+                except requests.exceptions.HTTPError as e:
+                    if response.status_code >= 500:
+                        lease.mark_failed(e)
+                    raise self._status_error(response.status_code, response.text, e)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+        """Call llama.cpp server for completion"""
+        ticket = self._take_slot(kwargs)
+        timeout = self._request_timeout(kwargs.pop("deadline", None))  # Once the slot is granted
+        conversation_id = kwargs.pop("conversation_id", None)
+        body = self._request_body(prompt, stream=False, **kwargs)
+        self._log_request(prompt, body)
+        try:
+            result = self._post(body, conversation_id, timeout)
+        finally:
+            if ticket is not None:
+                ticket.release()
+        return self._parse_completion(result)
+
+    def classify(self, prompt: str, labels: Type[E], **kwargs: Any) -> E:
+        """Constrained one-label completion, parsed into a member of labels
+
+        Raises ValueError if the output cannot be parsed (only possible when
+        the server ignores the grammar).
+        """
+        defaults = {"max_tokens": settings.llm_classify_max_tokens, "temperature": 0.0, "stop": ["\n"]}
+        response = self.complete(prompt, grammar=label_grammar(labels), **{**defaults, **kwargs})
+        return parse_label(response.text, labels)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, **kwargs: Any):
+        """Streaming completion with error handling"""
+        ticket = self._take_slot(kwargs)
+        timeout = self._request_timeout(kwargs.pop("deadline", None))
+        conversation_id = kwargs.pop("conversation_id", None)
+        body = self._request_body(prompt, stream=True, **kwargs)
+        try:
+            with self.backend_pool.lease(conversation_id) as lease:
+                try:
+                    with self.session.post(f"{lease.url}/v1/completions", json=body,
+                                           timeout=timeout, stream=True) as response:
+                        response.raise_for_status()
+                        for line in response.iter_lines():
+                            if line:
+                                chunk = self._parse_stream_line(line.decode('utf-8'))
+                                if chunk is not None:
+                                    yield chunk
+                except requests.exceptions.ConnectionError as e:
+                    lease.mark_failed(e)
+                    raise self._connection_error(e, lease.url)
+                except requests.exceptions.Timeout as e:
+                    if timeout >= self.timeout:  # A deadline-shortened timeout says nothing about the backend
+                        lease.mark_failed(e)
+                    raise self._timeout_error(e, timeout)
+                except requests.exceptions.HTTPError as e:
+                    if response.status_code >= 500:
+                        lease.mark_failed(e)
+                    raise self._status_error(response.status_code, response.text, e)
+        finally:
+            if ticket is not None:
+                ticket.release()
+
     @llm_completion_callback()
     def stream_chat(self, messages, **kwargs: Any):
         """Streaming chat endpoint"""
         prompt = self.messages_to_prompt(messages)
         return self.stream_complete(prompt, **kwargs)
+
+    # === Async API ===
+
+    async def _apost(self, body: Dict[str, Any], conversation_id: Optional[str],
+                     timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Async _post()"""
+        timeout = timeout or self.timeout
+        failed_backend = None
+        for attempt in range(self.backend_pool.max_attempts):
+            last_attempt = attempt + 1 == self.backend_pool.max_attempts
+            with self.backend_pool.lease(conversation_id, exclude=failed_backend) as lease:
+                try:
+                    response = await self.async_client.post(f"{lease.url}/v1/completions", json=body,
+                                                            timeout=self._httpx_timeout(timeout))
+                    response.raise_for_status()
+                    return response.json()
+                except httpx.ConnectError as e:
+                    lease.mark_failed(e)
+                    if last_attempt:
+                        raise self._connection_error(e, lease.url)
+                    failed_backend = lease.backend
+                    logger.warning(f"LLM backend {lease.url} unreachable, failing over")
+                except httpx.TimeoutException as e:
+                    if timeout >= self.timeout:
+                        lease.mark_failed(e)
+                    raise self._timeout_error(e, timeout)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code >= 500:
+                        lease.mark_failed(e)
+                    raise self._status_error(e.response.status_code, e.response.text, e)
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        """Completion without blocking the event loop"""
+        ticket = await self._atake_slot(kwargs)
+        timeout = self._request_timeout(kwargs.pop("deadline", None))
+        conversation_id = kwargs.pop("conversation_id", None)
+        body = self._request_body(prompt, stream=False, **kwargs)
+        self._log_request(prompt, body)
+        try:
+            result = await self._apost(body, conversation_id, timeout)
+        finally:
+            if ticket is not None:
+                ticket.release()
+        return self._parse_completion(result)
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        """Streaming completion without blocking the event loop
+
+        Usage: async for chunk in await llm.astream_complete(prompt)
+        """
+        priority = kwargs.get("priority", LLMPriority.GENERATION)
+        has_ticket = kwargs.get("ticket") is not None
+        deadline = kwargs.get("deadline")
+        # Resolved now: the generator body may run outside the caller's context
+        conversation_id = kwargs.get("conversation_id") or llm_conversation.get()
+        body = self._request_body(prompt, stream=True, **kwargs)
+        client = self.async_client
+
+        async def gen():
+            # Slot is taken when iteration starts and held until the stream ends
+            ticket = None if has_ticket else await llm_scheduler.acquire_async(
+                priority, timeout=self._slot_timeout(deadline))
+            timeout = self._request_timeout(deadline)
+            try:
+                with self.backend_pool.lease(conversation_id) as lease:
+                    try:
+                        async with client.stream("POST", f"{lease.url}/v1/completions", json=body,
+                                                 timeout=self._httpx_timeout(timeout)) as response:
+                            if response.is_error:
+                                await response.aread()
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if line:
+                                    chunk = self._parse_stream_line(line)
+                                    if chunk is not None:
+                                        yield chunk
+                    except httpx.ConnectError as e:
+                        lease.mark_failed(e)
+                        raise self._connection_error(e, lease.url)
+                    except httpx.TimeoutException as e:
+                        if timeout >= self.timeout:
+                            lease.mark_failed(e)
+                        raise self._timeout_error(e, timeout)
+                    except httpx.HTTPStatusError as e:
+                        if e.response.status_code >= 500:
+                            lease.mark_failed(e)
+                        raise self._status_error(e.response.status_code, e.response.text, e)
+            finally:
+                if ticket is not None:
+                    ticket.release()
+
+        return gen()
@@ -0,0 +1,172 @@
+"""
+Process-wide Model Registry
+
+Holds the heavyweight, shareable handles of the API process: the embedding
+model, the LLM client, the ChromaDB client and its collections, and the
+BM25 index. RAGService, AgenticRAGService and source_verification.py all
+take them from here, so each is created once per process instead of once
+per service, and the global LlamaIndex Settings are configured in one place.
+
+Every load is timed and its RSS growth recorded (see stats()/summary()).
+"""
+import logging
+import os
+import resource
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from llama_index.core import Settings
+from llama_index.vector_stores.chroma import ChromaVectorStore
+import chromadb
+
+from .bm25_index import BM25Index
+from .collection_version import CollectionVersion, collection_version
+from .embedding_backends import create_embedding_model
+from .llm_pool import llm_backend_pool
+from .mistral_llm import MistralLLM
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Non-Linux fallback: peak RSS (KB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelRegistry:
+    """Lazily created, shared model and database handles"""
+
+    def __init__(self, version: CollectionVersion = collection_version):
+        self._lock = threading.RLock()
+        self._handles: Dict[str, Any] = {}
+        self._load_stats: Dict[str, Dict[str, float]] = {}
+        self._llama_index_configured = False
+        self._version_reader = version
+        self._bm25_version: Optional[str] = None  # Collection version the BM25 index was loaded at
+
+    def _load(self, name: str, factory: Callable[[], Any]) -> Any:
+        """factory(), with its load time and RSS growth recorded under name"""
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        handle = factory()
+        self._load_stats[name] = {
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+        }
+        logger.info(f"✓ Loaded {name} in {self._load_stats[name]['load_seconds']:.2f}s "
+                    f"(+{self._load_stats[name]['rss_delta_mb']:.0f} MB RSS)")
+        return handle
+
+    def _get_or_load(self, name: str, factory: Callable[[], Any]) -> Any:
+        if name in self._handles:
+            return self._handles[name]
+
+        with self._lock:
+            if name not in self._handles:
+                self._handles[name] = self._load(name, factory)
+        return self._handles[name]
+
+    def get_embed_model(self):
+        """Shared embedding model (see embedding_backends.create_embedding_model)"""
+        return self._get_or_load("embed_model", create_embedding_model)
+
+    def get_llm(self) -> MistralLLM:
+        """Shared client for the llama.cpp server(s) in settings.llm_base_urls"""
+        return self._get_or_load("llm", lambda: MistralLLM(
+            server_url=settings.llm_base_url.replace("/v1", ""),  # Remove /v1 suffix
+            temperature=settings.llm_temperature,
+            num_output=settings.llm_max_tokens,
+        ).use_pool(llm_backend_pool))
+
+    def get_cross_encoder(self):
+        """Shared cross-encoder for reranking (CPU; see reranker.py)"""
+        def load():
+            from sentence_transformers import CrossEncoder
+            return CrossEncoder(settings.rerank_model_name, max_length=settings.rerank_max_length, device="cpu")
+        return self._get_or_load("cross_encoder", load)
+
+    def get_chroma_client(self):
+        """Shared ChromaDB client (one PersistentClient per process)"""
+        return self._get_or_load("chroma_client", lambda: chromadb.PersistentClient(path=settings.chroma_db_path))
+
+    def get_collection(self, name: Optional[str] = None):
+        """Shared handle to a ChromaDB collection (default: the course materials)"""
+        name = name or settings.chroma_collection_name
+        client = self.get_chroma_client()
+        return self._get_or_load(f"collection:{name}", lambda: client.get_or_create_collection(name=name))
+
+    def get_vector_store(self, name: Optional[str] = None) -> ChromaVectorStore:
+        """LlamaIndex vector store over the shared collection"""
+        name = name or settings.chroma_collection_name
+        collection = self.get_collection(name)
+        return self._get_or_load(f"vector_store:{name}", lambda: ChromaVectorStore(chroma_collection=collection))
+
+    def get_bm25_index(self) -> Optional[BM25Index]:
+        """
+        Shared BM25 index built by ingest.py (None if it has not been built).
+
+        ingest.py rewrites the index and then bumps the collection version, so the
+        index (or the missing one) is reloaded whenever the version changes.
+        """
+        version = self._version_reader.current()
+        if version != self._bm25_version:
+            with self._lock:
+                if version != self._bm25_version:
+                    if self._bm25_version is not None:
+                        logger.info(f"Collection changed ({self._bm25_version[:8]} -> {version[:8]}), "
+                                    f"reloading BM25 index")
+                    index = self._load("bm25_index", lambda: BM25Index.load(settings.bm25_index_path))
+                    # Swapped in one assignment: concurrent readers get the old index or the new one
+                    self._handles["bm25_index"] = index
+                    self._bm25_version = version
+        return self._handles.get("bm25_index")
+
+    def configure_llama_index(self):
+        """Point the global LlamaIndex Settings at the shared models (once)"""
+        with self._lock:
+            if self._llama_index_configured:
+                return
+            Settings.llm = self.get_llm()
+            Settings.embed_model = self.get_embed_model()
+            Settings.chunk_size = settings.chunk_size
+            Settings.chunk_overlap = settings.chunk_overlap
+            self._llama_index_configured = True
+
+    def stats(self) -> Dict[str, Any]:
+        """Load time and RSS growth per handle, plus current process RSS"""
+        return {
+            "loaded": dict(self._load_stats),
+            "total_load_seconds": round(sum(s["load_seconds"] for s in self._load_stats.values()), 3),
+            "rss_mb": round(current_rss_mb(), 1),
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"Model registry: {len(stats['loaded'])} handles loaded in "
+                f"{stats['total_load_seconds']:.2f}s, process RSS {stats['rss_mb']:.0f} MB")
+
+    async def aclose(self):
+        """Close pooled connections held by loaded handles (app shutdown)"""
+        llm = self._handles.get("llm")
+        if llm is not None:
+            await llm.aclose()
+
+    def reset(self):
+        """Drop all handles (tests and benchmarks)"""
+        with self._lock:
+            self._handles.clear()
+            self._load_stats.clear()
+            self._llama_index_configured = False
+            self._bm25_version = None
+
+
+# Global registry instance
+model_registry = ModelRegistry()
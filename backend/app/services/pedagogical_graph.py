@@ -7,11 +7,16 @@ that determines the next phase based on user input.
 """
 
 import logging
-from typing import Dict, Any, TypedDict
+from typing import Any, AsyncGenerator, Dict, Tuple, TypedDict
 from langgraph.graph import StateGraph, END
 
 from ..models.pedagogical_state import PedagogicalState, TutoringPhase
-from ..services.agentic_rag import get_agentic_rag_service
+from ..services.agentic_rag import get_agentic_rag_service, get_agentic_rag_service_async
+from ..services.llm_scheduler import LLMOverloadedError, LLMPriority, llm_scheduler
+from ..services.phase_classifier import phase_classifier
+from ..core.config import settings
+from ..services.prompts import (EXPLANATION_PREFIX, IMPLEMENTATION_PREFIX, INITIAL_PREFIX, REFLECTION_PREFIX,
+                                ROUTING_PREFIX, build_routing_prompt, build_tutor_prompt)
 
 
 class PedagogicalGraphState(TypedDict):
@@ -23,47 +28,82 @@ class PedagogicalGraphState(TypedDict):
 logger = logging.getLogger(__name__)
 
 
-def initial_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Initial phase: Understand the user's problem and set up tutoring context.
-
-    This node focuses on clarifying the problem statement and understanding
-    what the student is trying to accomplish.
-    """
+def _phase_prompt(phase: TutoringPhase, state: Dict[str, Any]) -> Tuple[str, str]:
+    """(prompt, static prefix) for an LLM-backed phase"""
     pedagogical_state = state['pedagogical_state']
     user_message = state['user_message']
 
-    prompt = f"""A student says: '{user_message}'
+    if phase == TutoringPhase.INITIAL:
+        return build_tutor_prompt(INITIAL_PREFIX, user_message, message_label="A student says"), INITIAL_PREFIX
+    if phase == TutoringPhase.EXPLANATION:
+        return build_tutor_prompt(EXPLANATION_PREFIX, user_message,
+                                  problem_statement=pedagogical_state.problem_statement or user_message), EXPLANATION_PREFIX
+    if phase == TutoringPhase.IMPLEMENTATION:
+        return build_tutor_prompt(IMPLEMENTATION_PREFIX, user_message,
+                                  problem_statement=pedagogical_state.problem_statement or "Not specified yet",
+                                  message_label="User's current implementation step/question"), IMPLEMENTATION_PREFIX
+    if phase == TutoringPhase.REFLECTION:
+        return build_tutor_prompt(REFLECTION_PREFIX, user_message,
+                                  problem_statement=pedagogical_state.problem_statement or "Not specified yet",
+                                  message_label="User's latest work/achievement"), REFLECTION_PREFIX
+    raise ValueError(f"Phase {phase.value} does not call the LLM")
+
+
+def _debugging_reply(user_message: str) -> str:
+    """Fixed debugging prompt for the student (no LLM call, to avoid LLM confusion)"""
+    # Extract just the problem part, removing leading acknowledgments
+    problem_part = user_message
+    if user_message.lower().startswith(("yes.", "yeah.", "ok.", "okay.", "sure.")):
+        problem_part = user_message.split('.', 1)[1].strip() if '.' in user_message else user_message
 
-Help them clarify their problem. Ask what they're trying to solve and any relevant details.
+    return f"""That sounds frustrating! Can you tell me more about what you're trying to do?
 
-Be supportive and encouraging. Ask 1-2 clarifying questions. Do NOT provide solutions.
+You mentioned: {problem_part}
 
-Start naturally without mentioning you are an example."""
+What does the error or issue mean? Can you show me the relevant part of your code?"""
 
-    # Use existing RAG service for context if needed
-    rag_service = get_agentic_rag_service()
-    response = rag_service.llm.complete(prompt)
 
-    # Update the problem statement if it seems clear from the message
-    problem_statement = pedagogical_state.problem_statement
-    if not problem_statement and len(user_message.strip()) > 20:
+def _finish_phase(state: Dict[str, Any], phase: TutoringPhase, generation: str) -> Dict[str, Any]:
+    """Node result: the tutor's reply and the updated (not yet committed) PedagogicalState"""
+    pedagogical_state = state['pedagogical_state']
+    user_message = state['user_message']
+
+    update = {
+        "last_user_message": user_message,
+        "last_ai_response": generation,
+        "phase_history": pedagogical_state.phase_history + [phase.value],
+        "current_phase": phase,
+        "routed_from": pedagogical_state.current_phase.value,
+        "routed_by": state.get("routed_by")
+    }
+    if phase == TutoringPhase.INITIAL and not pedagogical_state.problem_statement and len(user_message.strip()) > 20:
         # Simple heuristic: if the message is substantial and there's no problem statement yet
         # use it as a tentative problem statement
-        problem_statement = user_message.strip()
+        update["problem_statement"] = user_message.strip()
 
     return {
-        "generation": response.text,
-        "pedagogical_state": pedagogical_state.model_copy(update={
-            "last_user_message": user_message,
-            "last_ai_response": response.text,
-            "problem_statement": problem_statement,
-            "phase_history": pedagogical_state.phase_history + ["initial"],
-            "current_phase": TutoringPhase.INITIAL
-        })
+        "generation": generation,
+        "pedagogical_state": pedagogical_state.model_copy(update=update)
     }
 
 
+def _run_phase(state: Dict[str, Any], phase: TutoringPhase) -> Dict[str, Any]:
+    prompt, prefix = _phase_prompt(phase, state)
+    rag_service = get_agentic_rag_service()
+    response = rag_service.llm.complete(prompt, prompt_prefix=prefix)
+    return _finish_phase(state, phase, response.text)
+
+
+def initial_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Initial phase: Understand the user's problem and set up tutoring context.
+
+    This node focuses on clarifying the problem statement and understanding
+    what the student is trying to accomplish.
+    """
+    return _run_phase(state, TutoringPhase.INITIAL)
+
+
 def explanation_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Explanation phase: Help the student break down the problem.
@@ -71,37 +111,7 @@ def explanation_node(state: Dict[str, Any]) -> Dict[str, Any]:
     This node guides the student through creating a high-level plan
     and understanding the problem components.
     """
-    pedagogical_state = state['pedagogical_state']
-    user_message = state['user_message']
-
-    prompt = f"""You are an expert Computer Science tutor helping a student break down their problem.
-
-Problem statement: '{pedagogical_state.problem_statement or user_message}'
-User's current message: '{user_message}'
-
-Your goal in this EXPLANATION phase is to:
-1. Help them create a high-level, step-by-step plan in plain English
-2. Identify key concepts they need to understand
-3. Suggest how to approach the problem systematically
-4. Break complex problems into manageable sub-problems
-
-Do NOT write code. Focus on planning and understanding.
-Ask guiding questions to help them think through the approach.
-
-Respond in a supportive tone and guide them step-by-step."""
-
-    rag_service = get_agentic_rag_service()
-    response = rag_service.llm.complete(prompt)
-
-    return {
-        "generation": response.text,
-        "pedagogical_state": pedagogical_state.model_copy(update={
-            "last_user_message": user_message,
-            "last_ai_response": response.text,
-            "phase_history": pedagogical_state.phase_history + ["explanation"],
-            "current_phase": TutoringPhase.EXPLANATION
-        })
-    }
+    return _run_phase(state, TutoringPhase.EXPLANATION)
 
 
 def implementation_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -110,37 +120,7 @@ def implementation_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
     This node helps the student work through a specific part of their solution.
     """
-    pedagogical_state = state['pedagogical_state']
-    user_message = state['user_message']
-
-    prompt = f"""You are an expert Computer Science tutor helping a student implement their solution.
-
-Problem statement: '{pedagogical_state.problem_statement or "Not specified yet"}'
-User's current implementation step/question: '{user_message}'
-
-Your goal in this IMPLEMENTATION phase is to:
-1. Help them think through the specific step they're working on
-2. Encourage them to consider different approaches before coding
-3. Guide them through writing pseudocode or thinking about logic
-4. Help them verify their approach makes sense
-
-Encourage them to think through the approach first before writing code.
-If they show code, focus on the logic and approach rather than syntax.
-
-Respond with guidance and questions to help them implement this specific step."""
-
-    rag_service = get_agentic_rag_service()
-    response = rag_service.llm.complete(prompt)
-
-    return {
-        "generation": response.text,
-        "pedagogical_state": pedagogical_state.model_copy(update={
-            "last_user_message": user_message,
-            "last_ai_response": response.text,
-            "phase_history": pedagogical_state.phase_history + ["implementation"],
-            "current_phase": TutoringPhase.IMPLEMENTATION
-        })
-    }
+    return _run_phase(state, TutoringPhase.IMPLEMENTATION)
 
 
 def debugging_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -150,28 +130,7 @@ def debugging_node(state: Dict[str, Any]) -> Dict[str, Any]:
     This node guides students through systematic debugging rather than
     giving them the direct solution.
     """
-    pedagogical_state = state['pedagogical_state']
-    user_message = state['user_message']
-
-    # Direct response to avoid LLM confusion
-    # Extract just the problem part, removing leading acknowledgments
-    problem_part = user_message
-    if user_message.lower().startswith(("yes.", "yeah.", "ok.", "okay.", "sure.")):
-        problem_part = user_message.split('.', 1)[1].strip() if '.' in user_message else user_message
-
-    return {
-        "generation": f"""That sounds frustrating! Can you tell me more about what you're trying to do?
-
-You mentioned: {problem_part}
-
-What does the error or issue mean? Can you show me the relevant part of your code?""",
-        "pedagogical_state": pedagogical_state.model_copy(update={
-            "last_user_message": user_message,
-            "last_ai_response": f"That sounds frustrating! Can you tell me more about what you're trying to do?\n\nYou mentioned: {problem_part}\n\nWhat does the error or issue mean? Can you show me the relevant part of your code?",
-            "phase_history": pedagogical_state.phase_history + ["debugging"],
-            "current_phase": TutoringPhase.DEBUGGING
-        })
-    }
+    return _finish_phase(state, TutoringPhase.DEBUGGING, _debugging_reply(state['user_message']))
 
 
 def reflection_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -181,86 +140,100 @@ def reflection_node(state: Dict[str, Any]) -> Dict[str, Any]:
     This node encourages metacognitive thinking and helps students learn
     from their problem-solving process.
     """
-    pedagogical_state = state['pedagogical_state']
-    user_message = state['user_message']
-
-    prompt = f"""You are an expert Computer Science tutor helping a student reflect on their work.
-
-Problem statement: '{pedagogical_state.problem_statement or "Not specified yet"}'
-User's latest work/achievement: '{user_message}'
-
-Your goal in this REFLECTION phase is to:
-1. Help them think about what they learned
-2. Consider alternative approaches or improvements
-3. Identify key takeaways from the problem
-4. Guide them to think about how this connects to other concepts
-
-Ask metacognitive questions like:
-- What was the most challenging part?
-- What would you do differently next time?
-- How does this problem connect to what you've learned before?
-- What new insights did you gain?
+    return _run_phase(state, TutoringPhase.REFLECTION)
 
-Encourage deeper thinking about their learning process."""
 
-    rag_service = get_agentic_rag_service()
-    response = rag_service.llm.complete(prompt)
-
-    return {
-        "generation": response.text,
-        "pedagogical_state": pedagogical_state.model_copy(update={
-            "last_user_message": user_message,
-            "last_ai_response": response.text,
-            "phase_history": pedagogical_state.phase_history + ["reflection"],
-            "current_phase": TutoringPhase.REFLECTION
-        })
-    }
+async def stream_phase_node(target_phase: str, state: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Streaming variant of the phase nodes.
+
+    Yields {"type": "queue", "position": ...} events while waiting for an
+    LLM slot, {"type": "token", "content": ...} events as the LLM produces
+    them, then one {"type": "result", "generation": ..., "pedagogical_state": ...}
+    event carrying the same result the synchronous node returns. The state
+    is not committed here: callers save it once the stream has finished, so
+    an interrupted stream leaves the conversation unchanged.
+    """
+    phase = TutoringPhase[target_phase] if target_phase in TutoringPhase.__members__ else TutoringPhase.INITIAL
+
+    if phase == TutoringPhase.DEBUGGING:
+        generation = _debugging_reply(state['user_message'])
+        yield {"type": "token", "content": generation}
+    else:
+        prompt, prefix = _phase_prompt(phase, state)
+        rag_service = await get_agentic_rag_service_async()
+        # Wait for a generation slot, telling the client where it is in the queue
+        ticket = llm_scheduler.submit(LLMPriority.GENERATION)
+        try:
+            while not await ticket.wait_async(poll_seconds=1.0):
+                yield {
+                    "type": "queue",
+                    "position": ticket.position(),
+                    "message": f"Waiting for the tutor model (position {ticket.position()} in queue)..."
+                }
+
+            # stop=[]: tutor replies span paragraphs (the streaming default stops at a blank line)
+            stream = await rag_service.llm.astream_complete(prompt, ticket=ticket, prompt_prefix=prefix, stop=[])
+            chunks = []
+            async for chunk in stream:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield {"type": "token", "content": chunk.text}
+        finally:
+            ticket.release()
+        generation = "".join(chunks)
+
+    yield {"type": "result", **_finish_phase(state, phase, generation)}
 
 
 def route_phase(state: Dict[str, Any]) -> str:
     """
     The router node - decides which phase to go to next.
 
-    This is the "brains" of the pedagogical system, using LLM analysis
-    to determine the most appropriate next phase based on user input.
+    This is the "brains" of the pedagogical system. The local phase
+    classifier decides confident cases in a few milliseconds; otherwise
+    LLM analysis determines the most appropriate next phase. What made
+    the decision is left in state["routed_by"] for the phase node to record.
     """
     pedagogical_state = state['pedagogical_state']
     user_message = state['user_message']
 
-    prompt = f"""You are an intelligent routing system for a Computer Science tutoring AI.
-
-Current tutoring phase: '{pedagogical_state.current_phase.value}'
-User's message: '{user_message}'
-Problem being worked on: '{pedagogical_state.problem_statement or "Not yet established"}'
-
-Your task is to determine which tutoring phase should come next.
-The available phases are: INITIAL, EXPLANATION, IMPLEMENTATION, DEBUGGING, REFLECTION.
-
-Routing rules:
-- If the user is starting a new problem or the problem statement is unclear → INITIAL
-- If the user needs help understanding or breaking down the problem → EXPLANATION
-- If the user is ready to work on implementation details or specific steps → IMPLEMENTATION
-- If the user has an error, bug, or something isn't working → DEBUGGING
-- If the user completed a step and should reflect or consider alternatives → REFLECTION
-
-Consider the user's intent and context. Choose the phase that best serves their current need.
+    if settings.phase_classifier_enabled:
+        try:
+            next_phase = phase_classifier.route(user_message, pedagogical_state.current_phase.value)
+            if next_phase is not None:
+                logger.info(f"Router: {pedagogical_state.current_phase.value} -> {next_phase} (classifier)")
+                state["routed_by"] = "classifier"
+                return next_phase
+        except Exception as e:
+            logger.error(f"Phase classifier failed, using the LLM router: {e}")
 
-Respond with ONLY the name of the phase (INITIAL, EXPLANATION, IMPLEMENTATION, DEBUGGING, or REFLECTION)."""
+    prompt = build_routing_prompt(pedagogical_state.current_phase.value, user_message,
+                                  pedagogical_state.problem_statement)
 
     rag_service = get_agentic_rag_service()
     try:
-        response = rag_service.llm.complete(prompt)
-        next_phase = response.text.strip().upper()
+        # Grammar-constrained call: the output can only be a phase name
+        next_phase = rag_service.llm.classify(prompt, TutoringPhase, priority=LLMPriority.ROUTING,
+                                              prompt_prefix=ROUTING_PREFIX).name
+        state["routed_by"] = "llm"
+    except LLMOverloadedError:
+        raise
+    except ValueError as e:
+        logger.warning(f"Unparseable phase from router LLM: {e}")
+        next_phase = ""  # Use the keyword rules below
     except Exception as e:
         logger.error(f"Error in phase routing LLM call: {e}")
         # Default to staying in current phase if there's an error
         next_phase = pedagogical_state.current_phase.value.upper()
+        state["routed_by"] = "default"
 
     # Validate the response
     valid_phases = ["INITIAL", "EXPLANATION", "IMPLEMENTATION", "DEBUGGING", "REFLECTION"]
     if next_phase not in valid_phases:
         # If LLM gives invalid response, use simple rule-based fallback
         current_phase = pedagogical_state.current_phase.value.upper()
+        state["routed_by"] = "keywords"
 
         # Simple fallback logic with priority for confusion over implementation
         if any(keyword in user_message.lower() for keyword in ["error", "bug", "doesn't work", "wrong", "exception", "infinite loop", "loop", "stuck", "terminate"]):
@@ -0,0 +1,188 @@
+"""
+Embedding-based phase router for the pedagogical tutor
+
+route_phase used to spend an LLM call on every pedagogical turn just to
+pick one of five phases. This classifier makes that decision in a few
+milliseconds: a logistic regression over the student's message embedding
+(the shared MiniLM model, via the query embedding cache) plus a one-hot of
+the phase the conversation is in.
+
+Training data:
+  - routing_examples.json: hand-labeled (message, current phase, phase)
+  - pedagogical interactions in the analytics database that the LLM
+    router decided (routed_by == "llm"): the phase the turn was routed
+    from and to, capped at phase_classifier_history_limit. Turns the
+    classifier or the keyword fallback routed are left out so the
+    classifier does not retrain on its own mistakes, and so are turns
+    logged with redacted queries (log_raw_queries off)
+
+It is trained lazily on first use (and in the background at startup).
+When the top class probability is below phase_classifier_min_confidence,
+route_phase asks the LLM as before.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.pedagogical_state import TutoringPhase
+
+logger = logging.getLogger(__name__)
+
+PHASES = [phase.name for phase in TutoringPhase]
+
+
+@dataclass
+class RoutingExample:
+    message: str
+    current_phase: str  # Phase before the turn (TutoringPhase value, e.g. "implementation")
+    phase: str          # Phase the turn should be routed to (TutoringPhase name, e.g. "DEBUGGING")
+
+
+def load_seed_examples(path: Optional[str] = None) -> List[RoutingExample]:
+    """Hand-labeled routing examples"""
+    with open(path or settings.phase_routing_examples_path, "r") as f:
+        return [RoutingExample(**example) for example in json.load(f)["examples"]]
+
+
+def load_history_examples(db_path: Optional[str] = None,
+                          limit: int = settings.phase_classifier_history_limit) -> List[RoutingExample]:
+    """LLM-routed pedagogical turns from the analytics database (most recent first)"""
+    db_path = db_path or settings.analytics_db_path
+    if limit <= 0 or not Path(db_path).exists():
+        return []
+
+    try:
+        with sqlite3.connect(db_path) as db:
+            rows = db.execute(
+                "SELECT user_query, pedagogical_state FROM interactions "
+                "WHERE endpoint_type = 'pedagogical' AND pedagogical_state IS NOT NULL "
+                "AND user_query != '[REDACTED]' AND json_extract(pedagogical_state, '$.routed_by') = 'llm' "
+                "ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read routing history from {db_path}: {e}")
+        return []
+
+    examples = []
+    for message, state_json in rows:
+        try:
+            state = json.loads(state_json)
+            phase = state["current_phase"].upper()
+            previous = state["routed_from"]
+            known_previous = previous.upper() in PHASES
+        except (ValueError, KeyError, AttributeError):
+            continue
+        if phase in PHASES and known_previous:
+            examples.append(RoutingExample(message=message, current_phase=previous, phase=phase))
+    return examples
+
+
+def _default_embed(text: str) -> List[float]:
+    from .semantic_cache import embed_question
+    return embed_question(text)
+
+
+def _default_embed_batch(texts: List[str]) -> List[List[float]]:
+    # Training examples bypass the query embedding cache: they would evict live retrieval entries
+    from .model_registry import model_registry
+    return model_registry.get_embed_model().get_text_embedding_batch(texts)
+
+
+class PhaseClassifier:
+    """Logistic regression over [message embedding, current phase one-hot]"""
+
+    def __init__(self, embed: Callable[[str], List[float]] = _default_embed,
+                 embed_batch: Callable[[List[str]], List[List[float]]] = _default_embed_batch,
+                 min_confidence: float = settings.phase_classifier_min_confidence):
+        self.embed = embed              # Routing (one message, cached)
+        self.embed_batch = embed_batch  # Training (all examples at once, uncached)
+        self.min_confidence = min_confidence
+        self.model = None
+        self.trained_on = 0
+        self._lock = threading.Lock()
+        self.decided = 0     # Turns routed by the classifier
+        self.deferred = 0    # Turns handed to the LLM (low confidence)
+
+    @property
+    def trained(self) -> bool:
+        return self.model is not None
+
+    def features(self, embedding: List[float], current_phase: str) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        one_hot = np.zeros(len(PHASES), dtype=np.float32)
+        if current_phase.upper() in PHASES:
+            one_hot[PHASES.index(current_phase.upper())] = 1.0
+        return np.concatenate([vector, one_hot])
+
+    def fit(self, examples: List[RoutingExample]) -> "PhaseClassifier":
+        from sklearn.linear_model import LogisticRegression
+
+        start = time.perf_counter()
+        embeddings = self.embed_batch([e.message for e in examples])
+        X = np.stack([self.features(embedding, e.current_phase) for embedding, e in zip(embeddings, examples)])
+        y = [e.phase for e in examples]
+        model = LogisticRegression(C=4.0, max_iter=1000)
+        model.fit(X, y)
+        self.model, self.trained_on = model, len(examples)
+        logger.info(f"✓ Phase classifier trained on {len(examples)} examples in {time.perf_counter() - start:.1f}s")
+        return self
+
+    def ensure_trained(self):
+        """Train from the seed examples and analytics history (once)"""
+        if self.trained:
+            return
+        with self._lock:
+            if not self.trained:
+                self.fit(load_seed_examples() + load_history_examples())
+
+    def warm_up(self):
+        """ensure_trained() for background use: failures are logged and retried on first use"""
+        try:
+            self.ensure_trained()
+        except Exception as e:
+            logger.error(f"Phase classifier training failed: {e}")
+
+    def predict(self, message: str, current_phase: str) -> Tuple[str, float]:
+        """(phase name, probability) for the turn"""
+        self.ensure_trained()
+        probabilities = self.model.predict_proba(self.features(self.embed(message), current_phase)[None, :])[0]
+        best = int(np.argmax(probabilities))
+        return self.model.classes_[best], float(probabilities[best])
+
+    def route(self, message: str, current_phase: str) -> Optional[str]:
+        """Phase name when confident, None when the LLM should decide"""
+        phase, confidence = self.predict(message, current_phase)
+        confident = confidence >= self.min_confidence
+        with self._lock:
+            if confident:
+                self.decided += 1
+            else:
+                self.deferred += 1
+        if confident:
+            logger.info(f"  Phase classifier: {phase} ({confidence:.2f})")
+            return phase
+        logger.info(f"  Phase classifier unsure ({phase} at {confidence:.2f}), asking the LLM")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.decided + self.deferred
+        return {
+            "trained_on": self.trained_on,
+            "min_confidence": self.min_confidence,
+            "decided": self.decided,
+            "deferred_to_llm": self.deferred,
+            "decided_rate": self.decided / total if total else 0.0,
+        }
+
+
+# Global classifier instance (trained on first use)
+phase_classifier = PhaseClassifier()
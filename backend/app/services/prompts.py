@@ -0,0 +1,202 @@
+"""
+Prompt templates laid out for llama.cpp prompt caching
+
+llama.cpp keeps the KV cache of the previous prompt in each slot and, with
+cache_prompt, only evaluates the tokens after the longest common prefix.
+So every template here is a fixed *_PREFIX (role + instructions, identical
+for every request) followed by the variable parts (documents, question,
+student message) at the end. Nothing request-specific may go into a prefix.
+
+Callers pass the prefix along as prompt_prefix=... so MistralLLM can pin
+it to a slot when settings.llm_prefix_slots is set.
+"""
+from typing import List, Optional
+
+
+# === Agentic RAG ===
+
+GRADING_PREFIX = """You are a grading assistant. Your task is to determine if the retrieved documents are relevant to answer the user's question.
+
+If the documents contain information that could help answer the question, respond "yes".
+If the documents are off-topic or unhelpful, respond "no".
+Respond with ONLY "yes" or "no".
+
+"""
+
+DOCUMENT_GRADING_PREFIX = """You are a grading assistant. Your task is to determine if a retrieved document is relevant to answer the user's question.
+
+If the document contains information that could help answer the question, respond "yes".
+If the document is off-topic or unhelpful, respond "no".
+Respond with ONLY "yes" or "no".
+
+"""
+
+REWRITE_PREFIX = """You are a query reformulation assistant. The original question did not retrieve relevant documents.
+
+Your task: Rewrite this question to improve retrieval results. Make it more specific, add context, or rephrase for clarity.
+
+"""
+
+FANOUT_PREFIX = """You are a query reformulation assistant. The original question did not retrieve relevant documents.
+
+Your task: Write several different search queries for the same information need. Vary them: use synonyms, name the underlying concepts, make the question more specific, or rephrase it for clarity.
+
+Write one query per line, with no numbering and no other text.
+
+"""
+
+GENERATION_PREFIX = """You are an expert Computer Science mentor helping students learn.
+
+Instructions:
+- Provide a clear, concise answer based STRICTLY on the context documents below
+- If context is insufficient, acknowledge it honestly
+- Cite sources by mentioning "Source 1", "Source 2", etc.
+- Use analogies to make concepts accessible
+- Be encouraging and supportive
+
+"""
+
+
+def build_grading_prompt(question: str, documents: List[str]) -> str:
+    docs_text = "\n\n".join([f"Document {i+1}:\n{doc[:300]}..."
+                             for i, doc in enumerate(documents)])
+    return f"""{GRADING_PREFIX}Question: {question}
+
+Retrieved Documents:
+{docs_text}
+
+Are these documents relevant to answering the question?
+
+Response:"""
+
+
+def build_document_grading_prompt(question: str, document: str) -> str:
+    """One retrieved chunk, graded on its own (see AgenticRAGService._grade_each_document)"""
+    return f"""{DOCUMENT_GRADING_PREFIX}Question: {question}
+
+Retrieved Document:
+{document[:500]}...
+
+Is this document relevant to answering the question?
+
+Response:"""
+
+
+def build_rewrite_prompt(original_question: str) -> str:
+    return f"""{REWRITE_PREFIX}Original question: {original_question}
+
+Rewritten question:"""
+
+
+def build_fanout_prompt(original_question: str, count: int) -> str:
+    return f"""{FANOUT_PREFIX}Original question: {original_question}
+
+{count} search queries:
+"""
+
+
+def build_generation_prompt(question: str, documents: List[str]) -> str:
+    context = "\n\n".join([f"Source {i+1}:\n{doc}"
+                           for i, doc in enumerate(documents)])
+    return f"""{GENERATION_PREFIX}Context Documents:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+
+# === Pedagogical tutor ===
+
+INITIAL_PREFIX = """You are an expert Computer Science tutor helping a student clarify their problem.
+
+Help them clarify their problem. Ask what they're trying to solve and any relevant details.
+
+Be supportive and encouraging. Ask 1-2 clarifying questions. Do NOT provide solutions.
+
+Start naturally without mentioning you are an example.
+
+"""
+
+EXPLANATION_PREFIX = """You are an expert Computer Science tutor helping a student break down their problem.
+
+Your goal in this EXPLANATION phase is to:
+1. Help them create a high-level, step-by-step plan in plain English
+2. Identify key concepts they need to understand
+3. Suggest how to approach the problem systematically
+4. Break complex problems into manageable sub-problems
+
+Do NOT write code. Focus on planning and understanding.
+Ask guiding questions to help them think through the approach.
+
+Respond in a supportive tone and guide them step-by-step.
+
+"""
+
+IMPLEMENTATION_PREFIX = """You are an expert Computer Science tutor helping a student implement their solution.
+
+Your goal in this IMPLEMENTATION phase is to:
+1. Help them think through the specific step they're working on
+2. Encourage them to consider different approaches before coding
+3. Guide them through writing pseudocode or thinking about logic
+4. Help them verify their approach makes sense
+
+Encourage them to think through the approach first before writing code.
+If they show code, focus on the logic and approach rather than syntax.
+
+Respond with guidance and questions to help them implement this specific step.
+
+"""
+
+REFLECTION_PREFIX = """You are an expert Computer Science tutor helping a student reflect on their work.
+
+Your goal in this REFLECTION phase is to:
+1. Help them think about what they learned
+2. Consider alternative approaches or improvements
+3. Identify key takeaways from the problem
+4. Guide them to think about how this connects to other concepts
+
+Ask metacognitive questions like:
+- What was the most challenging part?
+- What would you do differently next time?
+- How does this problem connect to what you've learned before?
+- What new insights did you gain?
+
+Encourage deeper thinking about their learning process.
+
+"""
+
+ROUTING_PREFIX = """You are an intelligent routing system for a Computer Science tutoring AI.
+
+Your task is to determine which tutoring phase should come next.
+The available phases are: INITIAL, EXPLANATION, IMPLEMENTATION, DEBUGGING, REFLECTION.
+
+Routing rules:
+- If the user is starting a new problem or the problem statement is unclear → INITIAL
+- If the user needs help understanding or breaking down the problem → EXPLANATION
+- If the user is ready to work on implementation details or specific steps → IMPLEMENTATION
+- If the user has an error, bug, or something isn't working → DEBUGGING
+- If the user completed a step and should reflect or consider alternatives → REFLECTION
+
+Consider the user's intent and context. Choose the phase that best serves their current need.
+
+Respond with ONLY the name of the phase (INITIAL, EXPLANATION, IMPLEMENTATION, DEBUGGING, or REFLECTION).
+
+"""
+
+
+def build_tutor_prompt(prefix: str, user_message: str, problem_statement: Optional[str] = None,
+                       message_label: str = "User's current message") -> str:
+    """Phase prompt: the phase's prefix, then the problem and the student's message"""
+    problem = f"Problem statement: '{problem_statement}'\n" if problem_statement else ""
+    return f"""{prefix}{problem}{message_label}: '{user_message}'
+
+Tutor response:"""
+
+
+def build_routing_prompt(current_phase: str, user_message: str, problem_statement: Optional[str]) -> str:
+    return f"""{ROUTING_PREFIX}Current tutoring phase: '{current_phase}'
+Problem being worked on: '{problem_statement or "Not yet established"}'
+User's message: '{user_message}'
+
+Next phase:"""
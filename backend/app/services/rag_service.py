@@ -9,11 +9,13 @@ os.environ.pop('HF_HUB_ENABLE_HF_TRANSFER', None)
 from typing import List, Dict, Optional
 import logging
 from llama_index.core import VectorStoreIndex, ServiceContext, Settings, PromptTemplate
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from .mistral_llm import MistralLLM
+from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.schema import Document, NodeWithScore
-import chromadb
+from .hybrid_retriever import create_retriever
+from .model_registry import model_registry
+from .reranker import rerank_enabled
+from .semantic_cache import embed_question, semantic_cache
+from ..core.concurrency import run_blocking
 
 from ..core.config import settings
 
@@ -29,6 +31,7 @@ class RAGService:
     def __init__(self):
         self.vector_store = None
         self.index = None
+        self.retriever = None
         self.query_engine = None
         self._initialized = False
 
@@ -41,33 +44,15 @@ class RAGService:
         try:
             logger.info("Initializing RAG service...")
 
-            # Initialize embedding model (HuggingFace sentence-transformers)
-            logger.info(f"Loading embedding model: {settings.embedding_model_name}")
-            embed_model = HuggingFaceEmbedding(
-                model_name=settings.embedding_model_name,
-                device="cuda"  # Use GPU for fast embeddings
-            )
-
-            # Initialize LLM (llama.cpp server)
-            logger.info(f"Connecting to Mistral-7B via llama.cpp server at {settings.llm_base_url}")
-            llm = MistralLLM(
-                server_url=settings.llm_base_url.replace("/v1", ""),  # Remove /v1 suffix
-                temperature=settings.llm_temperature,
-                num_output=settings.llm_max_tokens,
-            )
+            # Shared embedding model, LLM client and ChromaDB handles (loaded once per process)
+            logger.info(f"Using embedding model {settings.embedding_model_name} and "
+                        f"llama.cpp server at {settings.llm_base_url}")
+            model_registry.configure_llama_index()
 
-            # Configure LlamaIndex Settings (global configuration)
-            Settings.llm = llm
-            Settings.embed_model = embed_model
-            Settings.chunk_size = settings.chunk_size
-            Settings.chunk_overlap = settings.chunk_overlap
-
-            # Initialize ChromaDB client and vector store
             logger.info(f"Connecting to ChromaDB at {settings.chroma_db_path}")
-            chroma_client = chromadb.PersistentClient(path=settings.chroma_db_path)
-            chroma_collection = chroma_client.get_or_create_collection(name=settings.chroma_collection_name)
+            chroma_collection = model_registry.get_collection()
             logger.info(f"ChromaDB collection '{settings.chroma_collection_name}' has {chroma_collection.count()} documents")
-            self.vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+            self.vector_store = model_registry.get_vector_store()
 
             # Create index from vector store
             logger.info("Creating vector store index...")
@@ -75,9 +60,15 @@ class RAGService:
                 vector_store=self.vector_store
             )
 
+            # Hybrid (BM25 + dense) or dense retriever, depending on settings.retrieval_mode
+            self.retriever = create_retriever(
+                self.index, self.vector_store, model_registry.get_embed_model(),
+                rerank=rerank_enabled("simple")
+            )
+
             # Create query engine with custom system prompt
-            self.query_engine = self.index.as_query_engine(
-                similarity_top_k=settings.top_k_retrieval,
+            self.query_engine = RetrieverQueryEngine.from_args(
+                self.retriever,
                 text_qa_template=self._get_qa_template()
             )
 
@@ -89,16 +80,17 @@ class RAGService:
             raise
 
     def _get_qa_template(self) -> PromptTemplate:
-        """Get the system prompt template for QA"""
-        return PromptTemplate("""You are an expert Computer Science mentor helping introductory computer science students understand complex topics. Your goal is to provide pedagogical, accurate, and well-cited responses.
+        """Get the system prompt template for QA
 
-Context information from course materials:
-{context_str}
+        Instructions come first and the retrieved context last, so the fixed
+        part of the prompt is a prefix llama.cpp can reuse (cache_prompt).
+        """
+        return PromptTemplate("""You are an expert Computer Science mentor helping introductory computer science students understand complex topics. Your goal is to provide pedagogical, accurate, and well-cited responses.
 
 IMPORTANT INSTRUCTIONS:
 
 1. ANSWER SCOPE:
-   - Base your answer ONLY on the provided context above
+   - Base your answer ONLY on the provided context below
    - If the context does not contain sufficient information to fully answer the question, explicitly state: "The provided materials do not contain enough information about [specific topic]"
    - DO NOT add information from your general knowledge that is not supported by the context
    - If multiple sources support different aspects of your answer, cite each one specifically
@@ -129,6 +121,9 @@ IMPORTANT INSTRUCTIONS:
    - If sources make subtle distinctions (e.g., variables vs boxes, direct vs indirect recursion), honor these distinctions
    - Double-check that examples and explanations align with the source material
 
+Context information from course materials:
+{context_str}
+
 Question: {query_str}
 
 Answer: """)
@@ -137,6 +132,9 @@ Answer: """)
         """
         Query the RAG system with a question
 
+        Retrieval and generation are blocking, so they run on the blocking
+        work pool and the event loop stays free for other requests.
+
         Args:
             question: User's question
 
@@ -146,9 +144,19 @@ Answer: """)
         if not self._initialized:
             raise RuntimeError("RAG service not initialized. Call initialize() first.")
 
+        return await run_blocking(self.query_sync, question)
+
+    def query_sync(self, question: str) -> Dict:
+        """Blocking implementation of query()"""
         try:
             logger.info(f"Processing query: {question[:100]}...")
 
+            cache_embedding = embed_question(question) if settings.semantic_cache_enabled else None
+            if cache_embedding is not None:
+                cached = semantic_cache.lookup("simple", cache_embedding)
+                if cached is not None:
+                    return {**cached, 'question': question}
+
             # Query the index
             response = self.query_engine.query(question)
 
@@ -169,6 +177,11 @@ Answer: """)
             }
 
             logger.info(f"Generated response with {len(sources)} sources")
+
+            # Only grounded answers are worth reusing
+            if cache_embedding is not None and sources:
+                semantic_cache.store("simple", question, cache_embedding,
+                                     {'response': result['response'], 'sources': sources})
             return result
 
         except Exception as e:
@@ -181,6 +194,7 @@ Answer: """)
             'initialized': self._initialized,
             'collection_name': settings.chroma_collection_name,
             'embedding_model': settings.embedding_model_name,
+            'retriever': type(self.retriever).__name__ if self.retriever else None,
             'llm_endpoint': settings.llm_base_url,
         }
 
@@ -0,0 +1,138 @@
+"""
+Cross-encoder reranking stage
+
+The retrievers rank chunks by embedding similarity (plus BM25 in hybrid
+mode), which scores the question and each chunk independently. A
+cross-encoder reads the question and the chunk together and orders them
+much better, at the cost of one forward pass per pair. RerankingRetriever
+over-fetches rerank_candidates chunks from the dense or hybrid retriever,
+scores all of them in one batched CPU forward pass and keeps the best
+top_k.
+
+Scores are cached per (query hash, chunk id), so a repeated or rephrased
+question only runs the model for chunks it has not seen with that query;
+a collection version bump clears the cache, like the retrieval cache.
+
+As in HybridRetriever, the returned NodeWithScore.score stays the dense
+similarity, so the grading gate thresholds keep their meaning; the
+cross-encoder only decides the order and the cut.
+
+Reranking is switched on per endpoint with settings.rerank_endpoints.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from cachetools import TTLCache
+from llama_index.core import QueryBundle
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+
+from .collection_version import CollectionVersion, collection_version
+from .retrieval_cache import CacheStats, normalize_query
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def rerank_enabled(endpoint: str) -> bool:
+    """True when settings.rerank_endpoints lists the endpoint ("simple", "agentic")"""
+    return endpoint in {name.strip().lower() for name in settings.rerank_endpoints.split(",")}
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+def _default_model():
+    from .model_registry import model_registry
+    return model_registry.get_cross_encoder()
+
+
+class CrossEncoderReranker:
+    """Batched cross-encoder scoring with a (query hash, chunk id) score cache"""
+
+    def __init__(self, load_model: Callable[[], Any] = _default_model,
+                 cache_size: int = settings.rerank_cache_size,
+                 ttl_seconds: float = settings.retrieval_cache_ttl_seconds,
+                 version: CollectionVersion = collection_version):
+        self.load_model = load_model
+        self._lock = threading.Lock()
+        self._scores = TTLCache(maxsize=cache_size, ttl=ttl_seconds)
+        self._version_reader = version
+        self._version = version.current()
+        self.cache_stats = CacheStats()
+        self.batches = 0
+        self.pairs_scored = 0
+
+    def _check_version(self):
+        """Chunk ids may point at new text after ingestion"""
+        version = self._version_reader.current()
+        if version != self._version:
+            self._scores.clear()
+            self._version = version
+
+    def score(self, query: str, nodes: List[NodeWithScore]) -> List[float]:
+        """Cross-encoder score of each node for the query (higher is more relevant)"""
+        qhash = query_hash(query)
+        keys = [(qhash, n.node.node_id) for n in nodes]
+        with self._lock:
+            self._check_version()
+            scores = [self._scores.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        with self._lock:
+            self.cache_stats.hits += len(nodes) - len(missing)
+            self.cache_stats.misses += len(missing)
+
+        if missing:
+            pairs = [(query, nodes[i].node.get_content()) for i in missing]
+            start = time.perf_counter()
+            predicted = self.load_model().predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            logger.debug(f"  Reranked {len(pairs)} pairs in {(time.perf_counter() - start) * 1000:.0f}ms")
+            with self._lock:
+                self.batches += 1
+                self.pairs_scored += len(pairs)
+                for i, score in zip(missing, predicted):
+                    scores[i] = self._scores[keys[i]] = float(score)
+        return scores
+
+    def rerank(self, query: str, nodes: List[NodeWithScore], top_k: int) -> List[NodeWithScore]:
+        """The top_k nodes by cross-encoder score"""
+        if not nodes:
+            return []
+        scores = self.score(query, nodes)
+        order = sorted(range(len(nodes)), key=lambda i: scores[i], reverse=True)
+        return [nodes[i] for i in order[:top_k]]
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "scores": self.cache_stats.as_dict(len(self._scores), int(self._scores.maxsize)),
+                "batches": self.batches,
+                "pairs_scored": self.pairs_scored,
+            }
+
+
+class RerankingRetriever(BaseRetriever):
+    """Over-fetches from a candidate retriever and keeps the cross-encoder's top_k"""
+
+    def __init__(self, retriever: BaseRetriever, top_k: int = settings.top_k_retrieval,
+                 reranker: Optional[CrossEncoderReranker] = None):
+        super().__init__()
+        self.retriever = retriever
+        self.top_k = top_k
+        self.reranker = reranker or cross_encoder_reranker
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        candidates = self.retriever.retrieve(query_bundle)
+        return self.reranker.rerank(query_bundle.query_str, candidates, self.top_k)
+
+
+# Global reranker instance (the cross-encoder is loaded on first use)
+cross_encoder_reranker = CrossEncoderReranker()
@@ -0,0 +1,175 @@
+"""
+Retrieval cache (LRU + TTL)
+
+Students ask the same questions over and over. CachedRetriever sits in
+front of the configured retriever (and therefore in front of both
+query_engine.query and the agentic _retrieve node) and caches:
+
+  - retrieval results, keyed on (collection version, retriever, normalized
+    query, top_k, filters); a collection version bump from ingest.py
+    invalidates them
+  - query embeddings, keyed on (embedding model, normalized query); these
+    survive re-ingestion, so the first query after an ingestion run still
+    skips the embedding model
+
+Both are bounded in size (least recently used entries go first) and age
+(TTL). Hit/miss counters are exposed via stats() and /api/metrics.
+"""
+import logging
+import re
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+from cachetools import TTLCache
+from llama_index.core import QueryBundle
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+
+from .collection_version import CollectionVersion, collection_version
+from .embedding_backends import embedding_model_id
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what is retrieved"""
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?!. ")
+
+
+class CacheStats:
+    """Hit/miss counters for one cache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def as_dict(self, size: int, maxsize: int) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size": size,
+            "maxsize": maxsize,
+        }
+
+
+class RetrievalCache:
+    """Thread-safe LRU + TTL caches for retrieval results and query embeddings"""
+
+    def __init__(self, maxsize: int = settings.retrieval_cache_size,
+                 ttl_seconds: float = settings.retrieval_cache_ttl_seconds,
+                 version: CollectionVersion = collection_version):
+        self._lock = threading.Lock()
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._embeddings = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._version_reader = version
+        self._version = version.current()
+        self.result_stats = CacheStats()
+        self.embedding_stats = CacheStats()
+
+    def _check_version(self):
+        """Drop cached results once ingestion has changed the collection"""
+        version = self._version_reader.current()
+        if version != self._version:
+            logger.info(f"Collection changed ({self._version[:8]} -> {version[:8]}), clearing retrieval cache")
+            self._results.clear()
+            self._version = version
+
+    def get_results(self, key: Hashable) -> Optional[List[NodeWithScore]]:
+        with self._lock:
+            self._check_version()
+            nodes = self._results.get(key)
+            if nodes is None:
+                self.result_stats.misses += 1
+                return None
+            self.result_stats.hits += 1
+        # Fresh wrappers so callers can re-score/re-order without touching the cache
+        return [NodeWithScore(node=n.node, score=n.score) for n in nodes]
+
+    def put_results(self, key: Hashable, nodes: List[NodeWithScore]):
+        with self._lock:
+            self._check_version()
+            self._results[key] = [NodeWithScore(node=n.node, score=n.score) for n in nodes]
+
+    def get_query_embedding(self, embed_model, query: str) -> List[float]:
+        """Cached embed_model.get_query_embedding(query)"""
+        key = (embedding_model_id(embed_model), normalize_query(query))
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is not None:
+                self.embedding_stats.hits += 1
+                return embedding
+            self.embedding_stats.misses += 1
+
+        embedding = embed_model.get_query_embedding(query)
+        with self._lock:
+            self._embeddings[key] = embedding
+        return embedding
+
+    def get_query_embeddings(self, embed_model, queries: List[str]) -> List[List[float]]:
+        """Cached embeddings for several queries; the misses are embedded in one batch"""
+        keys = [(embedding_model_id(embed_model), normalize_query(query)) for query in queries]
+        with self._lock:
+            embeddings = [self._embeddings.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        with self._lock:
+            self.embedding_stats.hits += len(queries) - len(missing)
+            self.embedding_stats.misses += len(missing)
+
+        if missing:
+            # The configured models are symmetric (no query instruction), so
+            # text embeddings of the queries equal their query embeddings
+            batch = embed_model.get_text_embedding_batch([queries[i] for i in missing])
+            with self._lock:
+                for i, embedding in zip(missing, batch):
+                    embeddings[i] = self._embeddings[keys[i]] = embedding
+        return embeddings
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._embeddings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "collection_version": self._version,
+                "results": self.result_stats.as_dict(len(self._results), int(self._results.maxsize)),
+                "query_embeddings": self.embedding_stats.as_dict(len(self._embeddings), int(self._embeddings.maxsize)),
+            }
+
+
+class CachedRetriever(BaseRetriever):
+    """Serves repeated questions from the retrieval cache"""
+
+    def __init__(self, retriever: BaseRetriever, embed_model, top_k: int,
+                 cache: Optional[RetrievalCache] = None):
+        super().__init__()
+        self.retriever = retriever
+        self.embed_model = embed_model
+        self.top_k = top_k
+        self.cache = cache or retrieval_cache
+
+    def _cache_key(self, query: str) -> Hashable:
+        filters = getattr(self.retriever, "_filters", None)
+        return (type(self.retriever).__name__, normalize_query(query), self.top_k, repr(filters))
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        key = self._cache_key(query_bundle.query_str)
+        cached = self.cache.get_results(key)
+        if cached is not None:
+            return cached
+
+        # Retrievers only embed the query when the bundle has no embedding yet
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self.cache.get_query_embedding(self.embed_model, query_bundle.query_str)
+
+        nodes = self.retriever.retrieve(query_bundle)
+        self.cache.put_results(key, nodes)
+        return nodes
+
+
+# Global cache instance shared by both RAG services
+retrieval_cache = RetrievalCache()
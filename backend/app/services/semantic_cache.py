@@ -0,0 +1,217 @@
+"""
+Semantic answer cache
+
+Many student questions are paraphrases of earlier ones ("what's a heap" /
+"explain heaps to me"). When a new question's embedding is close enough
+(cosine >= semantic_cache_threshold) to a question answered before, the
+stored answer and sources are returned and the LLM is not called at all.
+
+  - Entries are namespaced per endpoint family ("simple", "agentic") since
+    the answers and payload shapes differ
+  - Entries are stamped with the collection version; once ingestion changes
+    the collection they are dropped (see collection_version.py)
+  - Memory is bounded: when full, the least frequently hit entry is evicted
+    (ties: least recently used)
+  - The cache is snapshotted to JSON periodically and on shutdown, and
+    loaded again on startup
+
+Off by default (semantic_cache_enabled): a wrong near-duplicate match
+serves a wrong answer, so the threshold should be tuned on real traffic
+before enabling it.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .collection_version import CollectionVersion, collection_version
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+@dataclass
+class SemanticCacheEntry:
+    namespace: str
+    question: str
+    embedding: List[float]
+    payload: Dict
+    collection_version: str
+    hits: int = 0
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+
+
+def replay_tokens(answer: str) -> List[str]:
+    """Split a cached answer into word-sized stream tokens (whitespace preserved)"""
+    return re.findall(r"\s*\S+", answer) or [answer]
+
+
+class SemanticCache:
+    """Embedding-similarity answer cache with LFU eviction"""
+
+    def __init__(self, path: Optional[str] = None,
+                 max_entries: int = settings.semantic_cache_size,
+                 threshold: float = settings.semantic_cache_threshold,
+                 snapshot_interval: int = settings.semantic_cache_snapshot_interval,
+                 version: CollectionVersion = collection_version):
+        self.path = Path(path or settings.semantic_cache_path)
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.snapshot_interval = snapshot_interval
+        self._version_reader = version
+        self._lock = threading.Lock()
+        self._entries: List[SemanticCacheEntry] = []
+        self._matrix: Optional[np.ndarray] = None  # Normalized embeddings, rebuilt lazily
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # === Lookup / store ===
+
+    def lookup(self, namespace: str, embedding: List[float]) -> Optional[Dict]:
+        """Payload of the most similar cached question above the threshold"""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._drop_stale()
+            matrix = self._get_matrix()
+            best, best_score = None, self.threshold
+            if matrix is not None and len(query) == matrix.shape[1]:
+                scores = matrix @ query
+                for i in np.argsort(-scores):
+                    if scores[i] < best_score:
+                        break
+                    if self._entries[i].namespace == namespace:
+                        best, best_score = self._entries[i], float(scores[i])
+                        break
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            best.hits += 1
+            best.last_used = time.time()
+            logger.info(f"Semantic cache hit ({best_score:.3f}): {best.question[:80]}")
+            return dict(best.payload)
+
+    def store(self, namespace: str, question: str, embedding: List[float], payload: Dict):
+        """Cache an answer; evicts the least frequently used entry when full"""
+        entry = SemanticCacheEntry(
+            namespace=namespace,
+            question=question,
+            embedding=self._normalize(embedding).tolist(),
+            payload=payload,
+            collection_version=self._version_reader.current()
+        )
+        with self._lock:
+            self._drop_stale()
+            while len(self._entries) >= self.max_entries:
+                victim = min(range(len(self._entries)),
+                             key=lambda i: (self._entries[i].hits, self._entries[i].last_used))
+                del self._entries[victim]
+                self.evictions += 1
+            self._entries.append(entry)
+            self._matrix = None
+            self._unsaved += 1
+            snapshot_due = self.snapshot_interval and self._unsaved >= self.snapshot_interval
+
+        if snapshot_due:
+            self.save()
+
+    # === Persistence ===
+
+    def load(self) -> "SemanticCache":
+        """Load the snapshot (entries from an older collection version are skipped)"""
+        if not self.path.exists():
+            return self
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("format") != SNAPSHOT_FORMAT:
+                logger.warning(f"Ignoring semantic cache snapshot with unknown format: {self.path}")
+                return self
+            version = self._version_reader.current()
+            entries = [SemanticCacheEntry(**e) for e in data.get("entries", [])]
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Could not load semantic cache snapshot {self.path}: {e}")
+            return self
+
+        with self._lock:
+            self._entries = [e for e in entries if e.collection_version == version][-self.max_entries:]
+            self._matrix = None
+        logger.info(f"✓ Semantic cache loaded: {len(self._entries)} entries")
+        return self
+
+    def save(self):
+        """Atomically write a JSON snapshot"""
+        with self._lock:
+            data = {"format": SNAPSHOT_FORMAT, "entries": [asdict(e) for e in self._entries]}
+            self._unsaved = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        logger.info(f"✓ Semantic cache snapshot saved: {len(data['entries'])} entries")
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": settings.semantic_cache_enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    # === Internals (lock held) ===
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop_stale(self):
+        version = self._version_reader.current()
+        fresh = [e for e in self._entries if e.collection_version == version]
+        if len(fresh) != len(self._entries):
+            logger.info(f"Collection changed, dropping {len(self._entries) - len(fresh)} cached answers")
+            self._entries = fresh
+            self._matrix = None
+
+    def _get_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None and self._entries:
+            self._matrix = np.asarray([e.embedding for e in self._entries], dtype=np.float32)
+        return self._matrix
+
+
+def embed_question(question: str) -> List[float]:
+    """Query embedding for cache lookups; shared with retrieval via the query embedding cache"""
+    from .model_registry import model_registry
+    from .retrieval_cache import retrieval_cache
+    return retrieval_cache.get_query_embedding(model_registry.get_embed_model(), question)
+
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
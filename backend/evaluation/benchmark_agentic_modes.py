@@ -0,0 +1,141 @@
+"""
+Agentic Rewrite Benchmark: serial rewrite loop vs. multi-query fan-out
+
+Runs every question in the question bank through AgenticRAGService.query
+with each settings.agentic_rewrite_mode:
+
+  serial   on a "no" grade: rewrite -> retrieve -> grade, up to max_retries times
+  fanout   on a "no" grade: one call for several reformulations, fused
+           retrieval over all of them, one more grading pass
+
+and reports end-to-end latency (p50/p95), LLM calls per question and the
+topic recall of the documents the answer was generated from (same metric
+as benchmark_retrieval.py). The semantic cache is off and the retrieval
+cache is cleared between modes. Needs a populated ChromaDB and a running
+llama.cpp server.
+
+Usage:
+    python evaluation/benchmark_agentic_modes.py
+    python evaluation/benchmark_agentic_modes.py --questions 10 --max-retries 2
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.agentic_rag import AgenticRAGService
+from app.services.retrieval_cache import retrieval_cache
+
+QUESTION_BANK_PATH = Path(__file__).parent / "question_bank.json"
+RESULTS_DIR = Path(__file__).parent / "results"
+MODES = ["serial", "fanout"]
+
+
+def load_questions(limit: int) -> List[Dict]:
+    with open(QUESTION_BANK_PATH, "r") as f:
+        return json.load(f)["questions"][:limit]
+
+
+def topic_recall(chunks: List[str], topics: List[str]) -> float:
+    text = " ".join(chunks).lower()
+    return sum(1 for topic in topics if topic.lower() in text) / len(topics) if topics else 0.0
+
+
+class CountingLLM:
+    """Wraps the service's LLM client, counting completion and classification calls"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.calls = 0
+
+    def complete(self, *args, **kwargs):
+        self.calls += 1
+        return self.llm.complete(*args, **kwargs)
+
+    def classify(self, *args, **kwargs):
+        self.calls += 1
+        return self.llm.classify(*args, **kwargs)
+
+
+def capture_generation_documents(service: AgenticRAGService) -> Dict[str, List[str]]:
+    """Record the full chunks _generate receives (query() only returns truncated sources)"""
+    captured = {"documents": []}
+    generate = service._generate
+
+    def capturing_generate(state):
+        captured["documents"] = list(state["documents"])
+        return generate(state)
+
+    service._generate = capturing_generate
+    return captured
+
+
+def bench_mode(service: AgenticRAGService, captured: Dict[str, List[str]], mode: str,
+               questions: List[Dict], max_retries: int) -> Dict:
+    settings.agentic_rewrite_mode = mode
+    service.graph = service._build_graph()
+    retrieval_cache.clear()
+
+    latencies, calls, recalls, rewrites = [], [], [], []
+    for question in questions:
+        service.llm.calls = 0
+        start = time.perf_counter()
+        result = service.query(question["question"], max_retries=max_retries)
+        latencies.append((time.perf_counter() - start) * 1000)
+        calls.append(service.llm.calls)
+        rewrites.append(result["rewrites_used"])
+        recalls.append(topic_recall(captured["documents"], question.get("expected_topics", [])))
+
+    latencies.sort()
+    return {
+        "latency_p50_ms": round(statistics.median(latencies), 1),
+        "latency_p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 1),
+        "latency_max_ms": round(latencies[-1], 1),
+        "llm_calls_mean": round(statistics.mean(calls), 2),
+        "llm_calls_max": max(calls),
+        "rewrite_rounds_mean": round(statistics.mean(rewrites), 2),
+        "topic_recall": round(statistics.mean(recalls), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial rewrites against multi-query fan-out")
+    parser.add_argument("--questions", type=int, default=20, help="Questions from the question bank")
+    parser.add_argument("--max-retries", type=int, default=2, help="Rewrite budget per question")
+    args = parser.parse_args()
+
+    settings.semantic_cache_enabled = False
+    questions = load_questions(args.questions)
+    service = AgenticRAGService()
+    service.llm = CountingLLM(service.llm)
+    captured = capture_generation_documents(service)  # Before the graphs are rebuilt per mode
+
+    results = {}
+    for mode in MODES:
+        print(f"Benchmarking {mode}...")
+        results[mode] = bench_mode(service, captured, mode, questions, args.max_retries)
+
+    print(f"\n{len(questions)} questions, max_retries {args.max_retries}, "
+          f"{settings.fanout_queries} fan-out queries\n")
+    print(f"{'mode':<8} {'p50':>9} {'p95':>9} {'max':>9} {'calls':>6} {'max':>4} {'recall':>7}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['latency_p50_ms']:>7.0f}ms {r['latency_p95_ms']:>7.0f}ms {r['latency_max_ms']:>7.0f}ms "
+              f"{r['llm_calls_mean']:>6.2f} {r['llm_calls_max']:>4} {r['topic_recall']:>7.3f}")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_file = RESULTS_DIR / f"agentic_modes_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w") as f:
+        json.dump({"questions": len(questions), "max_retries": args.max_retries,
+                   "fanout_queries": settings.fanout_queries, "results": results}, f, indent=2)
+    print(f"\n✅ Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Embedding Backend Benchmark
+
+Compares the embedding backends (see app/services/embedding_backends.py)
+on the two workloads that matter:
+
+  - query latency: one question at a time, as /api/chat embeds it
+  - ingestion throughput: batches of chunk-sized texts, as ingest.py embeds them
+
+Also reports how close each backend's vectors are to the torch fp32
+reference (mean cosine similarity), since int8 quantization trades a
+little accuracy for speed.
+
+Usage:
+    python evaluation/benchmark_embeddings.py
+    python evaluation/benchmark_embeddings.py --backends torch-cpu onnx-int8 --threads 4
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.embedding_backends import cuda_available, create_embedding_model
+
+QUESTION_BANK_PATH = Path(__file__).parent / "question_bank.json"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# name -> (backend, device, onnx quantization)
+BACKEND_CONFIGS = {
+    "torch-cuda": ("torch", "cuda", False),
+    "torch-cpu": ("torch", "cpu", False),
+    "onnx-fp32": ("onnx", "cpu", False),
+    "onnx-int8": ("onnx", "cpu", True),
+}
+
+
+def load_queries() -> List[str]:
+    """Questions from the evaluation question bank"""
+    with open(QUESTION_BANK_PATH, "r") as f:
+        bank = json.load(f)
+    return [q["question"] for q in bank.get("questions", [])]
+
+
+def load_chunks(limit: int) -> List[str]:
+    """Chunk texts from the ChromaDB collection (synthetic text if it is empty)"""
+    try:
+        import chromadb
+        client = chromadb.PersistentClient(path=settings.chroma_db_path)
+        collection = client.get_collection(settings.chroma_collection_name)
+        chunks = collection.get(limit=limit, include=["documents"])["documents"]
+        if chunks:
+            return chunks
+    except Exception as e:
+        print(f"⚠️  Could not read chunks from ChromaDB ({e}), using synthetic text")
+
+    sentence = ("A linked list stores elements in nodes where each node points to the next one, "
+                "so insertion is constant time but random access is linear. ")
+    return [sentence * 6 for _ in range(limit)]
+
+
+def build_model(name: str, batch_size: int):
+    backend, device, quantize = BACKEND_CONFIGS[name]
+    settings.embedding_onnx_quantize = quantize
+    return create_embedding_model(backend=backend, device=device, batch_size=batch_size)
+
+
+def bench_queries(model, queries: List[str], repeats: int) -> Dict[str, float]:
+    model.get_query_embedding(queries[0])  # Warm-up
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            model.get_query_embedding(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "query_p50_ms": statistics.median(latencies),
+        "query_p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def bench_ingestion(model, chunks: List[str]) -> Dict[str, float]:
+    model.get_text_embedding_batch(chunks[:8])  # Warm-up
+    start = time.perf_counter()
+    model.get_text_embedding_batch(chunks)
+    elapsed = time.perf_counter() - start
+    return {"ingest_chunks_per_sec": len(chunks) / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKEND_CONFIGS), default=None,
+                        help="Backends to compare (default: all available)")
+    parser.add_argument("--chunks", type=int, default=512, help="Chunks embedded for the throughput test")
+    parser.add_argument("--batch-size", type=int, default=settings.ingest_batch_size)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the question bank")
+    parser.add_argument("--threads", type=int, default=settings.embedding_num_threads,
+                        help="CPU threads for inference (0 = library default)")
+    args = parser.parse_args()
+
+    names = args.backends or [n for n in BACKEND_CONFIGS if n != "torch-cuda" or cuda_available()]
+    settings.embedding_num_threads = args.threads
+
+    queries = load_queries()
+    chunks = load_chunks(args.chunks)
+    print(f"Model: {settings.embedding_model_name}")
+    print(f"{len(queries)} queries x {args.repeats}, {len(chunks)} chunks, batch size {args.batch_size}, "
+          f"threads {args.threads or 'default'}\n")
+
+    # Reference vectors for the agreement check
+    reference = None
+    results = {}
+    for name in names:
+        print(f"Benchmarking {name}...")
+        model = build_model(name, args.batch_size)
+        result = bench_queries(model, queries, args.repeats)
+        result.update(bench_ingestion(model, chunks))
+
+        sample = np.asarray(model.get_text_embedding_batch(chunks[:64]), dtype=np.float32)
+        if reference is None:
+            reference = sample
+        result["cosine_vs_first"] = float(np.mean(np.sum(sample * reference, axis=1)))
+        results[name] = result
+
+    print(f"\n{'backend':<12} {'query p50':>10} {'query p95':>10} {'chunks/sec':>11} {'cos vs ' + names[0]:>18}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['query_p50_ms']:>8.1f}ms {r['query_p95_ms']:>8.1f}ms "
+              f"{r['ingest_chunks_per_sec']:>11.1f} {r['cosine_vs_first']:>18.4f}")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_file = RESULTS_DIR / f"embedding_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w") as f:
+        json.dump({"model": settings.embedding_model_name, "results": results}, f, indent=2)
+    print(f"\n✅ Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Phase Router Benchmark: local classifier vs. LLM routing
+
+Compares the two ways route_phase can pick the next tutoring phase on the
+labeled routing examples (routing_examples.json, plus analytics history
+with --history):
+
+  classifier   5-fold cross-validated accuracy of the phase classifier,
+               and accuracy/coverage of the turns it is confident about at
+               settings.phase_classifier_min_confidence (the rest go to
+               the LLM in production)
+  llm          accuracy of the LLM router (route_phase with the
+               classifier disabled, including its keyword fallback)
+
+plus per-turn latency of each (classifier latency includes embedding the
+message, without the query embedding cache). Needs the embedding model;
+the LLM part needs a running llama.cpp server (skip with --skip-llm).
+
+Usage:
+    python evaluation/benchmark_phase_router.py
+    python evaluation/benchmark_phase_router.py --skip-llm --history
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.models.pedagogical_state import PedagogicalState, TutoringPhase
+from app.services.model_registry import model_registry
+from app.services.phase_classifier import (PhaseClassifier, RoutingExample, load_history_examples,
+                                           load_seed_examples)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    latencies_ms = sorted(latencies_ms)
+    return {
+        "p50_ms": statistics.median(latencies_ms),
+        "p95_ms": latencies_ms[max(0, int(len(latencies_ms) * 0.95) - 1)],
+    }
+
+
+def bench_classifier(examples: List[RoutingExample], folds: int) -> Dict:
+    from sklearn.model_selection import StratifiedKFold
+
+    embed_model = model_registry.get_embed_model()
+    embeddings = {e.message: embed_model.get_query_embedding(e.message) for e in examples}
+
+    labels = [e.phase for e in examples]
+    predictions, confidences = [None] * len(examples), [0.0] * len(examples)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=0)
+    for train_idx, test_idx in splitter.split(np.zeros(len(examples)), labels):
+        classifier = PhaseClassifier(embed=embeddings.__getitem__,
+                                     embed_batch=lambda texts: [embeddings[t] for t in texts])
+        classifier.fit([examples[i] for i in train_idx])
+        for i in test_idx:
+            predictions[i], confidences[i] = classifier.predict(examples[i].message, examples[i].current_phase)
+
+    threshold = settings.phase_classifier_min_confidence
+    confident = [i for i, c in enumerate(confidences) if c >= threshold]
+
+    # Latency as in production: embed the message, then predict
+    classifier = PhaseClassifier(embed=embed_model.get_query_embedding).fit(examples)
+    latencies = []
+    for e in examples:
+        start = time.perf_counter()
+        classifier.predict(e.message, e.current_phase)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "accuracy": sum(p == l for p, l in zip(predictions, labels)) / len(examples),
+        "min_confidence": threshold,
+        "coverage": len(confident) / len(examples),
+        "confident_accuracy": (sum(predictions[i] == labels[i] for i in confident) / len(confident)
+                               if confident else 0.0),
+        "predictions": predictions,
+        **latency_summary(latencies),
+    }
+
+
+def bench_llm(examples: List[RoutingExample]) -> Dict:
+    from app.services.pedagogical_graph import route_phase
+
+    settings.phase_classifier_enabled = False
+    predictions, latencies = [], []
+    for e in examples:
+        state = {
+            "pedagogical_state": PedagogicalState(current_phase=TutoringPhase(e.current_phase),
+                                                  phase_history=[e.current_phase]),
+            "user_message": e.message,
+            "generation": ""
+        }
+        start = time.perf_counter()
+        predictions.append(route_phase(state))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    labels = [e.phase for e in examples]
+    return {
+        "accuracy": sum(p == l for p, l in zip(predictions, labels)) / len(examples),
+        "predictions": predictions,
+        **latency_summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the phase classifier against LLM routing")
+    parser.add_argument("--history", action="store_true", help="Add LLM-routed turns from the analytics database")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds for the classifier")
+    parser.add_argument("--skip-llm", action="store_true", help="Only evaluate the classifier")
+    args = parser.parse_args()
+
+    examples = load_seed_examples() + (load_history_examples() if args.history else [])
+    print(f"{len(examples)} labeled routing examples\n")
+
+    results = {"classifier": bench_classifier(examples, args.folds)}
+    if not args.skip_llm:
+        print("Routing every example through the LLM...")
+        results["llm"] = bench_llm(examples)
+        agree = sum(c == l for c, l in zip(results["classifier"]["predictions"], results["llm"]["predictions"]))
+        results["agreement"] = agree / len(examples)
+
+    c = results["classifier"]
+    print(f"\n{'router':<12} {'accuracy':>9} {'p50':>9} {'p95':>9}")
+    print(f"{'classifier':<12} {c['accuracy']:>9.1%} {c['p50_ms']:>7.1f}ms {c['p95_ms']:>7.1f}ms")
+    if "llm" in results:
+        l = results["llm"]
+        print(f"{'llm':<12} {l['accuracy']:>9.1%} {l['p50_ms']:>7.1f}ms {l['p95_ms']:>7.1f}ms")
+        print(f"\nClassifier/LLM agreement: {results['agreement']:.1%}")
+    print(f"At min_confidence {c['min_confidence']}: classifier decides {c['coverage']:.1%} of turns "
+          f"with {c['confident_accuracy']:.1%} accuracy")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_file = RESULTS_DIR / f"phase_router_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w") as f:
+        json.dump({"examples": len(examples), "embedding_model": settings.embedding_model_name,
+                   "results": results}, f, indent=2)
+    print(f"\n✅ Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
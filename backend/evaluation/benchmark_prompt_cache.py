@@ -0,0 +1,185 @@
+"""
+Prompt Cache Benchmark: time-to-first-token before and after prefix reuse
+
+Sends the agentic RAG's grading and generation prompts for each question
+in the question bank to a running llama.cpp server, streaming the answer
+and timing the first token, in three configurations:
+
+  legacy          old layout (question and documents before the
+                  instructions), cache_prompt off
+  legacy+cache    old layout, cache_prompt on: only the first line is shared
+  prefix+cache    prompts.py layout (static prefix first), cache_prompt on
+
+Time-to-first-token is dominated by prompt evaluation, so the difference
+between the last two rows is what the prefix layout saves per call. Uses
+passages from ChromaDB as documents (synthetic text if it is empty).
+
+Usage:
+    python evaluation/benchmark_prompt_cache.py
+    python evaluation/benchmark_prompt_cache.py --questions 10 --prefix-slots 2
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.mistral_llm import MistralLLM
+from app.services.prompts import (GENERATION_PREFIX, GRADING_PREFIX, build_generation_prompt,
+                                  build_grading_prompt)
+
+QUESTION_BANK_PATH = Path(__file__).parent / "question_bank.json"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+# === Layout before prompts.py (variable content first) ===
+
+def legacy_grading_prompt(question: str, documents: List[str]) -> str:
+    docs_text = "\n\n".join([f"Document {i+1}:\n{doc[:300]}..." for i, doc in enumerate(documents)])
+    return f"""You are a grading assistant. Your task is to determine if the retrieved documents are relevant to answer the user's question.
+
+Question: {question}
+
+Retrieved Documents:
+{docs_text}
+
+Are these documents relevant to answering the question? Respond with ONLY "yes" or "no".
+
+If the documents contain information that could help answer the question, respond "yes".
+If the documents are off-topic or unhelpful, respond "no".
+
+Response:"""
+
+
+def legacy_generation_prompt(question: str, documents: List[str]) -> str:
+    context = "\n\n".join([f"Source {i+1}:\n{doc}" for i, doc in enumerate(documents)])
+    return f"""You are an expert Computer Science mentor helping students learn.
+
+Context Documents:
+{context}
+
+Question: {question}
+
+Instructions:
+- Provide a clear, concise answer based STRICTLY on the context above
+- If context is insufficient, acknowledge it honestly
+- Cite sources by mentioning "Source 1", "Source 2", etc.
+- Use analogies to make concepts accessible
+- Be encouraging and supportive
+
+Answer:"""
+
+
+PromptBuilder = Callable[[str, List[str]], Tuple[str, str]]
+
+# name -> (cache_prompt, [(call, builder returning (prompt, prefix))])
+CONFIGS: Dict[str, Tuple[bool, List[Tuple[str, PromptBuilder]]]] = {
+    "legacy": (False, [
+        ("grade", lambda q, d: (legacy_grading_prompt(q, d), "")),
+        ("generate", lambda q, d: (legacy_generation_prompt(q, d), "")),
+    ]),
+    "legacy+cache": (True, [
+        ("grade", lambda q, d: (legacy_grading_prompt(q, d), "")),
+        ("generate", lambda q, d: (legacy_generation_prompt(q, d), "")),
+    ]),
+    "prefix+cache": (True, [
+        ("grade", lambda q, d: (build_grading_prompt(q, d), GRADING_PREFIX)),
+        ("generate", lambda q, d: (build_generation_prompt(q, d), GENERATION_PREFIX)),
+    ]),
+}
+
+
+def load_questions(limit: int) -> List[str]:
+    with open(QUESTION_BANK_PATH, "r") as f:
+        return [q["question"] for q in json.load(f)["questions"]][:limit]
+
+
+def load_documents(count: int) -> List[str]:
+    """Passages from the ChromaDB collection (synthetic text if it is empty)"""
+    try:
+        import chromadb
+        client = chromadb.PersistentClient(path=settings.chroma_db_path)
+        collection = client.get_collection(settings.chroma_collection_name)
+        documents = collection.get(limit=count, include=["documents"])["documents"]
+        if documents:
+            return documents
+    except Exception as e:
+        print(f"⚠️  Could not read passages from ChromaDB ({e}), using synthetic text")
+
+    sentence = ("A linked list stores elements in nodes where each node points to the next one, "
+                "so insertion is constant time but random access is linear. ")
+    return [sentence * 6 for _ in range(count)]
+
+
+def time_to_first_token(llm: MistralLLM, prompt: str, prefix: str, cache_prompt: bool, max_tokens: int) -> float:
+    """Milliseconds until the first streamed token (the rest of the stream is drained)"""
+    start = time.perf_counter()
+    first = None
+    for _ in llm.stream_complete(prompt, cache_prompt=cache_prompt, prompt_prefix=prefix,
+                                 max_tokens=max_tokens, stop=[]):
+        if first is None:
+            first = time.perf_counter() - start
+    return (first if first is not None else time.perf_counter() - start) * 1000
+
+
+def bench_config(llm: MistralLLM, name: str, questions: List[str], documents: List[str],
+                 max_tokens: int) -> Dict[str, float]:
+    cache_prompt, calls = CONFIGS[name]
+    latencies: Dict[str, List[float]] = {call: [] for call, _ in calls}
+    for question in questions:
+        for call, builder in calls:
+            prompt, prefix = builder(question, documents)
+            latencies[call].append(time_to_first_token(llm, prompt, prefix, cache_prompt, max_tokens))
+
+    # The first question warms the server's cache in every configuration
+    result = {}
+    for call, values in latencies.items():
+        measured = sorted(values[1:] or values)
+        result[f"{call}_ttft_p50_ms"] = statistics.median(measured)
+        result[f"{call}_ttft_p95_ms"] = measured[int(len(measured) * 0.95) - 1] if len(measured) > 1 else measured[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark llama.cpp prompt-prefix reuse")
+    parser.add_argument("--url", default=settings.llm_base_url.replace("/v1", ""), help="llama.cpp server")
+    parser.add_argument("--questions", type=int, default=20, help="Questions from the question bank")
+    parser.add_argument("--documents", type=int, default=3, help="Passages per prompt")
+    parser.add_argument("--max-tokens", type=int, default=8, help="Tokens generated per call")
+    parser.add_argument("--prefix-slots", type=int, default=settings.llm_prefix_slots,
+                        help="Pin prefixes to slots (see settings.llm_prefix_slots)")
+    args = parser.parse_args()
+
+    settings.llm_prefix_slots = args.prefix_slots
+    llm = MistralLLM(server_url=args.url)
+    questions = load_questions(args.questions)
+    documents = load_documents(args.documents)
+    print(f"Server: {args.url}")
+    print(f"{len(questions)} questions x (grade + generate), {len(documents)} passages, "
+          f"prefix slots {args.prefix_slots or 'server-chosen'}\n")
+
+    results = {}
+    for name in CONFIGS:
+        print(f"Benchmarking {name}...")
+        results[name] = bench_config(llm, name, questions, documents, args.max_tokens)
+
+    print(f"\n{'layout':<14} {'grade p50':>10} {'grade p95':>10} {'gen p50':>10} {'gen p95':>10}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['grade_ttft_p50_ms']:>8.1f}ms {r['grade_ttft_p95_ms']:>8.1f}ms "
+              f"{r['generate_ttft_p50_ms']:>8.1f}ms {r['generate_ttft_p95_ms']:>8.1f}ms")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_file = RESULTS_DIR / f"prompt_cache_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w") as f:
+        json.dump({"server": args.url, "prefix_slots": args.prefix_slots, "results": results}, f, indent=2)
+    print(f"\n✅ Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Retrieval Benchmark: dense vs. BM25 vs. hybrid (RRF), with and without reranking
+
+The question bank has no chunk-level relevance labels, so recall is
+measured against each question's expected_topics:
+
+  topic recall@k  fraction of expected topics that appear (case-insensitive)
+                  in at least one of the top-k chunks
+  hit@k           fraction of questions where at least one topic appears
+
+dense+rerank and hybrid+rerank over-fetch --rerank-candidates chunks and
+reorder them with the cross-encoder (settings.rerank_model_name, CPU), as
+the endpoints listed in settings.rerank_endpoints do. Latency includes the
+cross-encoder pass; its score cache is cleared before each retriever.
+
+Requires a populated ChromaDB and BM25 index (run `python ingest.py`).
+
+Usage:
+    python evaluation/benchmark_retrieval.py
+    python evaluation/benchmark_retrieval.py --k 3 5 10
+    python evaluation/benchmark_retrieval.py --rerank-candidates 50
+    python evaluation/benchmark_retrieval.py --no-rerank
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from llama_index.core import VectorStoreIndex
+
+from app.core.config import settings
+from app.services.hybrid_retriever import HybridRetriever
+from app.services.model_registry import model_registry
+from app.services.reranker import RerankingRetriever, cross_encoder_reranker
+
+QUESTION_BANK_PATH = Path(__file__).parent / "question_bank.json"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def load_questions() -> List[Dict]:
+    with open(QUESTION_BANK_PATH, "r") as f:
+        return json.load(f)["questions"]
+
+
+def build_retrievers(max_k: int, rerank_candidates: int = 0) -> Dict[str, Callable[[str], List[str]]]:
+    """Each retriever maps a question to its ranked chunk texts"""
+    model_registry.configure_llama_index()
+    vector_store = model_registry.get_vector_store()
+    embed_model = model_registry.get_embed_model()
+    bm25_index = model_registry.get_bm25_index()
+    if bm25_index is None:
+        sys.exit(f"No BM25 index at {settings.bm25_index_path}. Run 'python ingest.py' first.")
+
+    dense = VectorStoreIndex.from_vector_store(vector_store).as_retriever(similarity_top_k=max_k)
+    hybrid = HybridRetriever(vector_store, embed_model, bm25_index, top_k=max_k,
+                             candidate_k=max(max_k, settings.hybrid_candidate_k))
+    collection = model_registry.get_collection()
+
+    def bm25_only(question: str) -> List[str]:
+        ids = [node_id for node_id, _ in bm25_index.search(question, max_k)]
+        if not ids:
+            return []
+        result = collection.get(ids=ids, include=["documents"])
+        by_id = dict(zip(result["ids"], result["documents"]))
+        return [by_id[node_id] for node_id in ids if node_id in by_id]
+
+    retrievers = {
+        "dense": lambda q: [n.node.get_content() for n in dense.retrieve(q)],
+        "bm25": bm25_only,
+        "hybrid": lambda q: [n.node.get_content() for n in hybrid.retrieve(q)],
+    }
+    if rerank_candidates:
+        fetch_k = max(max_k, rerank_candidates)
+        model_registry.get_cross_encoder()  # Model load stays out of the latencies
+        dense_rerank = RerankingRetriever(
+            VectorStoreIndex.from_vector_store(vector_store).as_retriever(similarity_top_k=fetch_k), top_k=max_k)
+        hybrid_rerank = RerankingRetriever(
+            HybridRetriever(vector_store, embed_model, bm25_index, top_k=fetch_k,
+                            candidate_k=max(fetch_k, settings.hybrid_candidate_k)), top_k=max_k)
+        retrievers["dense+rerank"] = lambda q: [n.node.get_content() for n in dense_rerank.retrieve(q)]
+        retrievers["hybrid+rerank"] = lambda q: [n.node.get_content() for n in hybrid_rerank.retrieve(q)]
+    return retrievers
+
+
+def topic_recall(chunks: List[str], topics: List[str]) -> float:
+    text = " ".join(chunks).lower()
+    return sum(1 for topic in topics if topic.lower() in text) / len(topics) if topics else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dense, BM25 and hybrid retrieval")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="Cutoffs to report")
+    parser.add_argument("--rerank-candidates", type=int, default=settings.rerank_candidates,
+                        help="Chunks fetched before cross-encoder reranking")
+    parser.add_argument("--no-rerank", action="store_true", help="Skip the reranked retrievers")
+    args = parser.parse_args()
+
+    questions = load_questions()
+    max_k = max(args.k)
+    retrievers = build_retrievers(max_k, 0 if args.no_rerank else args.rerank_candidates)
+
+    results = {}
+    for name, retrieve in retrievers.items():
+        retrieve(questions[0]["question"])  # Warm-up
+        cross_encoder_reranker.clear()
+        recalls = {k: [] for k in args.k}
+        latencies = []
+        for question in questions:
+            start = time.perf_counter()
+            chunks = retrieve(question["question"])
+            latencies.append((time.perf_counter() - start) * 1000)
+            for k in args.k:
+                recalls[k].append(topic_recall(chunks[:k], question.get("expected_topics", [])))
+
+        latencies.sort()
+        results[name] = {
+            "latency_p50_ms": round(statistics.median(latencies), 1),
+            "latency_p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 1),
+            **{f"recall@{k}": round(statistics.mean(recalls[k]), 3) for k in args.k},
+            **{f"hit@{k}": round(sum(1 for r in recalls[k] if r > 0) / len(questions), 3) for k in args.k},
+        }
+
+    print(f"\n{len(questions)} questions, collection '{settings.chroma_collection_name}'\n")
+    header = f"{'retriever':<14} {'p50':>8} {'p95':>8} " + " ".join(f"{'R@' + str(k):>6} {'hit@' + str(k):>6}" for k in args.k)
+    print(header)
+    for name, r in results.items():
+        row = " ".join(f"{r[f'recall@{k}']:>6.3f} {r[f'hit@{k}']:>6.3f}" for k in args.k)
+        print(f"{name:<14} {r['latency_p50_ms']:>6.1f}ms {r['latency_p95_ms']:>6.1f}ms {row}")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_file = RESULTS_DIR / f"retrieval_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w") as f:
+        json.dump({"rerank_model": settings.rerank_model_name,
+                   "rerank_candidates": 0 if args.no_rerank else args.rerank_candidates,
+                   "results": results}, f, indent=2)
+    print(f"\n✅ Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Startup Benchmark: shared model registry vs. per-service models
+
+Measures wall time and resident memory needed to bring up both RAG
+services in a fresh process:
+
+  - separate: what the services did before the model registry - each
+    builds its own embedding model, LLM client and Chroma PersistentClient
+    (emulated by resetting the registry between the two services)
+  - shared:   both services take their handles from
+    app/services/model_registry.py
+
+Each mode runs in its own subprocess so RSS numbers are not polluted by
+the other mode.
+
+Usage:
+    python evaluation/benchmark_startup.py
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+RESULTS_DIR = Path(__file__).parent / "results"
+MODES = ("separate", "shared")
+
+
+def run_child(mode: str) -> dict:
+    """Initialize the services in this process and report time and RSS"""
+    # Import everything up front in both modes so only model/client creation is measured
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding  # noqa: F401
+    from app.services.agentic_rag import get_agentic_rag_service
+    from app.services.model_registry import current_rss_mb, model_registry
+    from app.services.rag_service import rag_service
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+
+    rag_service.initialize()
+    if mode == "separate":
+        # Forget the shared handles so the agentic service loads its own copies
+        model_registry.reset()
+    get_agentic_rag_service()
+
+    return {
+        "mode": mode,
+        "startup_seconds": round(time.perf_counter() - start, 2),
+        "rss_mb": round(current_rss_mb() - rss_before, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark service startup time and memory")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per mode")
+    args = parser.parse_args()
+
+    if args.child:
+        # Last stdout line is the result; model loading may log above it
+        print(json.dumps(run_child(args.child)))
+        return
+
+    results = {}
+    for mode in MODES:
+        runs = []
+        for i in range(args.runs):
+            print(f"Starting {mode} run {i + 1}/{args.runs}...")
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode],
+                capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        results[mode] = {
+            "startup_seconds": min(r["startup_seconds"] for r in runs),
+            "rss_mb": min(r["rss_mb"] for r in runs),
+        }
+
+    separate, shared = results["separate"], results["shared"]
+    print(f"\n{'mode':<10} {'startup':>9} {'RSS':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['startup_seconds']:>8.2f}s {r['rss_mb']:>7.0f} MB")
+    print(f"\nSaved: {separate['startup_seconds'] - shared['startup_seconds']:.2f}s startup, "
+          f"{separate['rss_mb'] - shared['rss_mb']:.0f} MB RSS")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_file = RESULTS_DIR / f"startup_benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
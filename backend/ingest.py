@@ -8,17 +8,31 @@ os.environ.pop('HF_HUB_ENABLE_HF_TRANSFER', None)
 
 import argparse
 import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 import sys
 
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
+from llama_index.core import SimpleDirectoryReader, Settings
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode, NodeRelationship
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
 import chromadb
 
 from app.core.config import settings
+from app.services.bm25_index import BM25Index
+from app.services.collection_version import bump_collection_version
+from app.services.embedding_backends import create_embedding_model, embedding_model_id
+from app.services.embedding_cache import EmbeddingCache
+from app.services.ingestion_manifest import (
+    IngestionCheckpoint, IngestionManifest, chunk_id, file_sha256
+)
 
 # Configure logging
 logging.basicConfig(
@@ -71,7 +85,8 @@ def load_single_pdf(pdf_path: Path) -> List:
     """Load a single PDF file"""
     try:
         reader = SimpleDirectoryReader(
-            input_files=[str(pdf_path)]
+            input_files=[str(pdf_path)],
+            filename_as_id=True  # Stable document ids, so chunk relationships are reproducible
         )
         documents = reader.load_data()
         return documents
@@ -80,15 +95,15 @@ def load_single_pdf(pdf_path: Path) -> List:
         return []
 
 
-def setup_embedding_model():
-    """Setup embedding model using sentence-transformers (GPU-accelerated)"""
+def setup_embedding_model(batch_size: int = settings.ingest_batch_size, backend: Optional[str] = None):
+    """Setup embedding model (sentence-transformers on GPU, or ONNX Runtime on CPU)"""
     try:
-        logger.info(f"Configuring embeddings: {settings.embedding_model_name} (GPU-accelerated)")
-        embed_model = HuggingFaceEmbedding(
-            model_name=settings.embedding_model_name,
-            device="cuda"  # Use GPU for fast embeddings
+        logger.info(f"Configuring embeddings: {settings.embedding_model_name}")
+        embed_model = create_embedding_model(
+            backend=backend,
+            batch_size=batch_size  # One forward pass per pipeline batch
         )
-        logger.info("✓ Embedding model configured (sentence-transformers on GPU)")
+        logger.info(f"✓ Embedding model configured ({embedding_model_id(embed_model)}, {type(embed_model).__name__})")
         return embed_model
     except Exception as e:
         logger.error(f"Failed to configure embedding model: {e}")
@@ -127,43 +142,545 @@ def create_vector_store(overwrite: bool = False):
         sys.exit(1)
 
 
-def ingest_pdf_file(pdf_path: Path, vector_store, embed_model, node_parser, index):
-    """Ingest a single PDF file"""
-    try:
-        logger.info(f"Processing: {pdf_path.name}")
+def delete_chunks(chunk_ids: List[str], batch_size: int = 5000):
+    """Delete chunks from the collection by id"""
+    collection = chroma_client.get_collection(name=settings.chroma_collection_name)
+    for start in range(0, len(chunk_ids), batch_size):
+        collection.delete(ids=chunk_ids[start:start + batch_size])
+
+
+def load_manifest(overwrite: bool) -> IngestionManifest:
+    """Load the ingestion manifest (or start a fresh one for --overwrite)"""
+    manifest = IngestionManifest(
+        settings.ingest_manifest_path,
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        embedding_model=settings.embedding_model_name
+    )
+    if overwrite:
+        manifest.reset()
+        return manifest
+
+    manifest_exists = manifest.path.exists()
+    manifest.load()
+
+    if not manifest_exists:
+        # Chunks ingested before manifest tracking can't be matched to files
+        existing = chroma_client.get_or_create_collection(name=settings.chroma_collection_name).count()
+        if existing:
+            logger.error(
+                f"Collection '{settings.chroma_collection_name}' has {existing} chunks but there is no "
+                f"ingestion manifest at {manifest.path}. Rerun once with --overwrite to rebuild it "
+                f"under manifest tracking (otherwise every PDF would be duplicated)."
+            )
+            sys.exit(1)
 
-        # Load this PDF
-        documents = load_single_pdf(pdf_path)
-        if not documents:
-            logger.warning(f"  Skipping {pdf_path.name} (no documents loaded)")
-            return 0
+    return manifest
 
-        logger.info(f"  Loaded {len(documents)} pages")
 
-        # Parse into chunks
-        nodes = node_parser.get_nodes_from_documents(documents)
-        logger.info(f"  Created {len(nodes)} chunks")
+def remove_stale_chunks(manifest: IngestionManifest, stale_entries):
+    """Delete chunks of PDFs that were changed or removed since the last run"""
+    for entry in stale_entries:
+        logger.info(f"Removing {len(entry.chunk_ids)} stale chunks for {Path(entry.path).name}")
+        delete_chunks(entry.chunk_ids)
+        manifest.remove(entry.path)
+    if stale_entries:
+        manifest.save()
 
-        # Insert nodes (with progress tracking)
-        for i, node in enumerate(nodes, 1):
-            if i % 50 == 0:
-                logger.info(f"  Progress: {i}/{len(nodes)} chunks")
-            index.insert_nodes([node])
 
-        logger.info(f"  ✓ Completed {pdf_path.name}: {len(nodes)} chunks ingested")
-        return len(nodes)
+def build_bm25_index(vector_store: ChromaVectorStore, page_size: int = 5000):
+    """Rebuild the BM25 index from every chunk in the collection (used for hybrid retrieval)"""
+    try:
+        start = time.perf_counter()
+        collection = vector_store.client
+        doc_ids, texts = [], []
+        for offset in range(0, collection.count(), page_size):
+            page = collection.get(limit=page_size, offset=offset, include=["documents"])
+            doc_ids.extend(page["ids"])
+            texts.extend(page["documents"])
+
+        index = BM25Index.build(doc_ids, texts)
+        index.save(settings.bm25_index_path)
+        logger.info(f"✓ BM25 index built: {index.num_docs} chunks, {len(index.terms)} terms "
+                    f"in {time.perf_counter() - start:.1f}s ({settings.bm25_index_path})")
+    except Exception as e:
+        # Dense retrieval still works without it
+        logger.error(f"Failed to build BM25 index: {e}")
+
+
+# === PIPELINED INGESTION ===
+#
+# parse thread  --(NodeBatch)-->  embed thread  --(NodeBatch)-->  writer (main thread)
+#
+# Queues between stages are bounded, so a fast parser cannot run ahead of the
+# embedder by more than `ingest_queue_size` batches. PDF text extraction, the
+# embedding forward pass and the Chroma write therefore overlap instead of
+# running back to back for every chunk.
+#
+# With --parse-workers N > 1 the parse thread only collects results: PDFs are
+# extracted and split in a process pool (sidestepping the GIL) and the workers
+# stream NodeBatches back through a bounded multiprocessing queue.
+
+_SENTINEL = None  # Marks the end of a stage's output
+
+
+@dataclass
+class PdfJob:
+    """A PDF to ingest"""
+    path: Path
+    sha256: Optional[str] = None  # Computed by the parse stage when not known yet
+    resume_after: int = -1        # Batches up to this index were committed by an earlier run
+
+
+@dataclass
+class NodeBatch:
+    """A batch of chunks from a single PDF travelling through the pipeline"""
+    pdf_path: Path
+    nodes: List[BaseNode]
+    batch_index: int = 0
+    sha256: str = ""
+    is_last: bool = False  # Last batch of this PDF
+    failed: bool = False   # Loading, embedding or writing failed for this batch
+    committed_ids: List[str] = field(default_factory=list)  # Already written by an earlier run (--resume)
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks = 0
+        self.busy_seconds = 0.0
+
+    def record(self, chunks: int, seconds: float):
+        self.chunks += chunks
+        self.busy_seconds += seconds
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name:<6} {self.chunks} chunks, {self.busy_seconds:.1f}s busy "
+                f"({self.chunks_per_second:.1f} chunks/sec)")
+
+
+def _put(q: queue.Queue, item, stop_event: threading.Event):
+    """Put with backpressure, giving up if the pipeline is shutting down"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def assign_chunk_ids(nodes: List[BaseNode], sha256: str, chunk_size: int, chunk_overlap: int):
+    """Replace the splitter's random ids with deterministic ones (see chunk_id)"""
+    id_map = {}
+    for index, node in enumerate(nodes):
+        new_id = chunk_id(sha256, chunk_size, chunk_overlap, index)
+        id_map[node.node_id] = new_id
+        node.id_ = new_id
+
+    # Keep prev/next links pointing at the renamed chunks
+    for node in nodes:
+        for relationship in (NodeRelationship.PREVIOUS, NodeRelationship.NEXT):
+            related = node.relationships.get(relationship)
+            if related is not None and related.node_id in id_map:
+                related.node_id = id_map[related.node_id]
+
+
+def parse_pdf(pdf_path: Path, node_parser, sha256: str) -> List[BaseNode]:
+    """Load a single PDF and split it into chunks with deterministic ids"""
+    documents = load_single_pdf(pdf_path)
+    if not documents:
+        return []
+    nodes = node_parser.get_nodes_from_documents(documents)
+    assign_chunk_ids(nodes, sha256, node_parser.chunk_size, node_parser.chunk_overlap)
+    return nodes
+
+
+def batch_nodes(pdf_path: Path, nodes: List[BaseNode], batch_size: int,
+                sha256: str = "", resume_after: int = -1) -> Iterator[NodeBatch]:
+    """
+    Split one PDF's chunks into NodeBatches (always yields at least one batch).
+
+    Batches up to `resume_after` were committed by an earlier run; they are
+    passed through without nodes, carrying only their chunk ids.
+    """
+    if not nodes:
+        yield NodeBatch(pdf_path=pdf_path, nodes=[], sha256=sha256, is_last=True, failed=True)
+        return
+
+    for batch_index, start in enumerate(range(0, len(nodes), batch_size)):
+        batch = NodeBatch(
+            pdf_path=pdf_path,
+            nodes=nodes[start:start + batch_size],
+            batch_index=batch_index,
+            sha256=sha256,
+            is_last=start + batch_size >= len(nodes)
+        )
+        if batch_index <= resume_after:
+            batch.committed_ids = [node.node_id for node in batch.nodes]
+            batch.nodes = []
+        yield batch
+
 
+def parse_job(job: PdfJob, node_parser, batch_size: int) -> Tuple[int, Iterator[NodeBatch]]:
+    """Hash (if needed), parse and batch one PDF. Returns (num_chunks, batches)."""
+    try:
+        sha256 = job.sha256 or file_sha256(job.path)
+        nodes = parse_pdf(job.path, node_parser, sha256)
     except Exception as e:
-        logger.error(f"  Failed to ingest {pdf_path.name}: {e}")
-        return 0
+        logger.error(f"  Failed to parse {job.path.name}: {e}")
+        sha256, nodes = job.sha256 or "", []
+
+    if job.resume_after >= 0 and nodes:
+        logger.info(f"  Resuming {job.path.name} after batch {job.resume_after}")
+    return len(nodes), batch_nodes(job.path, nodes, batch_size, sha256, job.resume_after)
+
+
+def parse_stage(jobs: List[PdfJob], node_parser, batch_size: int,
+                out_queue: queue.Queue, stats: StageStats, stop_event: threading.Event):
+    """Producer: load and chunk PDFs one at a time, emitting fixed-size batches"""
+    try:
+        for i, job in enumerate(jobs, 1):
+            if stop_event.is_set():
+                break
+            logger.info(f"[{i}/{len(jobs)}] Parsing {job.path.name}")
+
+            start = time.perf_counter()
+            num_chunks, batches = parse_job(job, node_parser, batch_size)
+            stats.record(num_chunks, time.perf_counter() - start)
+            logger.info(f"  {job.path.name}: {num_chunks} chunks")
+
+            for batch in batches:
+                _put(out_queue, batch, stop_event)
+    finally:
+        _put(out_queue, _SENTINEL, stop_event)
+
+
+# --- Process-pool parse stage ---
+
+# Per-worker-process state, set up once by _init_parse_worker
+_worker_batch_queue = None
+_worker_node_parser = None
+
+
+def _init_parse_worker(batch_queue, chunk_size: int, chunk_overlap: int):
+    """Process pool initializer: keep the result queue and build a splitter"""
+    global _worker_batch_queue, _worker_node_parser
+    _worker_batch_queue = batch_queue
+    _worker_node_parser = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def _parse_pdf_worker(job: PdfJob, batch_size: int) -> int:
+    """Runs in a worker process: parse one PDF and stream its batches back"""
+    logger.info(f"Parsing {job.path.name}")
+    num_chunks, batches = parse_job(job, _worker_node_parser, batch_size)
+    logger.info(f"  {job.path.name}: {num_chunks} chunks")
+
+    # Blocks while the queue is full, so workers never run far ahead of the embedder
+    for batch in batches:
+        _worker_batch_queue.put(batch)
+    return num_chunks
+
+
+def parallel_parse_stage(jobs: List[PdfJob], parse_workers: int, batch_size: int,
+                         out_queue: queue.Queue, stats: StageStats, stop_event: threading.Event):
+    """Producer: parse PDFs in a process pool and forward the streamed batches"""
+    # Not fork: the embed thread is already running and the embedding model (torch,
+    # HF tokenizers, maybe CUDA) is loaded; forking that can deadlock the children.
+    # Workers get everything they need from the initializer.
+    ctx = multiprocessing.get_context("spawn")
+    batch_queue = ctx.Queue(maxsize=settings.ingest_queue_size)
+    pool = ProcessPoolExecutor(
+        max_workers=parse_workers,
+        mp_context=ctx,
+        initializer=_init_parse_worker,
+        initargs=(batch_queue, settings.chunk_size, settings.chunk_overlap)
+    )
+    futures = {}
+    start = time.perf_counter()
+
+    try:
+        futures = {pool.submit(_parse_pdf_worker, job, batch_size): job.path for job in jobs}
+        pending = len(jobs)
+
+        while pending and not stop_event.is_set():
+            try:
+                batch = batch_queue.get(timeout=1.0)
+            except queue.Empty:
+                # A worker that crashed never sends its last batch
+                for future, pdf_path in list(futures.items()):
+                    if future.done() and future.exception() is not None:
+                        logger.error(f"  Parse worker failed on {pdf_path.name}: {future.exception()}")
+                        del futures[future]
+                        pending -= 1
+                        _put(out_queue, NodeBatch(pdf_path=pdf_path, nodes=[], is_last=True, failed=True), stop_event)
+                continue
+
+            stats.chunks += len(batch.nodes)
+            if batch.is_last:
+                pending -= 1
+            _put(out_queue, batch, stop_event)
+
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Drain so workers blocked on a full queue can exit
+        while any(not future.done() for future in futures):
+            try:
+                batch_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        # Workers run concurrently, so report wall time rather than summed CPU time
+        stats.busy_seconds = time.perf_counter() - start
+        _put(out_queue, _SENTINEL, stop_event)
+
+
+def embed_texts(texts: List[str], embed_model, cache: Optional[EmbeddingCache] = None) -> List[List[float]]:
+    """Embed texts in one batched forward pass, running the model only on cache misses"""
+    if cache is None:
+        return embed_model.get_text_embedding_batch(texts)
+
+    embeddings = cache.get_many(texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        computed = embed_model.get_text_embedding_batch([texts[i] for i in missing])
+        cache.put_many([texts[i] for i in missing], computed)
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+    return embeddings
+
+
+def embed_stage(in_queue: queue.Queue, out_queue: queue.Queue, embed_model,
+                stats: StageStats, stop_event: threading.Event,
+                cache: Optional[EmbeddingCache] = None):
+    """Embed each batch with a single batched forward pass"""
+    try:
+        while True:
+            batch = in_queue.get()
+            if batch is _SENTINEL:
+                break
+
+            if batch.nodes and not batch.failed:
+                start = time.perf_counter()
+                try:
+                    # Same text VectorStoreIndex would embed (content + embed metadata)
+                    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch.nodes]
+                    embeddings = embed_texts(texts, embed_model, cache)
+                    for node, embedding in zip(batch.nodes, embeddings):
+                        node.embedding = embedding
+                except Exception as e:
+                    logger.error(f"  Failed to embed batch from {batch.pdf_path.name}: {e}")
+                    batch.failed = True
+                stats.record(len(batch.nodes), time.perf_counter() - start)
+
+            _put(out_queue, batch, stop_event)
+    finally:
+        _put(out_queue, _SENTINEL, stop_event)
+
+
+def upsert_nodes(vector_store: ChromaVectorStore, nodes: List[BaseNode]) -> List[str]:
+    """
+    Bulk-write embedded nodes to Chroma.
+
+    Same payload as ChromaVectorStore.add(), but uses upsert so a batch
+    replayed after a crash overwrites its chunks instead of being skipped
+    or duplicated.
+    """
+    ids, embeddings, metadatas, documents = [], [], [], []
+    for node in nodes:
+        metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=vector_store.flat_metadata)
+        ids.append(node.node_id)
+        embeddings.append(node.get_embedding())
+        metadatas.append({key: ("" if value is None else value) for key, value in metadata.items()})
+        documents.append(node.get_content(metadata_mode=MetadataMode.NONE))
+
+    vector_store.client.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+    return ids
+
+
+class ProgressTracker:
+    """
+    Records writer progress in the checkpoint journal and the manifest.
+
+    Committed batches go to the journal (so --resume can skip them); a PDF
+    whose batches all succeeded is recorded in the manifest; a PDF that
+    failed partway is rolled back.
+    """
+
+    def __init__(self, manifest: IngestionManifest, checkpoint: IngestionCheckpoint):
+        self.manifest = manifest
+        self.checkpoint = checkpoint
+
+    def batch_committed(self, batch: NodeBatch):
+        self.checkpoint.batch_committed(self.manifest.key_for(batch.pdf_path), batch.sha256, batch.batch_index)
+
+    def pdf_completed(self, batch: NodeBatch, chunk_ids: List[str], succeeded: bool):
+        key = self.manifest.key_for(batch.pdf_path)
+        if succeeded:
+            self.manifest.record(batch.pdf_path, chunk_ids, sha256=batch.sha256)
+            self.manifest.save()
+            self.checkpoint.pdf_completed(key, batch.sha256)
+        else:
+            if chunk_ids:
+                # Leave no partial PDF behind; it is retried on the next run
+                delete_chunks(chunk_ids)
+            self.checkpoint.pdf_reset(key)
+
+
+def write_stage(in_queue: queue.Queue, vector_store, stats: StageStats,
+                tracker: Optional[ProgressTracker] = None) -> Tuple[int, int]:
+    """
+    Consumer: bulk-upsert embedded batches to the vector store
+
+    Args:
+        tracker: Notified after every committed batch and every finished PDF
+
+    Returns:
+        (total_chunks, successful_pdfs)
+    """
+    total_chunks = 0
+    successful_pdfs = 0
+    # Per-PDF state; parse workers interleave batches of different PDFs
+    pdf_chunk_ids: Dict[Path, List[str]] = {}
+    pdf_failed: Dict[Path, bool] = {}
+
+    while True:
+        batch = in_queue.get()
+        if batch is _SENTINEL:
+            break
+
+        chunk_ids = pdf_chunk_ids.setdefault(batch.pdf_path, [])
+        chunk_ids.extend(batch.committed_ids)
+
+        if batch.nodes and not batch.failed:
+            start = time.perf_counter()
+            try:
+                chunk_ids.extend(upsert_nodes(vector_store, batch.nodes))
+                if tracker is not None:
+                    tracker.batch_committed(batch)
+            except Exception as e:
+                logger.error(f"  Failed to write batch from {batch.pdf_path.name}: {e}")
+                batch.failed = True
+            stats.record(len(batch.nodes), time.perf_counter() - start)
 
+        pdf_failed[batch.pdf_path] = pdf_failed.get(batch.pdf_path, False) or batch.failed
 
-def ingest_documents_incremental(pdf_files: List[Path], vector_store, embed_model):
-    """Ingest documents one PDF at a time to conserve memory"""
+        if batch.is_last:
+            chunk_ids = pdf_chunk_ids.pop(batch.pdf_path)
+            succeeded = bool(chunk_ids) and not pdf_failed.pop(batch.pdf_path)
+            if succeeded:
+                successful_pdfs += 1
+                total_chunks += len(chunk_ids)
+                logger.info(f"  ✓ Completed {batch.pdf_path.name}: {len(chunk_ids)} chunks ingested")
+            elif chunk_ids:
+                logger.warning(f"  ⚠ Failed {batch.pdf_path.name}: some batches failed, "
+                               f"rolling back {len(chunk_ids)} written chunks")
+            else:
+                logger.warning(f"  Skipping {batch.pdf_path.name} (no chunks ingested)")
+
+            if tracker is not None:
+                tracker.pdf_completed(batch, chunk_ids, succeeded)
+
+    return total_chunks, successful_pdfs
+
+
+def build_jobs(pdf_files: List[Path], digests: dict, manifest: IngestionManifest,
+               checkpoint: IngestionCheckpoint, resume: bool = True) -> List[PdfJob]:
+    """Create pipeline jobs, picking up resume points from the checkpoint (if resuming)"""
+    jobs = []
+    for pdf_path in pdf_files:
+        key = manifest.key_for(pdf_path)
+        job = PdfJob(path=pdf_path, sha256=digests.get(key))
+        if checkpoint.has_progress(key):
+            # Only resume if the file content is the one the journal refers to
+            job.sha256 = job.sha256 or file_sha256(pdf_path)
+            if resume:
+                job.resume_after = checkpoint.resume_after(key, job.sha256)
+        jobs.append(job)
+
+    resumed = sum(1 for job in jobs if job.resume_after >= 0)
+    if resumed:
+        logger.info(f"Resuming {resumed} partially ingested PDF(s) from checkpoint")
+    return jobs
+
+
+def remove_orphaned_progress(jobs: List[PdfJob], manifest: IngestionManifest,
+                             checkpoint: IngestionCheckpoint, resume: bool = True) -> bool:
+    """
+    Delete chunks an interrupted run committed for PDF content that is gone
+
+    A PDF changed or deleted between the crash and the next run leaves the
+    batches written under its old SHA-256 in the collection; nothing else
+    refers to those ids. Progress for a PDF outside this run whose content
+    is unchanged is kept for a later resume, unless resume is False: a
+    plain run discards the journal, so nothing could pick it up again.
+
+    Returns:
+        True if any chunks were deleted
+    """
+    current = {manifest.key_for(job.path): job.sha256 for job in jobs}
+    removed = False
+    for key, sha256 in list(checkpoint.last_batch):
+        if current.get(key) == sha256:
+            continue  # Rewritten (same ids) or resumed by this run
+        if resume and key not in current and Path(key).exists() and file_sha256(Path(key)) == sha256:
+            continue
+        chunk_ids = checkpoint.committed_chunk_ids(key, sha256)
+        logger.info(f"Removing {len(chunk_ids)} chunks of an interrupted run for {Path(key).name} "
+                    f"(changed or removed since)")
+        delete_chunks(chunk_ids)
+        checkpoint.pdf_reset(key, sha256)
+        removed = True
+    return removed
+
+
+def start_checkpoint(checkpoint: IngestionCheckpoint, pdf_files: List[Path], digests: dict,
+                     manifest: IngestionManifest, resume: bool) -> Tuple[List[PdfJob], bool]:
+    """
+    Reconcile the journal of an earlier run, then start journaling this one
+
+    The journal is always replayed, even without --resume: it is the only
+    record of chunks an interrupted run wrote for PDFs that have since
+    changed or vanished, so they are rolled back before a plain run
+    truncates it.
+
+    Returns:
+        (jobs, True if orphaned chunks were deleted)
+    """
+    checkpoint.load()
+    jobs = build_jobs(pdf_files, digests, manifest, checkpoint, resume=resume)
+    if resume:
+        checkpoint.open(resume=True)
+        orphaned = remove_orphaned_progress(jobs, manifest, checkpoint)
+    else:
+        # Not journaled: a crash before the truncation below replays the same deletes next run
+        orphaned = remove_orphaned_progress(jobs, manifest, checkpoint, resume=False)
+        if jobs:
+            checkpoint.open(resume=False)
+    return jobs, orphaned
+
+
+def ingest_documents_incremental(jobs: List[PdfJob], vector_store, embed_model,
+                                 batch_size: int = settings.ingest_batch_size,
+                                 parse_workers: int = settings.ingest_parse_workers,
+                                 tracker: Optional[ProgressTracker] = None,
+                                 cache: Optional[EmbeddingCache] = None) -> bool:
+    """
+    Ingest documents through the parse → embed → write pipeline
+
+    Returns:
+        True if every PDF was ingested successfully
+    """
     try:
-        logger.info("Starting incremental document ingestion...")
+        logger.info("Starting pipelined document ingestion...")
         logger.info(f"Chunk size: {settings.chunk_size}, Overlap: {settings.chunk_overlap}")
-        logger.info(f"Total PDFs to process: {len(pdf_files)}")
+        logger.info(f"Batch size: {batch_size}, Queue size: {settings.ingest_queue_size}, "
+                    f"Parse workers: {parse_workers}")
+        logger.info(f"Total PDFs to process: {len(jobs)}")
 
         # Configure Settings
         Settings.embed_model = embed_model
@@ -176,28 +693,65 @@ def ingest_documents_incremental(pdf_files: List[Path], vector_store, embed_mode
             chunk_overlap=settings.chunk_overlap
         )
 
-        # Create index
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-
-        # Process each PDF one at a time
-        total_chunks = 0
-        successful_pdfs = 0
-
-        for i, pdf_path in enumerate(pdf_files, 1):
-            logger.info(f"\n[{i}/{len(pdf_files)}] Processing PDF...")
-            chunks = ingest_pdf_file(pdf_path, vector_store, embed_model, node_parser, index)
-
-            if chunks > 0:
-                total_chunks += chunks
-                successful_pdfs += 1
+        parsed_queue = queue.Queue(maxsize=settings.ingest_queue_size)
+        embedded_queue = queue.Queue(maxsize=settings.ingest_queue_size)
+        stop_event = threading.Event()
+        stats = {name: StageStats(name) for name in ("parse", "embed", "write")}
+
+        if parse_workers > 1:
+            parse_target = parallel_parse_stage
+            parse_args = (jobs, parse_workers, batch_size, parsed_queue, stats["parse"], stop_event)
+        else:
+            parse_target = parse_stage
+            parse_args = (jobs, node_parser, batch_size, parsed_queue, stats["parse"], stop_event)
+
+        threads = [
+            threading.Thread(
+                target=parse_target,
+                args=parse_args,
+                name="ingest-parse",
+                daemon=True
+            ),
+            threading.Thread(
+                target=embed_stage,
+                args=(parsed_queue, embedded_queue, embed_model, stats["embed"], stop_event, cache),
+                name="ingest-embed",
+                daemon=True
+            ),
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        try:
+            total_chunks, successful_pdfs = write_stage(
+                embedded_queue, vector_store, stats["write"], tracker=tracker
+            )
+        finally:
+            # Unblocks the upstream stages if the writer bailed out early
+            stop_event.set()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        elapsed = time.perf_counter() - start
 
         logger.info("\n" + "=" * 60)
         logger.info("✓ Document ingestion complete!")
-        logger.info(f"Successful PDFs: {successful_pdfs}/{len(pdf_files)}")
+        logger.info(f"Successful PDFs: {successful_pdfs}/{len(jobs)}")
         logger.info(f"Total chunks: {total_chunks}")
         logger.info(f"Collection: {settings.chroma_collection_name}")
+        logger.info("Stage throughput:")
+        for stage in stats.values():
+            logger.info(f"  {stage.summary()}")
+        if elapsed > 0:
+            logger.info(f"  total  {total_chunks} chunks in {elapsed:.1f}s wall ({total_chunks / elapsed:.1f} chunks/sec)")
+        if cache is not None:
+            logger.info(cache.summary())
         logger.info("=" * 60)
 
+        return successful_pdfs == len(jobs)
+
     except Exception as e:
         logger.error(f"Failed to ingest documents: {e}")
         import traceback
@@ -219,13 +773,44 @@ def main():
     parser.add_argument(
         "--overwrite",
         action="store_true",
-        help="Overwrite existing collection (deletes all existing data)"
+        help="Overwrite existing collection (deletes all existing data and the ingestion manifest)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.ingest_batch_size,
+        help=f"Chunks per embedding/write batch (default: {settings.ingest_batch_size})"
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=settings.ingest_parse_workers,
+        help="Processes used for PDF extraction and chunking; 1 parses in-process "
+             f"(default: {settings.ingest_parse_workers})"
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=["auto", "torch", "onnx"],
+        default=None,
+        help=f"Embedding backend (default: {settings.embedding_backend})"
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Always run the embedding model instead of reusing cached vectors"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from its checkpoint journal, skipping committed batches"
     )
 
     args = parser.parse_args()
+    if args.resume and args.overwrite:
+        parser.error("--resume cannot be combined with --overwrite")
 
     logger.info("=" * 60)
-    logger.info("AI Mentor - Document Ingestion (Memory-Efficient)")
+    logger.info("AI Mentor - Document Ingestion (Pipelined)")
     logger.info("=" * 60)
 
     # Step 1: Prepare ChromaDB
@@ -237,14 +822,58 @@ def main():
         logger.warning("No PDF files to ingest")
         sys.exit(0)
 
-    # Step 3: Setup embedding model
-    embed_model = setup_embedding_model()
-
-    # Step 4: Create vector store
+    # Step 3: Create vector store
     vector_store = create_vector_store(overwrite=args.overwrite)
 
-    # Step 5: Ingest documents incrementally (one PDF at a time)
-    ingest_documents_incremental(pdf_files, vector_store, embed_model)
+    # Step 4: Work out what changed since the last run
+    manifest = load_manifest(overwrite=args.overwrite)
+    diff = manifest.diff(pdf_files, root=Path(args.directory))
+    logger.info(f"Manifest: {diff.summary()}")
+    remove_stale_chunks(manifest, diff.removed)
+    if diff.dirty:
+        manifest.save()  # Touched-but-identical PDFs got a new mtime; skip hashing them next run
+
+    # Step 5: Open the checkpoint journal and work out where to resume
+    checkpoint = IngestionCheckpoint(
+        settings.ingest_checkpoint_path,
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        batch_size=args.batch_size
+    )
+    jobs, orphaned = start_checkpoint(checkpoint, diff.to_ingest, diff.digests, manifest, resume=args.resume)
+
+    if not jobs:
+        checkpoint.close(remove=not checkpoint.last_batch)
+        if diff.removed or orphaned or not Path(settings.bm25_index_path).exists():
+            build_bm25_index(vector_store)
+            bump_collection_version()  # Running servers reload the BM25 index on a version change
+        logger.info("\nCollection is already up to date. Nothing to ingest.")
+        return
+
+    # Step 6: Setup embedding model (only needed when there is work to do)
+    embed_model = setup_embedding_model(batch_size=args.batch_size, backend=args.embedding_backend)
+
+    cache = None
+    if settings.embedding_cache_enabled and not args.no_embedding_cache:
+        # Keyed by backend variant too: int8 ONNX vectors differ slightly from torch ones
+        cache = EmbeddingCache(settings.embedding_cache_dir, embedding_model_id(embed_model)).load()
+
+    # Step 7: Ingest new and changed documents (parse, embed and write stages overlap)
+    all_succeeded = ingest_documents_incremental(
+        jobs, vector_store, embed_model,
+        batch_size=args.batch_size,
+        parse_workers=args.parse_workers,
+        tracker=ProgressTracker(manifest, checkpoint),
+        cache=cache
+    )
+    # Keep the journal around if anything failed, so progress is visible
+    checkpoint.close(remove=all_succeeded)
+
+    # Step 8: Rebuild the lexical index over the updated collection
+    build_bm25_index(vector_store)
+
+    # Step 9: Tell running servers to drop retrieval results cached before this run
+    bump_collection_version()
 
     logger.info("\nIngestion complete! You can now start the backend server.")
 
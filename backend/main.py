@@ -2,8 +2,9 @@
 AI Mentor FastAPI Application
 Main entry point for the backend API server.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import logging
 
 from app.api.chat_router import router as chat_router
@@ -11,6 +12,7 @@ from app.api.chat_ws import router as chat_ws_router
 from app.api.auth_router import router as auth_router
 from app.api.analytics_router import router as analytics_router
 from app.middleware.analytics_middleware import AnalyticsMiddleware
+from app.services.llm_scheduler import LLMOverloadedError
 
 # Configure logging
 logging.basicConfig(
@@ -50,6 +52,15 @@ app.include_router(chat_ws_router)
 app.include_router(auth_router, prefix="/api", tags=["authentication"])
 app.include_router(analytics_router)
 
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    """LLM server saturated: 429 (queue full) or 503 (queue wait timed out)"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/")
 def health_check():
     """Root health check endpoint"""
@@ -72,6 +83,10 @@ def detailed_health():
         }
     }
 
+    # Shared model handles (load times, process RSS)
+    from app.services.model_registry import model_registry
+    health["models"] = model_registry.stats()
+
     # Check LLM server
     try:
         import requests
@@ -91,6 +106,31 @@ def detailed_health():
 
     return health
 
+@app.get("/api/metrics")
+def metrics():
+    """In-process cache and model metrics"""
+    from app.services.model_registry import model_registry
+    from app.services.retrieval_cache import retrieval_cache
+    from app.services.semantic_cache import semantic_cache
+    from app.core.concurrency import blocking_pool_stats
+    from app.services.llm_scheduler import llm_scheduler
+    from app.services.grading_gate import grading_gate
+    from app.services.phase_classifier import phase_classifier
+    from app.services.reranker import cross_encoder_reranker
+    metrics = {
+        "llm_scheduler": llm_scheduler.stats(),
+        "grading_gate": grading_gate.stats(),
+        "phase_classifier": phase_classifier.stats(),
+        "blocking_pool": blocking_pool_stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "reranker": cross_encoder_reranker.stats(),
+        "models": model_registry.stats()
+    }
+    if settings.llm_base_urls:
+        metrics["llm_backends"] = model_registry.get_llm().backend_pool.stats()
+    return metrics
+
 @app.on_event("startup")
 async def startup_event():
     """Run on application startup"""
@@ -116,16 +156,55 @@ async def startup_event():
         logger.info("Initializing RAG service...")
         rag_service.initialize()
         logger.info("✓ RAG service initialized successfully")
+
+        from app.services.model_registry import model_registry
+        logger.info(model_registry.summary())
+
+        if settings.semantic_cache_enabled:
+            from app.services.semantic_cache import semantic_cache
+            semantic_cache.load()
+
+        if settings.phase_classifier_enabled:
+            # Train in the background so the first pedagogical turn doesn't wait for it
+            import asyncio
+            from app.core.concurrency import run_blocking
+            from app.services.phase_classifier import phase_classifier
+            asyncio.ensure_future(run_blocking(phase_classifier.warm_up))
     except Exception as e:
         logger.error(f"Failed to initialize RAG service: {e}")
         import traceback
         traceback.print_exc()
 
+    # The prompt token counter may download its encoding: load it before serving, off the event loop
+    # (an unavailable encoding is logged and token counts are estimated instead)
+    from app.core.concurrency import run_blocking
+    from app.services.context_packer import token_counter
+    await run_blocking(token_counter.warm_up)
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on application shutdown"""
     logger.info("👋 AI Mentor API shutting down...")
 
+    # Snapshot cached answers so they survive the restart
+    if settings.semantic_cache_enabled:
+        try:
+            from app.services.semantic_cache import semantic_cache
+            semantic_cache.save()
+        except Exception as e:
+            logger.error(f"Failed to save semantic cache: {e}")
+
+    # Stop the blocking work pool
+    from app.core.concurrency import shutdown_blocking_executor
+    shutdown_blocking_executor()
+
+    # Close pooled LLM connections
+    try:
+        from app.services.model_registry import model_registry
+        await model_registry.aclose()
+    except Exception as e:
+        logger.error(f"Failed to close LLM connections: {e}")
+
     # Shutdown analytics service
     if settings.analytics_enabled:
         try:
@@ -23,13 +23,13 @@ from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Set
 import requests
 from dataclasses import dataclass
-import chromadb
 import fitz  # PyMuPDF
 
 # Add backend path for imports
 sys.path.append('/root/AIMentorProject/backend')
 from app.core.config import settings
 from app.services.agentic_rag import get_agentic_rag_service
+from app.services.model_registry import model_registry
 
 # Configure logging
 logging.basicConfig(
@@ -147,8 +147,9 @@ class ChromaDBVerifier:
     """Verifies citations against ChromaDB content"""
 
     def __init__(self):
-        self.client = chromadb.PersistentClient(path=settings.chroma_db_path)
-        self.collection = self.client.get_or_create_collection(name=settings.chroma_collection_name)
+        # Same client and collection handles the RAG service uses
+        self.client = model_registry.get_chroma_client()
+        self.collection = model_registry.get_collection()
         self.rag_service = get_agentic_rag_service()
 
     def search_by_filename(self, filename: str) -> List[Dict]:
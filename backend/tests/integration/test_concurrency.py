@@ -0,0 +1,101 @@
+"""
+Integration tests for concurrent chat requests
+
+Blocking RAG/LLM work must run on the worker pool, so N simultaneous
+requests overlap instead of being served one after another.
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+# Add backend to path
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from main import app
+from app.models.pedagogical_state import PedagogicalState
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.rag_service import RAGService
+
+CONCURRENT_REQUESTS = 4
+BLOCKING_SECONDS = 0.3
+
+
+def slow(result):
+    """A blocking call (like graph.invoke or an LLM request) returning result"""
+    def call(*args, **kwargs):
+        time.sleep(BLOCKING_SECONDS)
+        return result
+    return call
+
+
+async def post_concurrently(path: str) -> float:
+    """Fire CONCURRENT_REQUESTS at path, return wall time"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post(path, json={"message": f"What is a heap? ({i})", "conversation_id": f"c{i}"})
+            for i in range(CONCURRENT_REQUESTS)
+        ])
+        elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+    return elapsed
+
+
+def assert_overlapped(elapsed: float):
+    serial = CONCURRENT_REQUESTS * BLOCKING_SECONDS
+    assert elapsed < serial * 0.6, f"{CONCURRENT_REQUESTS} requests took {elapsed:.2f}s (serial: {serial:.2f}s)"
+
+
+@pytest.mark.integration
+class TestConcurrentRequests:
+    """Simultaneous requests must not serialize on the event loop"""
+
+    async def test_simple_chat_requests_overlap(self):
+        service = RAGService()
+        service._initialized = True
+        service.query_engine = MagicMock()
+        service.query_engine.query.side_effect = slow(MagicMock(source_nodes=[], __str__=lambda self: "A heap..."))
+
+        with patch("app.api.chat_router.rag_service", service):
+            assert_overlapped(await post_concurrently("/api/chat"))
+
+    async def test_agentic_chat_requests_overlap(self):
+        agentic = MagicMock()
+        agentic.query.side_effect = slow({
+            "answer": "A heap is a tree.", "sources": [], "question": "What is a heap?",
+            "workflow_path": "retrieve → generate", "rewrites_used": 0, "was_rewritten": False
+        })
+
+        with patch("app.api.chat_router.get_agentic_rag_service", return_value=agentic):
+            assert_overlapped(await post_concurrently("/api/chat-agentic"))
+
+    async def test_pedagogical_chat_requests_overlap(self):
+        def node(graph_state):
+            time.sleep(BLOCKING_SECONDS)
+            return {"pedagogical_state": graph_state["pedagogical_state"], "generation": "What have you tried so far?"}
+
+        with patch("app.services.pedagogical_graph.route_phase", return_value="INITIAL"), \
+                patch("app.services.pedagogical_graph.initial_node", side_effect=node), \
+                patch("app.api.chat_router.state_manager") as state_manager:
+            state_manager.get_or_create_state.side_effect = lambda cid: PedagogicalState(conversation_id=cid)
+            assert_overlapped(await post_concurrently("/api/chat/pedagogical"))
+
+    async def test_llm_overload_fails_fast_with_retry_after(self):
+        agentic = MagicMock()
+        agentic.query.side_effect = LLMOverloadedError("The tutor is at capacity", status_code=429, retry_after=7)
+
+        transport = httpx.ASGITransport(app=app)
+        with patch("app.api.chat_router.get_agentic_rag_service", return_value=agentic):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post("/api/chat-agentic", json={"message": "What is a heap?"})
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
@@ -0,0 +1,124 @@
+"""
+Unit tests for the BM25 index and hybrid retrieval fusion
+"""
+import math
+from unittest.mock import MagicMock, patch
+
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQueryResult
+
+from app.services.bm25_index import BM25Index, tokenize
+from app.services.hybrid_retriever import HybridRetriever, MultiQueryRetriever, reciprocal_rank_fusion
+from app.services.retrieval_cache import RetrievalCache
+
+CHUNKS = {
+    "c1": "A heap is a complete binary tree. heapify restores the heap property in O(log n).",
+    "c2": "A variable is a named reference to a value stored in memory.",
+    "c3": "Lists are mutable while tuples are immutable sequences.",
+}
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build(list(CHUNKS), list(CHUNKS.values()))
+
+
+@pytest.mark.unit
+class TestBM25Index:
+    """Tests for lexical search"""
+
+    def test_exact_term_ranks_first(self, index):
+        results = index.search("Big-O of heapify", top_k=3)
+
+        assert results[0][0] == "c1"
+        assert all(score > 0 for _, score in results)
+
+    def test_unknown_terms_return_nothing(self, index):
+        assert index.search("quicksort pivot", top_k=3) == []
+
+    def test_save_and_load_roundtrip(self, tmp_path, index):
+        path = tmp_path / "bm25_index.npz"
+        index.save(str(path))
+
+        loaded = BM25Index.load(str(path))
+
+        assert loaded.doc_ids == index.doc_ids
+        assert loaded.search("mutable tuples") == index.search("mutable tuples")
+        assert BM25Index.load(str(tmp_path / "missing.npz")) is None
+
+    def test_zero_average_length_scores_stay_finite(self, index):
+        index.avg_doc_length = 0.0  # As when every chunk tokenizes to nothing
+
+        assert all(math.isfinite(score) for _, score in index.search("heapify heap", top_k=3))
+
+    def test_tokenize_keeps_identifiers(self):
+        assert tokenize("What does __init__ do in a class?") == ["__init__", "class"]
+
+
+@pytest.mark.unit
+class TestHybridRetriever:
+    """Tests for reciprocal-rank fusion of dense and lexical results"""
+
+    def test_rrf_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], rrf_k=60)
+
+        assert max(fused, key=fused.get) == "b"
+
+    def test_lexical_only_hit_is_fetched_and_scored(self, index):
+        vector_store = MagicMock()
+        vector_store.query.return_value = VectorStoreQueryResult(
+            nodes=[TextNode(id_="c2", text=CHUNKS["c2"])], similarities=[0.4], ids=["c2"]
+        )
+        vector_store.client.get.return_value = {
+            "ids": ["c1"], "documents": [CHUNKS["c1"]], "metadatas": [{}], "embeddings": [[1.0, 0.0]],
+        }
+        embed_model = MagicMock()
+        embed_model.get_query_embedding.return_value = [1.0, 0.0]
+
+        retriever = HybridRetriever(vector_store, embed_model, index, top_k=2, candidate_k=5)
+        results = retriever.retrieve("heapify")
+
+        assert {r.node.node_id for r in results} == {"c1", "c2"}
+        lexical = next(r for r in results if r.node.node_id == "c1")
+        assert lexical.node.text == CHUNKS["c1"]
+        assert lexical.score == pytest.approx(math.exp(0.0))
+        vector_store.client.get.assert_called_once()
+
+    def test_shared_index_is_read_on_every_query(self, index):
+        """Test that a retriever without a fixed index sees the index ingestion rebuilt"""
+        vector_store = MagicMock()
+        vector_store.query.return_value = VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        vector_store.client.get.return_value = {
+            "ids": ["c1"], "documents": [CHUNKS["c1"]], "metadatas": [{}], "embeddings": [[1.0, 0.0]],
+        }
+        embed_model = MagicMock()
+        embed_model.get_query_embedding.return_value = [1.0, 0.0]
+        retriever = HybridRetriever(vector_store, embed_model, top_k=2, candidate_k=5)
+
+        with patch("app.services.hybrid_retriever.shared_bm25_index", return_value=None):
+            assert retriever.retrieve("heapify") == []
+        with patch("app.services.hybrid_retriever.shared_bm25_index", return_value=index):
+            assert [r.node.node_id for r in retriever.retrieve("heapify")] == ["c1"]
+
+    def test_multi_query_searches_all_queries_at_once(self, index, tmp_path):
+        vector_store = MagicMock()
+        vector_store.client.query.return_value = {
+            "ids": [["c2", "c3"], ["c3", "c2"]],
+            "documents": [[CHUNKS["c2"], CHUNKS["c3"]], [CHUNKS["c3"], CHUNKS["c2"]]],
+            "metadatas": [[{}, {}], [{}, {}]],
+            "distances": [[0.9, 1.2], [0.5, 1.0]],
+        }
+        embed_model = MagicMock(model_name="test-model", variant=None)
+        embed_model.get_text_embedding_batch.return_value = [[1.0, 0.0], [0.0, 1.0]]
+        cache = RetrievalCache(maxsize=8, ttl_seconds=60)
+
+        retriever = MultiQueryRetriever(vector_store, embed_model, bm25_index=index, top_k=2, candidate_k=5)
+        with patch("app.services.hybrid_retriever.retrieval_cache", cache):
+            results = retriever.retrieve(["tuples vs lists", "immutable sequences"])
+
+        embed_model.get_text_embedding_batch.assert_called_once()
+        vector_store.client.query.assert_called_once()
+        assert vector_store.client.query.call_args.kwargs["query_embeddings"] == [[1.0, 0.0], [0.0, 1.0]]
+        assert [r.node.node_id for r in results] == ["c3", "c2"]  # Dense tie broken by BM25
+        assert results[0].score == pytest.approx(math.exp(-0.5))  # Best similarity over the queries
@@ -0,0 +1,97 @@
+"""
+Unit tests for token-budgeted context packing
+"""
+import pytest
+
+from app.services.context_packer import (DOCUMENT_OVERHEAD_TOKENS, ContextPacker, TokenCounter, context_budget,
+                                         overlap_length)
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def truncate_words(text: str, max_tokens: int) -> str:
+    return " ".join(text.split()[:max_tokens])
+
+
+def make_packer() -> ContextPacker:
+    return ContextPacker(count=count_words, truncate=truncate_words, max_overlap_chars=200)
+
+
+def words(prefix: str, n: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+@pytest.mark.unit
+class TestContextPacker:
+    """Tests for ordering, deduplication and trimming of retrieved chunks"""
+
+    def test_keeps_retriever_order_when_everything_fits(self):
+        packed = make_packer().pack(["reranked first", "dense first"], budget=100)
+
+        assert packed.documents == ["reranked first", "dense first"]
+        assert packed.indices == [0, 1]
+        assert packed.tokens == 4 + 2 * DOCUMENT_OVERHEAD_TOKENS
+        assert packed.trimmed == 0 and packed.dropped == []
+
+    def test_splitter_overlap_is_sent_once(self):
+        shared = "the heap property holds for every parent node"
+        first = f"A binary heap is a complete tree. {shared}"
+        second = f"{shared} and its children after each insertion."
+
+        packed = make_packer().pack([first, second], budget=100)
+
+        assert packed.documents[0] == first
+        assert packed.documents[1].strip() == "and its children after each insertion."
+
+    def test_contained_chunk_is_dropped(self):
+        packed = make_packer().pack(["Heapify: sift down restores order.", "sift down restores order"],
+                                    budget=100)
+
+        assert packed.indices == [0]
+        assert packed.dropped == [1]
+
+    def test_chunk_over_budget_becomes_question_excerpt(self):
+        filler = ". ".join(words("filler", 20) for _ in range(3))
+        chunk = f"{filler}. Quicksort picks a pivot and partitions the array. {filler}."
+
+        packed = make_packer().pack([chunk], budget=60, question="How does quicksort partition?")
+
+        assert packed.trimmed == 1
+        assert "Quicksort picks a pivot and partitions the array." in packed.documents[0]
+        assert packed.tokens <= 60
+
+    def test_budget_spent_drops_remaining_chunks(self):
+        packed = make_packer().pack([words("a", 50), words("b", 50)], budget=70)
+
+        assert packed.indices == [0]
+        assert packed.dropped == [1]
+
+    def test_overlap_length_ignores_short_coincidences(self):
+        assert overlap_length("ends with the", "the start", max_chars=100) == 0
+        assert overlap_length("x " + "shared suffix text here", "shared suffix text here and more",
+                              max_chars=100) == len("shared suffix text here")
+
+
+@pytest.mark.unit
+class TestTokenBudget:
+    """Tests for token counting and the per-prompt document budget"""
+
+    def test_budget_leaves_room_for_template_and_answer(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "llm_context_window", 1000)
+        monkeypatch.setattr(settings, "context_max_tokens", 0)
+
+        assert context_budget("one two three", max_tokens=200, count=count_words) == 797
+
+        monkeypatch.setattr(settings, "context_max_tokens", 300)
+        assert context_budget("one two three", max_tokens=200, count=count_words) == 300
+
+    def test_counter_falls_back_without_encoding(self):
+        counter = TokenCounter(encoding_name="no-such-encoding", margin=1.0)
+        counter.warm_up()  # Logs the failure instead of raising
+
+        assert counter.encoding is None
+        assert counter.count("x" * 40) == 10
+        assert counter.truncate("x" * 40, 5) == "x" * 20
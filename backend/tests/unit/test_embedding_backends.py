@@ -0,0 +1,97 @@
+"""
+Unit tests for embedding backend selection and the ONNX backend
+"""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services import embedding_backends
+from app.services.embedding_backends import (OnnxEmbedding, create_embedding_model, export_onnx_model,
+                                             mean_pool_normalize, resolve_backend)
+
+
+@pytest.fixture(scope="module")
+def tiny_sentence_transformer(tmp_path_factory):
+    """A randomly initialized one-layer BERT saved as a sentence-transformers model (no download)"""
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizer
+
+    root = tmp_path_factory.mktemp("tiny_model")
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "heap", "sort", "tree", "stack", "queue"]
+    (root / "vocab.txt").write_text("\n".join(vocab))
+    BertTokenizer(str(root / "vocab.txt")).save_pretrained(str(root))
+    BertModel(BertConfig(vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+                         intermediate_size=32, max_position_embeddings=64)).save_pretrained(str(root))
+
+    st_model = SentenceTransformer(modules=[models.Transformer(str(root), max_seq_length=32),
+                                            models.Pooling(16, pooling_mode="mean")], device="cpu")
+    st_model.save(str(root / "st"))
+    return str(root / "st"), st_model
+
+
+@pytest.mark.unit
+class TestBackendSelection:
+    """Tests for picking a backend on GPU and CPU-only machines"""
+
+    def test_auto_uses_torch_on_cuda(self):
+        with patch.object(embedding_backends, "cuda_available", return_value=True):
+            assert resolve_backend("auto") == "torch"
+
+    def test_auto_uses_onnx_without_cuda(self):
+        with patch.object(embedding_backends, "cuda_available", return_value=False):
+            assert resolve_backend("auto") == "onnx"
+            assert embedding_backends.resolve_device("cuda") == "cpu"
+
+    def test_unknown_backend_is_rejected(self):
+        with pytest.raises(ValueError):
+            resolve_backend("tensorrt")
+
+
+@pytest.mark.unit
+class TestMeanPooling:
+    """Tests for sentence-transformers compatible pooling"""
+
+    def test_padding_is_ignored_and_output_normalized(self):
+        tokens = np.array([[[3.0, 0.0], [1.0, 0.0], [100.0, 100.0]]])
+        mask = np.array([[1, 1, 0]])
+
+        pooled = mean_pool_normalize(tokens, mask)
+
+        np.testing.assert_allclose(pooled, [[1.0, 0.0]])
+
+
+@pytest.mark.unit
+class TestOnnxBackend:
+    """Tests for the ONNX export and onnxruntime embeddings"""
+
+    def test_export_writes_fp32_and_int8_models_once(self, tiny_sentence_transformer, tmp_path):
+        model_name, _ = tiny_sentence_transformer
+
+        int8_path = export_onnx_model(model_name, tmp_path, quantize=True)
+        mtime = int8_path.stat().st_mtime_ns
+
+        assert int8_path.name == "model.int8.onnx"
+        assert (tmp_path / "model.onnx").exists() and (tmp_path / "export_config.json").exists()
+        assert export_onnx_model(model_name, tmp_path, quantize=True).stat().st_mtime_ns == mtime
+
+    def test_onnx_embeddings_match_sentence_transformers(self, tiny_sentence_transformer, tmp_path):
+        model_name, st_model = tiny_sentence_transformer
+        texts = ["heap sort", "stack queue tree tree"]
+
+        embed_model = OnnxEmbedding(model_name=model_name, export_dir=str(tmp_path), quantize=False)
+
+        assert embed_model.variant == "onnx-fp32"
+        np.testing.assert_allclose(embed_model.get_text_embedding_batch(texts),
+                                   st_model.encode(texts, normalize_embeddings=True), atol=1e-5)
+
+    def test_auto_falls_back_to_torch_when_onnx_fails(self):
+        with patch.object(embedding_backends, "cuda_available", return_value=False), \
+                patch.object(embedding_backends, "OnnxEmbedding", side_effect=ModuleNotFoundError("onnx")), \
+                patch("llama_index.embeddings.huggingface.HuggingFaceEmbedding") as torch_model:
+            assert create_embedding_model(backend="auto") is torch_model.return_value
+            torch_model.assert_called_once()
+            assert torch_model.call_args.kwargs["device"] == "cpu"
+
+            with pytest.raises(ModuleNotFoundError):
+                create_embedding_model(backend="onnx")
@@ -0,0 +1,38 @@
+"""
+Unit tests for the persistent embedding cache
+"""
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+@pytest.mark.unit
+class TestEmbeddingCache:
+    """Tests for cache lookups and persistence"""
+
+    def test_roundtrip_and_hit_rate(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), "all-MiniLM-L6-v2").load()
+        assert cache.get_many(["alpha", "beta"]) == [None, None]
+
+        cache.put_many(["alpha", "beta"], [[0.5, 0.25], [1.0, -1.0]])
+        reloaded = EmbeddingCache(str(tmp_path), "all-MiniLM-L6-v2").load()
+
+        # Whitespace differences still hit
+        assert reloaded.get_many(["beta", "alpha\n", "gamma"]) == [[1.0, -1.0], [0.5, 0.25], None]
+        assert (reloaded.hits, reloaded.misses) == (2, 1)
+
+    def test_keys_are_per_model(self, tmp_path):
+        EmbeddingCache(str(tmp_path), "model-a").put_many(["alpha"], [[1.0, 0.0]])
+
+        assert EmbeddingCache(str(tmp_path), "model-b").load().get_many(["alpha"]) == [None]
+
+    def test_torn_tail_is_dropped(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path), "m")
+        cache.put_many(["alpha", "beta"], [[1.0, 0.0], [0.0, 1.0]])
+        with open(cache.vectors_path, "ab") as f:
+            f.write(b"\x00\x01")  # Half a row from an interrupted write
+
+        reloaded = EmbeddingCache(str(tmp_path), "m").load()
+        assert reloaded.size == 2
+        reloaded.put_many(["gamma"], [[0.5, 0.5]])
+        assert reloaded.get_many(["gamma"]) == [[0.5, 0.5]]
@@ -0,0 +1,331 @@
+"""
+Unit tests for the pipelined ingestion stages in ingest.py
+
+Runs the parse → embed → write stages with fake models so no PDFs,
+GPU or ChromaDB are required.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+
+import ingest
+from app.services.ingestion_manifest import IngestionCheckpoint, IngestionManifest, chunk_id, file_sha256
+
+
+def make_nodes(n: int, embedding=None):
+    return [TextNode(text=f"chunk {i}", embedding=embedding) for i in range(n)]
+
+
+def make_vector_store():
+    vector_store = MagicMock()
+    vector_store.flat_metadata = True
+    return vector_store
+
+
+def make_tracker(completed):
+    tracker = MagicMock()
+    tracker.pdf_completed.side_effect = lambda batch, ids, ok: completed.append((batch.pdf_path.name, len(ids), ok))
+    return tracker
+
+
+class InProcessPool(ThreadPoolExecutor):
+    """ProcessPoolExecutor stand-in with the same initializer protocol, so fakes in this process apply"""
+
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers, initializer=initializer, initargs=initargs)
+
+
+def drain(out_q):
+    batches = []
+    while True:
+        batch = out_q.get(timeout=60)
+        if batch is ingest._SENTINEL:
+            return batches
+        batches.append(batch)
+
+
+@pytest.mark.unit
+class TestBatchNodes:
+    """Tests for splitting a PDF's chunks into pipeline batches"""
+
+    def test_batches_are_bounded_and_last_is_flagged(self):
+        batches = list(ingest.batch_nodes(Path("a.pdf"), make_nodes(5), batch_size=2))
+
+        assert [len(b.nodes) for b in batches] == [2, 2, 1]
+        assert [b.is_last for b in batches] == [False, False, True]
+
+    def test_resume_passes_committed_batches_through_without_nodes(self):
+        nodes = make_nodes(5)
+        batches = list(ingest.batch_nodes(Path("a.pdf"), nodes, batch_size=2, resume_after=1))
+
+        assert [len(b.nodes) for b in batches] == [0, 0, 1]
+        assert batches[0].committed_ids + batches[1].committed_ids == [n.node_id for n in nodes[:4]]
+        assert [b.batch_index for b in batches] == [0, 1, 2]
+
+    def test_empty_pdf_yields_single_failed_batch(self):
+        batches = list(ingest.batch_nodes(Path("empty.pdf"), [], batch_size=2))
+
+        assert len(batches) == 1
+        assert batches[0].is_last and batches[0].failed
+
+
+@pytest.mark.unit
+class TestPipelineStages:
+    """Tests for the embed and write stages"""
+
+    def test_embed_stage_embeds_whole_batch_in_one_call(self):
+        embed_model = MagicMock()
+        embed_model.get_text_embedding_batch.side_effect = lambda texts: [[0.1, 0.2]] * len(texts)
+        in_q, out_q = queue.Queue(), queue.Queue()
+        stats = ingest.StageStats("embed")
+
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(3), is_last=True))
+        in_q.put(ingest._SENTINEL)
+        ingest.embed_stage(in_q, out_q, embed_model, stats, threading.Event())
+
+        batch = out_q.get()
+        assert embed_model.get_text_embedding_batch.call_count == 1
+        assert all(node.embedding == [0.1, 0.2] for node in batch.nodes)
+        assert out_q.get() is ingest._SENTINEL
+        assert stats.chunks == 3
+
+    def test_embed_texts_only_runs_model_on_cache_misses(self):
+        embed_model = MagicMock()
+        embed_model.get_text_embedding_batch.side_effect = lambda texts: [[float(len(t))] for t in texts]
+        cache = MagicMock()
+        cache.get_many.return_value = [[9.0], None]
+
+        embeddings = ingest.embed_texts(["cached", "new"], embed_model, cache)
+
+        assert embeddings == [[9.0], [3.0]]
+        embed_model.get_text_embedding_batch.assert_called_once_with(["new"])
+        cache.put_many.assert_called_once_with(["new"], [[3.0]])
+
+    def test_write_stage_counts_pdfs_and_skips_failed_batches(self):
+        vector_store = make_vector_store()
+        completed = []
+        in_q = queue.Queue()
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(2, [0.1])))
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(1, [0.1]), is_last=True))
+        in_q.put(ingest.NodeBatch(Path("b.pdf"), [], is_last=True, failed=True))
+        in_q.put(ingest._SENTINEL)
+
+        tracker = make_tracker(completed)
+        total_chunks, successful_pdfs = ingest.write_stage(
+            in_q, vector_store, ingest.StageStats("write"), tracker=tracker
+        )
+
+        assert total_chunks == 3
+        assert successful_pdfs == 1
+        assert vector_store.client.upsert.call_count == 2
+        assert tracker.batch_committed.call_count == 2
+        assert completed == [("a.pdf", 3, True), ("b.pdf", 0, False)]
+
+    def test_write_stage_counts_committed_batches_from_earlier_run(self):
+        vector_store = make_vector_store()
+        completed = []
+        in_q = queue.Queue()
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), [], batch_index=0, committed_ids=["c0", "c1"]))
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(1, [0.1]), batch_index=1, is_last=True))
+        in_q.put(ingest._SENTINEL)
+
+        total_chunks, _ = ingest.write_stage(
+            in_q, vector_store, ingest.StageStats("write"), tracker=make_tracker(completed)
+        )
+
+        assert total_chunks == 3
+        assert vector_store.client.upsert.call_count == 1
+        assert completed == [("a.pdf", 3, True)]
+
+    def test_write_stage_handles_interleaved_pdfs(self):
+        # Parse workers stream batches of several PDFs at once
+        completed = []
+        in_q = queue.Queue()
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(2, [0.1])))
+        in_q.put(ingest.NodeBatch(Path("b.pdf"), make_nodes(1, [0.1]), is_last=True))
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(1, [0.1]), is_last=True))
+        in_q.put(ingest._SENTINEL)
+
+        ingest.write_stage(in_q, make_vector_store(), ingest.StageStats("write"), tracker=make_tracker(completed))
+
+        assert completed == [("b.pdf", 1, True), ("a.pdf", 3, True)]
+
+    def test_write_stage_reports_partially_failed_pdf(self):
+        vector_store = make_vector_store()
+        completed = []
+        in_q = queue.Queue()
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(2, [0.1])))
+        in_q.put(ingest.NodeBatch(Path("a.pdf"), make_nodes(2, [0.1]), is_last=True, failed=True))
+        in_q.put(ingest._SENTINEL)
+
+        total_chunks, successful_pdfs = ingest.write_stage(
+            in_q, vector_store, ingest.StageStats("write"), tracker=make_tracker(completed)
+        )
+
+        # The written chunks are handed back so the tracker can roll them back
+        assert (total_chunks, successful_pdfs) == (0, 0)
+        assert completed == [("a.pdf", 2, False)]
+
+
+@pytest.mark.unit
+class TestParallelParseStage:
+    """Tests for the process-pool parse stage"""
+
+    @pytest.fixture(autouse=True)
+    def worker_state(self, monkeypatch):
+        # _init_parse_worker sets module globals; restore them after in-process runs
+        monkeypatch.setattr(ingest, "_worker_batch_queue", None)
+        monkeypatch.setattr(ingest, "_worker_node_parser", None)
+
+    def test_worker_parses_and_streams_batches(self, monkeypatch):
+        monkeypatch.setattr(ingest, "parse_pdf", lambda path, parser, sha256: make_nodes(3))
+        batch_queue = queue.Queue()
+
+        ingest._init_parse_worker(batch_queue, 128, 16)
+        num_chunks = ingest._parse_pdf_worker(ingest.PdfJob(Path("a.pdf"), sha256="abc"), batch_size=2)
+
+        assert num_chunks == 3
+        assert ingest._worker_node_parser.chunk_size == 128
+        batches = [batch_queue.get_nowait() for _ in range(2)]
+        assert [len(b.nodes) for b in batches] == [2, 1]
+        assert batch_queue.empty()
+
+    def test_stage_forwards_worker_batches(self, monkeypatch):
+        monkeypatch.setattr(ingest, "ProcessPoolExecutor", InProcessPool)
+        monkeypatch.setattr(ingest, "parse_pdf", lambda path, parser, sha256: make_nodes(5))
+        out_q, stats = queue.Queue(), ingest.StageStats("parse")
+
+        ingest.parallel_parse_stage([ingest.PdfJob(Path("a.pdf"), sha256="abc")], 1, 2,
+                                    out_q, stats, threading.Event())
+
+        batches = drain(out_q)
+        assert [len(b.nodes) for b in batches] == [2, 2, 1]
+        assert batches[-1].is_last and not batches[-1].failed
+        assert stats.chunks == 5
+
+    def test_crashed_worker_reports_failed_pdf(self, monkeypatch):
+        def crash(job, node_parser, batch_size):
+            raise RuntimeError("worker died")
+
+        monkeypatch.setattr(ingest, "ProcessPoolExecutor", InProcessPool)
+        monkeypatch.setattr(ingest, "parse_job", crash)
+        out_q = queue.Queue()
+
+        ingest.parallel_parse_stage([ingest.PdfJob(Path("a.pdf"), sha256="abc")], 1, 2,
+                                    out_q, ingest.StageStats("parse"), threading.Event())
+
+        batches = drain(out_q)
+        assert len(batches) == 1
+        assert batches[0].pdf_path == Path("a.pdf")
+        assert batches[0].is_last and batches[0].failed
+
+    def test_spawned_worker_reports_unreadable_pdf(self, tmp_path):
+        """Real worker process (spawn start method): an unreadable PDF becomes a failed batch"""
+        missing = tmp_path / "missing.pdf"
+        out_q = queue.Queue()
+
+        ingest.parallel_parse_stage([ingest.PdfJob(missing, sha256="abc")], 1, 2,
+                                    out_q, ingest.StageStats("parse"), threading.Event())
+
+        batches = drain(out_q)
+        assert len(batches) == 1
+        assert batches[0].pdf_path == missing and batches[0].failed
+
+
+@pytest.mark.unit
+class TestResume:
+    """Tests for picking up (or cleaning up after) an interrupted run"""
+
+    def test_chunks_of_changed_or_removed_pdfs_are_deleted(self, tmp_path, monkeypatch):
+        deleted = []
+        monkeypatch.setattr(ingest, "delete_chunks", deleted.extend)
+        kept, changed, removed = (tmp_path / name for name in ("kept.pdf", "changed.pdf", "removed.pdf"))
+        manifest = IngestionManifest(str(tmp_path / "manifest.json"), 512, 50, "model")
+        journal = IngestionCheckpoint(str(tmp_path / "checkpoint.jsonl"), 512, 50, batch_size=2)
+        journal.open(resume=False)
+        old_shas = {}
+        for pdf in (kept, changed, removed):
+            pdf.write_bytes(pdf.name.encode())
+            old_shas[pdf.name] = file_sha256(pdf)
+            journal.batch_committed(manifest.key_for(pdf), old_shas[pdf.name], 0)
+        journal.close()
+        changed.write_bytes(b"new content")
+        removed.unlink()
+
+        checkpoint = IngestionCheckpoint(str(tmp_path / "checkpoint.jsonl"), 512, 50, batch_size=2).load()
+        jobs = ingest.build_jobs([kept, changed], {}, manifest, checkpoint)
+        checkpoint.open(resume=True)
+        assert ingest.remove_orphaned_progress(jobs, manifest, checkpoint)
+        checkpoint.close()
+
+        assert [job.resume_after for job in jobs] == [0, -1]
+        assert sorted(deleted) == sorted(chunk_id(old_shas[name], 512, 50, i)
+                                         for name in ("changed.pdf", "removed.pdf") for i in range(2))
+        resumed = IngestionCheckpoint(str(tmp_path / "checkpoint.jsonl"), 512, 50, batch_size=2).load()
+        assert list(resumed.last_batch) == [(manifest.key_for(kept), old_shas["kept.pdf"])]
+
+    def test_plain_rerun_after_crash_and_edit_deletes_orphans(self, tmp_path, monkeypatch):
+        deleted = []
+        monkeypatch.setattr(ingest, "delete_chunks", deleted.extend)
+        pdf = tmp_path / "notes.pdf"
+        pdf.write_bytes(b"first draft")
+        old_sha = file_sha256(pdf)
+        manifest = IngestionManifest(str(tmp_path / "manifest.json"), 512, 50, "model")
+        journal_path = str(tmp_path / "checkpoint.jsonl")
+
+        # Crash after one committed batch: the PDF never reaches the manifest
+        crashed = IngestionCheckpoint(journal_path, 512, 50, batch_size=2)
+        crashed.open(resume=False)
+        crashed.batch_committed(manifest.key_for(pdf), old_sha, 0)
+        crashed.close()
+        pdf.write_bytes(b"second draft")
+
+        checkpoint = IngestionCheckpoint(journal_path, 512, 50, batch_size=2)
+        jobs, orphaned = ingest.start_checkpoint(checkpoint, [pdf], {}, manifest, resume=False)
+        checkpoint.close()
+
+        assert orphaned
+        assert sorted(deleted) == sorted(chunk_id(old_sha, 512, 50, i) for i in range(2))
+        assert [job.resume_after for job in jobs] == [-1]
+        assert IngestionCheckpoint(journal_path, 512, 50, batch_size=2).load().last_batch == {}
+
+    def test_plain_rerun_does_not_resume_unchanged_pdf(self, tmp_path, monkeypatch):
+        deleted = []
+        monkeypatch.setattr(ingest, "delete_chunks", deleted.extend)
+        pdf = tmp_path / "notes.pdf"
+        pdf.write_bytes(b"first draft")
+        manifest = IngestionManifest(str(tmp_path / "manifest.json"), 512, 50, "model")
+        journal_path = str(tmp_path / "checkpoint.jsonl")
+        crashed = IngestionCheckpoint(journal_path, 512, 50, batch_size=2)
+        crashed.open(resume=False)
+        crashed.batch_committed(manifest.key_for(pdf), file_sha256(pdf), 0)
+        crashed.close()
+
+        checkpoint = IngestionCheckpoint(journal_path, 512, 50, batch_size=2)
+        jobs, orphaned = ingest.start_checkpoint(checkpoint, [pdf], {}, manifest, resume=False)
+        checkpoint.close()
+
+        # Same content: the rerun rewrites the same chunk ids from the first batch
+        assert not orphaned and not deleted
+        assert [job.resume_after for job in jobs] == [-1]
+
+
+@pytest.mark.unit
+class TestChunkIds:
+    """Tests for deterministic chunk ids"""
+
+    def test_ids_are_stable_and_links_follow(self):
+        first, second = make_nodes(2)
+        first.relationships[NodeRelationship.NEXT] = RelatedNodeInfo(node_id=second.node_id)
+        second.relationships[NodeRelationship.PREVIOUS] = RelatedNodeInfo(node_id=first.node_id)
+
+        ingest.assign_chunk_ids([first, second], "abc", 512, 50)
+
+        assert first.node_id == chunk_id("abc", 512, 50, 0)
+        assert first.relationships[NodeRelationship.NEXT].node_id == second.node_id
+        assert second.relationships[NodeRelationship.PREVIOUS].node_id == first.node_id
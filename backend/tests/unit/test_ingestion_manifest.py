@@ -0,0 +1,160 @@
+"""
+Unit tests for the incremental ingestion manifest
+"""
+import os
+
+import pytest
+
+from app.services.ingestion_manifest import IngestionCheckpoint, IngestionManifest, chunk_id, file_sha256
+
+
+def make_manifest(tmp_path, chunk_size=512, chunk_overlap=50, model="all-MiniLM-L6-v2"):
+    return IngestionManifest(str(tmp_path / "manifest.json"), chunk_size, chunk_overlap, model).load()
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Directory with two small 'PDFs'"""
+    root = tmp_path / "course_materials"
+    root.mkdir()
+    (root / "a.pdf").write_bytes(b"alpha")
+    (root / "b.pdf").write_bytes(b"beta")
+    return root
+
+
+@pytest.mark.unit
+class TestIngestionManifest:
+    """Tests for manifest diffing and persistence"""
+
+    def test_first_run_everything_is_new(self, tmp_path, corpus):
+        manifest = make_manifest(tmp_path)
+        diff = manifest.diff(sorted(corpus.glob("*.pdf")), root=corpus)
+
+        assert [p.name for p in diff.new] == ["a.pdf", "b.pdf"]
+        assert diff.changed == [] and diff.removed == []
+
+    def test_rerun_after_record_is_unchanged(self, tmp_path, corpus):
+        manifest = make_manifest(tmp_path)
+        for pdf in corpus.glob("*.pdf"):
+            manifest.record(pdf, ["id-1", "id-2"])
+        manifest.save()
+
+        diff = make_manifest(tmp_path).diff(sorted(corpus.glob("*.pdf")), root=corpus)
+
+        assert diff.to_ingest == []
+        assert len(diff.unchanged) == 2
+
+    def test_changed_and_removed_files(self, tmp_path, corpus):
+        manifest = make_manifest(tmp_path)
+        for pdf in corpus.glob("*.pdf"):
+            manifest.record(pdf, [f"{pdf.stem}-0"])
+        manifest.save()
+
+        (corpus / "a.pdf").write_bytes(b"alpha, second edition")
+        (corpus / "b.pdf").unlink()
+        (corpus / "c.pdf").write_bytes(b"gamma")
+
+        reloaded = make_manifest(tmp_path)
+        diff = reloaded.diff(sorted(corpus.glob("*.pdf")), root=corpus)
+
+        assert [p.name for p in diff.new] == ["c.pdf"]
+        assert [p.name for p in diff.changed] == ["a.pdf"]
+        assert sorted(e.chunk_ids[0] for e in diff.removed) == ["a-0", "b-0"]
+        assert diff.digests[reloaded.key_for(corpus / "a.pdf")] == file_sha256(corpus / "a.pdf")
+
+    def test_touched_file_with_same_content_is_unchanged(self, tmp_path, corpus):
+        manifest = make_manifest(tmp_path)
+        pdf = corpus / "a.pdf"
+        manifest.record(pdf, ["a-0"])
+        os.utime(pdf, (1_000_000, 1_000_000))
+
+        diff = manifest.diff([pdf], root=corpus)
+
+        assert diff.unchanged == [pdf]
+        assert diff.dirty
+
+    def test_refreshed_mtime_is_persisted(self, tmp_path, corpus):
+        pdf = corpus / "a.pdf"
+        manifest = make_manifest(tmp_path)
+        manifest.record(pdf, ["a-0"])
+        manifest.save()
+        os.utime(pdf, (1_000_000, 1_000_000))
+        manifest = make_manifest(tmp_path)
+        assert manifest.diff([pdf], root=corpus).dirty
+        manifest.save()
+
+        diff = make_manifest(tmp_path).diff([pdf], root=corpus)
+
+        assert diff.unchanged == [pdf]
+        assert not diff.dirty  # Size and mtime match again, so the PDF is not re-hashed
+
+    def test_chunking_params_change_invalidates_entries(self, tmp_path, corpus):
+        manifest = make_manifest(tmp_path)
+        manifest.record(corpus / "a.pdf", ["a-0"])
+        manifest.save()
+
+        diff = make_manifest(tmp_path, chunk_size=256).diff([corpus / "a.pdf"], root=corpus)
+
+        assert diff.changed == [corpus / "a.pdf"]
+        assert diff.removed[0].chunk_ids == ["a-0"]
+
+    def test_files_outside_root_are_never_removed(self, tmp_path, corpus):
+        other = tmp_path / "extra"
+        other.mkdir()
+        (other / "x.pdf").write_bytes(b"x")
+        manifest = make_manifest(tmp_path)
+        manifest.record(corpus / "a.pdf", ["a-0"])
+
+        diff = manifest.diff([other / "x.pdf"], root=other)
+
+        assert diff.removed == []
+
+
+@pytest.mark.unit
+class TestIngestionCheckpoint:
+    """Tests for the resume journal"""
+
+    def make_checkpoint(self, tmp_path, batch_size=64):
+        return IngestionCheckpoint(str(tmp_path / "checkpoint.jsonl"), 512, 50, batch_size)
+
+    def test_resume_from_last_committed_batch(self, tmp_path):
+        checkpoint = self.make_checkpoint(tmp_path)
+        checkpoint.open(resume=False)
+        checkpoint.batch_committed("/a.pdf", "sha-a", 0)
+        checkpoint.batch_committed("/a.pdf", "sha-a", 1)
+        checkpoint.batch_committed("/b.pdf", "sha-b", 0)
+        checkpoint.pdf_completed("/b.pdf", "sha-b")
+        checkpoint.close()
+
+        resumed = self.make_checkpoint(tmp_path).load()
+        assert resumed.resume_after("/a.pdf", "sha-a") == 1
+        assert resumed.resume_after("/a.pdf", "other-content") == -1
+        assert not resumed.has_progress("/b.pdf")
+
+    def test_torn_line_and_reset_are_handled(self, tmp_path):
+        checkpoint = self.make_checkpoint(tmp_path)
+        checkpoint.open(resume=False)
+        checkpoint.batch_committed("/a.pdf", "sha-a", 0)
+        checkpoint.pdf_reset("/a.pdf")
+        checkpoint.batch_committed("/c.pdf", "sha-c", 3)
+        checkpoint.close()
+        with open(tmp_path / "checkpoint.jsonl", "a") as f:
+            f.write('{"event": "batch", "pa')
+
+        resumed = self.make_checkpoint(tmp_path).load()
+        assert resumed.resume_after("/a.pdf", "sha-a") == -1
+        assert resumed.resume_after("/c.pdf", "sha-c") == 3
+
+    def test_different_batch_size_ignores_journal(self, tmp_path):
+        checkpoint = self.make_checkpoint(tmp_path, batch_size=64)
+        checkpoint.open(resume=False)
+        checkpoint.batch_committed("/a.pdf", "sha-a", 2)
+        checkpoint.close()
+
+        resumed = self.make_checkpoint(tmp_path, batch_size=32).load()
+        assert resumed.resume_after("/a.pdf", "sha-a") == -1
+
+    def test_chunk_ids_are_deterministic(self):
+        assert chunk_id("sha", 512, 50, 0) == chunk_id("sha", 512, 50, 0)
+        assert chunk_id("sha", 512, 50, 0) != chunk_id("sha", 512, 50, 1)
+        assert chunk_id("sha", 512, 50, 0) != chunk_id("sha", 256, 50, 0)
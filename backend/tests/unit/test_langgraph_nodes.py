@@ -3,10 +3,13 @@ Unit tests for LangGraph nodes in Agentic RAG workflow
 
 Tests each node (retrieve, grade_documents, rewrite_query, generate) in isolation.
 """
+import time
+
 import pytest
 from unittest.mock import Mock, patch, MagicMock
-from app.services.agentic_rag import AgenticRAGService
-from app.services.agent_state import AgentState
+from app.services.agentic_rag import NO_ANSWER_MESSAGE, AgenticRAGService, parse_reformulations
+from app.services.agent_state import AgentState, Degradation, Relevance
+from app.services.llm_scheduler import LLMScheduler
 
 
 @pytest.mark.unit
@@ -43,6 +46,22 @@ class TestRetrieveNode:
         # Assert
         mock_query_engine.query.assert_called_once_with("How do variables work in Python?")
 
+    def test_retrieve_uses_retriever_without_synthesis(self, mock_query_engine, initial_agent_state):
+        """Test retrieval goes through the retriever (no LLM call) when one is configured"""
+        # Setup
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.query_engine = mock_query_engine
+        service.retriever = MagicMock()
+        service.retriever.retrieve.return_value = mock_query_engine.query.return_value.source_nodes
+
+        # Execute
+        result = service._retrieve(initial_agent_state)
+
+        # Assert
+        assert result["document_scores"] == [0.85, 0.78]
+        service.retriever.retrieve.assert_called_once_with("What is a Python variable?")
+        mock_query_engine.query.assert_not_called()
+
     def test_retrieve_handles_empty_results(self, initial_agent_state):
         """Test retrieve node handles empty results gracefully"""
         # Setup
@@ -85,7 +104,9 @@ class TestGradeDocumentsNode:
         # Setup
         service = AgenticRAGService.__new__(AgenticRAGService)
         service.llm = mock_llm
-        mock_llm.complete.return_value = Mock(text="yes")
+        mock_llm.classify.return_value = Relevance.YES
+
+        agent_state_with_documents["document_scores"] = [0.45, 0.40]  # Uncertain band: the LLM grades
 
         # Execute
         result = service._grade_documents(agent_state_with_documents)
@@ -93,14 +114,16 @@ class TestGradeDocumentsNode:
         # Assert
         assert result["relevance_decision"] == "yes"
         assert "grade" in result["workflow_path"]
-        mock_llm.complete.assert_called_once()
+        assert mock_llm.classify.call_count == 2  # One call per document
 
     def test_grade_irrelevant_documents(self, agent_state_with_documents, mock_llm):
         """Test grading irrelevant documents"""
         # Setup
         service = AgenticRAGService.__new__(AgenticRAGService)
         service.llm = mock_llm
-        mock_llm.complete.return_value = Mock(text="no, these documents are not relevant")
+        mock_llm.classify.return_value = Relevance.NO
+
+        agent_state_with_documents["document_scores"] = [0.45, 0.40]  # Uncertain band: the LLM grades
 
         # Execute
         result = service._grade_documents(agent_state_with_documents)
@@ -120,14 +143,16 @@ class TestGradeDocumentsNode:
 
         # Assert
         assert result["relevance_decision"] == "no"
-        mock_llm.complete.assert_not_called()
+        mock_llm.classify.assert_not_called()
 
     def test_grade_handles_llm_failure(self, agent_state_with_documents, mock_llm):
         """Test grading handles LLM failures gracefully"""
         # Setup
         service = AgenticRAGService.__new__(AgenticRAGService)
         service.llm = mock_llm
-        mock_llm.complete.side_effect = Exception("LLM unavailable")
+        mock_llm.classify.side_effect = Exception("LLM unavailable")
+
+        agent_state_with_documents["document_scores"] = [0.45, 0.40]  # Uncertain band: the LLM grades
 
         # Execute
         result = service._grade_documents(agent_state_with_documents)
@@ -135,6 +160,104 @@ class TestGradeDocumentsNode:
         # Assert - should fail safe to 'yes'
         assert result["relevance_decision"] == "yes"
 
+    def test_grade_high_scores_skip_llm(self, agent_state_with_documents, mock_llm):
+        """Test that clearly relevant retrieval is accepted without an LLM call"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+
+        result = service._grade_documents(agent_state_with_documents)  # Top score 0.85
+
+        assert result["relevance_decision"] == "yes"
+        mock_llm.classify.assert_not_called()
+
+    def test_grade_low_scores_skip_llm(self, agent_state_irrelevant_docs, mock_llm):
+        """Test that clearly irrelevant retrieval is rejected without an LLM call"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+
+        result = service._grade_documents(agent_state_irrelevant_docs)  # Top score 0.12
+
+        assert result["relevance_decision"] == "no"
+        mock_llm.classify.assert_not_called()
+
+    def test_grade_unscored_documents_use_llm(self, agent_state_with_documents, mock_llm):
+        """Test that documents without retrieval scores still go to the LLM"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.classify.return_value = Relevance.YES
+        agent_state_with_documents["document_scores"] = [0.0, 0.0]
+
+        result = service._grade_documents(agent_state_with_documents)
+
+        assert result["relevance_decision"] == "yes"
+        assert mock_llm.classify.call_count == 2
+
+    def test_grade_drops_irrelevant_documents(self, agent_state_with_documents, mock_llm):
+        """Test that per-document grading keeps only the chunks graded relevant"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.classify.side_effect = lambda prompt, *args, **kwargs: (
+            Relevance.NO if "explicit declaration" in prompt else Relevance.YES)
+        agent_state_with_documents["document_scores"] = [0.45, 0.40]
+        agent_state_with_documents["document_metadata"] = [{"page": 1}, {"page": 2}]
+
+        result = service._grade_documents(agent_state_with_documents)
+
+        assert result["relevance_decision"] == "yes"
+        assert len(result["documents"]) == 1
+        assert result["documents"][0].startswith("Python variables store data values")
+        assert result["document_scores"] == [0.45]
+        assert result["document_metadata"] == [{"page": 1}]
+
+    def test_grade_stops_after_enough_relevant(self, agent_state_with_documents, mock_llm):
+        """Test that grading stops once grading_min_relevant chunks are confirmed"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.classify.return_value = Relevance.YES
+        agent_state_with_documents["document_scores"] = [0.45, 0.40]
+
+        with patch("app.services.agentic_rag.settings.grading_min_relevant", 1), \
+                patch("app.services.agentic_rag._grading_executor.submit") as submit:
+            # First future done and relevant; the second never starts
+            done, never = MagicMock(), MagicMock()
+            done.result.return_value = True
+            submit.side_effect = [done, never]
+            with patch("app.services.agentic_rag.wait", return_value=({done}, {never})):
+                verdicts = service._grade_each_document("What is a Python variable?",
+                                                        agent_state_with_documents["documents"])
+
+        assert verdicts == [True, None]
+        never.cancel.assert_called_once()
+
+    def test_grade_keeps_ungraded_documents_after_early_stop(self, agent_state_with_documents, mock_llm):
+        """Test that a top-ranked chunk still pending at the early exit is not dropped"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        agent_state_with_documents["documents"].append("Python has no constants.")
+        agent_state_with_documents["document_scores"] = [0.45, 0.40, 0.35]
+
+        with patch("app.services.agentic_rag.settings.grading_min_relevant", 1), \
+                patch.object(service, "_grade_each_document", return_value=[None, True, False]):
+            result = service._grade_documents(agent_state_with_documents)
+
+        assert result["relevance_decision"] == "yes"
+        assert result["documents"][0].startswith("Python variables store data values")
+        assert result["document_scores"] == [0.45, 0.40]
+
+    def test_grade_single_prompt_when_per_document_disabled(self, agent_state_with_documents, mock_llm):
+        """Test the combined prompt path (one call for all documents)"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.classify.return_value = Relevance.NO
+        agent_state_with_documents["document_scores"] = [0.45, 0.40]
+
+        with patch("app.services.agentic_rag.settings.grading_per_document", False):
+            result = service._grade_documents(agent_state_with_documents)
+
+        assert result["relevance_decision"] == "no"
+        assert len(result["documents"]) == 2
+        mock_llm.classify.assert_called_once()
+
 
 @pytest.mark.unit
 class TestRewriteQueryNode:
@@ -188,6 +311,64 @@ class TestRewriteQueryNode:
                result["rewritten_question"] == result["question"]
 
 
+@pytest.mark.unit
+class TestFanOutNode:
+    """Tests for the fan-out node (agentic_rewrite_mode="fanout")"""
+
+    def test_fan_out_retrieves_all_reformulations_together(self, agent_state_irrelevant_docs, mock_llm,
+                                                           mock_query_engine):
+        """Test that one LLM call yields the queries and one retrieval covers them all"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.complete.return_value = Mock(text="1. Python variable assignment\n2. How are names bound to values?")
+        service.fanout_retriever = MagicMock()
+        service.fanout_retriever.retrieve.return_value = mock_query_engine.query.return_value.source_nodes
+
+        result = service._fan_out(agent_state_irrelevant_docs)
+
+        mock_llm.complete.assert_called_once()
+        service.fanout_retriever.retrieve.assert_called_once_with([
+            "What is a Python variable?", "Python variable assignment", "How are names bound to values?"
+        ])
+        assert result["fanout_queries"] == ["Python variable assignment", "How are names bound to values?"]
+        assert result["document_scores"] == [0.85, 0.78]
+        assert result["retry_count"] == 1
+        assert "fan_out" in result["workflow_path"]
+
+    def test_fan_out_keeps_documents_when_retrieval_fails(self, agent_state_irrelevant_docs, mock_llm):
+        """Test that a failed fan-out retrieval keeps the first retrieval's documents"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        service.fanout_retriever = MagicMock()
+        service.fanout_retriever.retrieve.side_effect = Exception("ChromaDB unavailable")
+        documents = list(agent_state_irrelevant_docs["documents"])
+
+        result = service._fan_out(agent_state_irrelevant_docs)
+
+        assert result["documents"] == documents
+
+    def test_fan_out_graph_runs_one_round(self, initial_agent_state, mock_llm, mock_query_engine):
+        """Test the fan-out graph: a rejected retrieval is followed by one fused retrieval, then generate"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        service.retriever = MagicMock()
+        service.retriever.retrieve.return_value = []  # Nothing found: graded "no"
+        service.fanout_retriever = MagicMock()
+        service.fanout_retriever.retrieve.return_value = mock_query_engine.query.return_value.source_nodes
+
+        with patch("app.services.agentic_rag.settings.agentic_rewrite_mode", "fanout"):
+            graph = service._build_graph()
+        result = graph.invoke(initial_agent_state)
+
+        assert result["workflow_path"] == ["retrieve", "grade", "fan_out", "grade", "generate"]
+        service.fanout_retriever.retrieve.assert_called_once()
+
+    def test_parse_reformulations(self):
+        text = '1) heap sort\n- "Binary heap"\n\n* heap sort\n3. priority queue'
+        assert parse_reformulations(text, 3) == ["heap sort", "Binary heap", "priority queue"]
+        assert parse_reformulations(text, 1) == ["heap sort"]
+
+
 @pytest.mark.unit
 class TestGenerateNode:
     """Tests for the generate node"""
@@ -239,6 +420,36 @@ class TestGenerateNode:
         assert "error" in result["generation"].lower() or \
                "apologize" in result["generation"].lower()
 
+    def test_generate_keeps_retrieval_order_and_drops_duplicates(self, agent_state_with_documents, mock_llm):
+        """Test that documents reach the prompt in retrieval order (not re-sorted by score), once each"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.complete.return_value = Mock(text="Test answer", raw={})
+        first, second = agent_state_with_documents["documents"]
+        agent_state_with_documents["documents"].append(first)
+        agent_state_with_documents["document_scores"] = [0.70, 0.90, 0.60]  # e.g. reranked: dense scores unsorted
+        agent_state_with_documents["document_metadata"] = [{"page": 1}, {"page": 2}, {"page": 3}]
+
+        result = service._generate(agent_state_with_documents)
+
+        prompt = mock_llm.complete.call_args[0][0]
+        assert prompt.index(first) < prompt.index(second)
+        assert prompt.count(first) == 1
+        assert result["document_scores"] == [0.70, 0.90]
+        assert result["document_metadata"] == [{"page": 1}, {"page": 2}]
+
+    def test_generate_reports_server_token_usage(self, agent_state_with_documents, mock_llm):
+        """Test that token_count comes from the server's usage, else from local counting"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.complete.return_value = Mock(text="Test answer", raw={"usage": {"total_tokens": 321}})
+
+        assert service._generate(dict(agent_state_with_documents, workflow_path=[]))["token_count"] == 321
+
+        mock_llm.complete.return_value = Mock(text="Test answer", raw={})
+        result = service._generate(dict(agent_state_with_documents, workflow_path=[]))
+        assert result["token_count"] > 0
+
 
 @pytest.mark.unit
 class TestRoutingLogic:
@@ -296,3 +507,178 @@ class TestRoutingLogic:
 
         # Assert
         assert decision == "rewrite"  # Still has retries left
+
+    def test_route_to_generate_after_fan_out(self, agent_state_irrelevant_docs):
+        """Test that fused retrieval is graded once, never fanned out again"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        agent_state_irrelevant_docs["relevance_decision"] = "no"
+        agent_state_irrelevant_docs["retry_count"] = 1
+        agent_state_irrelevant_docs["fanout_queries"] = ["Python variable assignment"]
+
+        assert service._decide_after_grading(agent_state_irrelevant_docs) == "generate"
+
+
+@pytest.mark.unit
+class TestDeadline:
+    """Nodes degrade instead of overrunning the request deadline"""
+
+    def test_no_deadline_no_limits(self, agent_state_with_documents):
+        service = AgenticRAGService.__new__(AgenticRAGService)
+
+        assert service._generation_limits(agent_state_with_documents) == {}
+        assert not service._over_budget(agent_state_with_documents)
+
+    def test_grading_skipped_near_deadline(self, agent_state_with_documents, mock_llm):
+        """Test that uncertain documents are used ungraded when only the generation reserve is left"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        agent_state_with_documents["document_scores"] = [0.45, 0.40]
+        agent_state_with_documents["deadline"] = time.monotonic() + 5  # Below the 30s reserve
+
+        result = service._grade_documents(agent_state_with_documents)
+
+        assert result["relevance_decision"] == "yes"
+        assert result["degradations"] == [Degradation.SKIP_GRADING.value]
+        mock_llm.classify.assert_not_called()
+
+    def test_rewrite_skipped_near_deadline(self, agent_state_irrelevant_docs, mock_llm):
+        """Test that a rejected retrieval goes straight to generation when time is short"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        agent_state_irrelevant_docs["deadline"] = time.monotonic() + 5
+
+        result = service._grade_documents(agent_state_irrelevant_docs)  # Score gate rejects
+
+        assert result["relevance_decision"] == "no"
+        assert result["degradations"] == [Degradation.SKIP_REWRITE.value]
+        assert service._decide_after_grading(result) == "generate"
+
+    def test_generation_capped_to_remaining_budget(self, agent_state_with_documents, mock_llm):
+        """Test that max_tokens and the server-side time limit follow the remaining budget"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        agent_state_with_documents["deadline"] = time.monotonic() + 10
+
+        result = service._generate(agent_state_with_documents)
+
+        kwargs = mock_llm.complete.call_args.kwargs
+        assert kwargs["max_tokens"] == pytest.approx(200, abs=1)  # 10s x 20 tokens/s
+        assert 9000 < kwargs["t_max_predict_ms"] <= 10000
+        assert result["degradations"] == [Degradation.CAP_MAX_TOKENS.value]
+
+    def test_generation_falls_back_when_queued_past_deadline(self, agent_state_with_documents, mock_llm):
+        """Test that a saturated LLM queue cannot hold the answer past the deadline"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=60)
+        busy = scheduler.submit()
+        agent_state_with_documents["deadline"] = time.monotonic() + 0.2
+
+        start = time.monotonic()
+        with patch("app.services.agentic_rag.llm_scheduler", scheduler):
+            result = service._generate(agent_state_with_documents)
+
+        assert time.monotonic() - start < 1
+        assert result["generation"] == NO_ANSWER_MESSAGE
+        assert result["degradations"] == [Degradation.NO_ANSWER_SLOT.value]
+        assert result["documents"]  # Sources are still returned
+        mock_llm.complete.assert_not_called()
+        busy.release()
+
+    def test_generation_limits_account_for_queue_wait(self, agent_state_with_documents, mock_llm):
+        """Test that time spent waiting for the slot is taken off the generation limits"""
+        import threading
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=60)
+        busy = scheduler.submit()
+        threading.Timer(0.5, busy.release).start()
+        agent_state_with_documents["deadline"] = time.monotonic() + 10
+
+        with patch("app.services.agentic_rag.llm_scheduler", scheduler):
+            service._generate(agent_state_with_documents)
+
+        kwargs = mock_llm.complete.call_args.kwargs
+        assert kwargs["t_max_predict_ms"] <= 9500
+        assert kwargs["ticket"].released  # The slot taken for generation is given back
+
+    def test_stream_falls_back_when_queued_past_deadline(self, mock_query_engine, mock_llm):
+        """Test that query_stream stops waiting for a slot at the deadline and returns the sources"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.query_engine = mock_query_engine
+        service.retriever = None
+        service.llm = mock_llm
+        service.llm.astream_complete = AsyncMock()
+        service.retrieval_graph = service._build_graph(include_generate=False)
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=60)
+        busy = scheduler.submit()
+
+        async def collect():
+            return [event async for event in service.query_stream("What is a Python variable?",
+                                                                  deadline_seconds=0.3)]
+
+        start = time.monotonic()
+        with patch("app.services.agentic_rag.settings.semantic_cache_enabled", False), \
+                patch("app.services.agentic_rag.llm_scheduler", scheduler):
+            events = asyncio.run(collect())
+
+        assert time.monotonic() - start < 2
+        assert events[-1]["type"] == "complete"
+        assert events[-1]["answer"] == NO_ANSWER_MESSAGE
+        assert Degradation.NO_ANSWER_SLOT.value in events[-1]["degradations"]
+        assert events[-1]["num_sources"] > 0
+        service.llm.astream_complete.assert_not_called()
+        assert scheduler.stats()["expired_deadline"] == 1
+        busy.release()
+
+    def test_per_document_grading_stops_at_budget(self, agent_state_with_documents, mock_llm):
+        """Test that documents still being graded when the budget runs out are kept"""
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = mock_llm
+        mock_llm.classify.side_effect = lambda *args, **kwargs: time.sleep(0.5) or Relevance.NO
+
+        start = time.monotonic()
+        verdicts = service._grade_each_document("What is a Python variable?",
+                                                agent_state_with_documents["documents"], timeout=0.05)
+
+        assert verdicts == [True, True]
+        assert time.monotonic() - start < 0.4
+
+
+@pytest.mark.unit
+class TestStreamingGraph:
+    """query_stream generates each answer once, as a stream"""
+
+    def test_stream_generates_once(self, mock_query_engine, mock_llm):
+        """The retrieval graph stops before generate; only the streamed completion runs"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        async def stream():
+            for token in ["Variables ", "store ", "values."]:
+                yield MagicMock(text=token)
+
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.query_engine = mock_query_engine
+        service.retriever = None
+        service.llm = mock_llm
+        service.llm.astream_complete = AsyncMock(return_value=stream())
+        service.graph = service._build_graph()
+        service.retrieval_graph = service._build_graph(include_generate=False)
+
+        async def collect():
+            return [event async for event in service.query_stream("What is a Python variable?")]
+
+        with patch("app.services.agentic_rag.settings.semantic_cache_enabled", False):
+            events = asyncio.run(collect())
+
+        nodes = [e["node"] for e in events if e["type"] == "workflow"]
+        assert nodes == ["retrieve", "grade_documents", "generate"]
+        assert "".join(e["content"] for e in events if e["type"] == "token") == "Variables store values."
+        assert events[-1]["answer"] == "Variables store values."
+        assert events[-1]["workflow_path"] == "retrieve → grade → generate"
+        service.llm.complete.assert_not_called()
+        service.llm.astream_complete.assert_called_once()
@@ -0,0 +1,125 @@
+"""
+Unit tests for the load-balanced llama.cpp backend pool
+
+Backends are small local HTTP servers on ephemeral ports that answer
+/v1/completions and /v1/models like llama.cpp does.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.llm_pool import LLMBackendPool, sticky_conversation
+from app.services.mistral_llm import MistralLLM
+
+
+class FakeCompletionServer:
+    """Minimal llama.cpp stand-in that records how many completions it served"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.completions = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._send({"data": [{"id": "fake"}]})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                server.completions += 1
+                self._send({"choices": [{"text": server.name, "finish_reason": "stop"}]})
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def servers():
+    started = [FakeCompletionServer("a"), FakeCompletionServer("b")]
+    yield started
+    for server in started:
+        try:
+            server.stop()
+        except OSError:
+            pass
+
+
+def pooled_llm(urls) -> MistralLLM:
+    llm = MistralLLM(server_url=urls[0])
+    llm._pool = LLMBackendPool(urls, eject_after_failures=1, eject_seconds=60, probe_interval=0)
+    return llm
+
+
+@pytest.mark.unit
+class TestLLMBackendPool:
+    """Tests for backend selection, ejection and failover"""
+
+    def test_least_outstanding_backend_is_chosen(self):
+        pool = LLMBackendPool(["http://a", "http://b"], probe_interval=0)
+
+        with pool.lease() as first, pool.lease() as second:
+            assert {first.url, second.url} == {"http://a", "http://b"}
+
+    def test_full_backend_is_not_leased(self):
+        pool = LLMBackendPool(["http://a", "http://b"], probe_interval=0, slots_per_backend=1)
+
+        with pool.lease("student-1") as first:
+            with pool.lease("student-1") as second:
+                assert second.url != first.url  # Sticky backend has no free slot
+
+    def test_capacity_counts_healthy_backends(self):
+        pool = LLMBackendPool(["http://a", "http://b"], eject_after_failures=1, eject_seconds=60,
+                              probe_interval=0, slots_per_backend=2)
+        assert pool.capacity() == 4
+
+        pool.record_failure(pool.backends[0], RuntimeError("boom"))
+
+        assert pool.capacity() == 2
+        assert LLMBackendPool(["http://a"], slots_per_backend=0).capacity() == 0
+
+    def test_conversation_sticks_to_its_backend(self, servers):
+        llm = pooled_llm([s.url for s in servers])
+
+        with sticky_conversation("student-1"):
+            answers = {llm.complete("q").text for _ in range(4)}
+        other = llm.complete("q", conversation_id="student-2").text
+
+        assert len(answers) == 1
+        assert other != answers.pop()
+
+    def test_failed_backend_is_ejected_and_call_fails_over(self, servers):
+        llm = pooled_llm([s.url for s in servers])
+        servers[0].stop()
+
+        answers = [llm.complete("q").text for _ in range(3)]
+
+        assert answers == ["b", "b", "b"]
+        down = llm.backend_pool.backends[0]
+        assert not down.available and down.failures == 1
+
+    def test_health_probe_readmits_backend(self, servers):
+        pool = LLMBackendPool([s.url for s in servers], eject_seconds=60, probe_interval=0)
+        backend = pool.backends[0]
+        pool.record_failure(backend, RuntimeError("boom"))
+        pool.record_failure(backend, RuntimeError("boom"))
+        assert not backend.available
+
+        assert pool.probe(backend) is True
+        assert backend.available
@@ -0,0 +1,132 @@
+"""
+Unit tests for LLM admission control and priority scheduling
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.llm_pool import LLMBackendPool
+from app.services.llm_scheduler import LLMDeadlineError, LLMOverloadedError, LLMPriority, LLMScheduler
+
+
+@pytest.mark.unit
+class TestLLMScheduler:
+    """Tests for slots, priorities and fail-fast overload handling"""
+
+    def test_short_calls_overtake_queued_generations(self):
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=10, queue_timeout=5)
+        running = scheduler.submit(LLMPriority.GENERATION)
+        generation = scheduler.submit(LLMPriority.GENERATION)
+        grading = scheduler.submit(LLMPriority.GRADING)
+
+        assert running.granted
+        assert grading.position() == 1
+        assert generation.position() == 2
+
+        running.release()
+
+        assert grading.granted
+        assert not generation.granted
+
+    def test_full_queue_is_rejected_with_429(self):
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=1, queue_timeout=5)
+        scheduler.submit()
+        scheduler.submit()
+
+        with pytest.raises(LLMOverloadedError) as exc_info:
+            scheduler.submit()
+
+        assert exc_info.value.status_code == 429
+        assert scheduler.stats()["rejected_queue_full"] == 1
+
+    def test_queue_timeout_is_rejected_with_503(self):
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=0.05)
+        scheduler.submit()
+
+        with pytest.raises(LLMOverloadedError) as exc_info:
+            scheduler.acquire()
+
+        assert exc_info.value.status_code == 503
+        assert scheduler.stats()["queue_depth"] == 0
+
+    def test_caller_deadline_bounds_the_wait(self):
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=60)
+        scheduler.submit()
+
+        start = time.monotonic()
+        with pytest.raises(LLMDeadlineError) as exc_info:
+            scheduler.acquire(timeout=0.05)
+
+        assert time.monotonic() - start < 1
+        assert exc_info.value.status_code == 503
+        stats = scheduler.stats()
+        assert (stats["expired_deadline"], stats["rejected_timeout"], stats["queue_depth"]) == (1, 0, 0)
+
+    def test_blocked_thread_is_granted_on_release(self):
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=5)
+        first = scheduler.submit()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(scheduler.acquire(LLMPriority.REWRITE)))
+        waiter.start()
+        time.sleep(0.05)
+
+        first.release()
+        waiter.join(timeout=2)
+
+        assert acquired and acquired[0].granted
+        stats = scheduler.stats()
+        assert stats["running"] == 1
+        assert stats["admitted"] == 2
+
+    def test_async_waiter_reports_position_until_granted(self):
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=5)
+
+        async def run():
+            holder = scheduler.submit()
+            ticket = scheduler.submit()
+            positions = []
+            asyncio.get_running_loop().call_later(0.15, holder.release)
+            while not await ticket.wait_async(poll_seconds=0.05):
+                positions.append(ticket.position())
+            return ticket, positions
+
+        ticket, positions = asyncio.run(run())
+
+        assert ticket.granted
+        assert positions and set(positions) == {1}
+
+    def test_waiter_on_closed_loop_does_not_strand_the_queue(self):
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=5)
+        holder = scheduler.submit()
+        abandoned = scheduler.submit(LLMPriority.ROUTING)
+        next_waiter = scheduler.submit()
+
+        async def disconnect():
+            await abandoned.wait_async(poll_seconds=0.01)  # Still queued when the client goes away
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(disconnect())
+        loop.close()
+
+        holder.release()
+
+        assert next_waiter.granted
+        assert scheduler.stats()["running"] == 1
+
+    def test_capacity_follows_the_backend_pool(self):
+        pool = LLMBackendPool(["http://a", "http://b"], eject_after_failures=1, eject_seconds=60,
+                              probe_interval=0, slots_per_backend=1)
+        scheduler = LLMScheduler(max_queue=5, queue_timeout=5, capacity=pool.capacity)
+        pool.record_failure(pool.backends[0], RuntimeError("boom"))
+
+        first = scheduler.submit()
+        second = scheduler.submit()
+        assert first.granted and not second.granted  # One healthy backend, one slot
+
+        pool.backends[0].ejected_until = 0.0  # Backend re-admitted
+        third = scheduler.submit()
+
+        assert second.granted and not third.granted
+        assert scheduler.stats()["max_concurrency"] == 2
@@ -0,0 +1,162 @@
+"""
+Unit tests for the pooled sync and async MistralLLM clients
+"""
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+from app.services.mistral_llm import MistralLLM
+
+
+def completion_handler(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    if body.get("stream"):
+        events = "".join(f'data: {json.dumps({"choices": [{"text": t}]})}\n\n' for t in ["A ", "heap"])
+        return httpx.Response(200, text=events + "data: [DONE]\n\n")
+    return httpx.Response(200, json={"choices": [{"text": f"echo:{body['prompt']}", "finish_reason": "stop"}]})
+
+
+def attach_mock_client(llm: MistralLLM, handler):
+    """Install an httpx client with a mock transport for the running loop"""
+    llm._async_clients[asyncio.get_running_loop()] = httpx.AsyncClient(
+        base_url=llm.server_url, transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.unit
+class TestMistralLLMClients:
+    """Tests for connection reuse and the async API"""
+
+    def test_sync_calls_share_one_session(self):
+        llm = MistralLLM(server_url="http://llm.test")
+        response = MagicMock()
+        response.json.return_value = {"choices": [{"text": "ok"}]}
+        llm._session = MagicMock(post=MagicMock(return_value=response))
+
+        llm.complete("first")
+        llm.complete("second")
+
+        assert llm.session.post.call_count == 2
+        assert llm.session.post.call_args.kwargs["json"]["prompt"] == "second"
+
+    def test_acomplete_and_astream_complete(self):
+        llm = MistralLLM(server_url="http://llm.test")
+
+        async def run():
+            attach_mock_client(llm, completion_handler)
+            completion = await llm.acomplete("What is a heap?")
+            tokens = [chunk.text async for chunk in await llm.astream_complete("What is a heap?")]
+            await llm.aclose()
+            return completion, tokens
+
+        completion, tokens = asyncio.run(run())
+
+        assert completion.text == "echo:What is a heap?"
+        assert tokens == ["A ", "heap"]
+
+    def test_async_http_error_is_reported(self):
+        llm = MistralLLM(server_url="http://llm.test")
+
+        async def run():
+            attach_mock_client(llm, lambda request: httpx.Response(503, text="loading model"))
+            await llm.acomplete("What is a heap?")
+
+        with pytest.raises(RuntimeError, match="503: loading model"):
+            asyncio.run(run())
+
+    def test_one_async_client_per_loop_and_all_closed(self):
+        llm = MistralLLM(server_url="http://llm.test")
+
+        async def client():
+            return llm.async_client
+
+        first = asyncio.run(client())
+        loop = asyncio.new_event_loop()
+        try:
+            second = loop.run_until_complete(client())
+            assert loop.run_until_complete(client()) is second
+            assert list(llm._async_clients.values()) == [second]  # The closed loop's client was dropped
+            loop.run_until_complete(llm.aclose())
+        finally:
+            loop.close()
+
+        assert second is not first
+        assert second.is_closed
+        assert llm._async_clients == {}
+
+    def test_request_asks_for_prompt_cache_and_pins_prefix_slot(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "llm_prefix_slots", 4)
+        llm = MistralLLM(server_url="http://llm.test")
+
+        grading = llm._request_body("prompt", stream=False, prompt_prefix="You are a grader.\n\n")
+        generation = llm._request_body("prompt", stream=False, prompt_prefix="You are a mentor.\n\n")
+        unpinned = llm._request_body("prompt", stream=False)
+
+        assert grading["cache_prompt"] is True
+        assert grading["id_slot"] == llm._request_body("other", stream=True, prompt_prefix="You are a grader.\n\n")["id_slot"]
+        assert 0 <= generation["id_slot"] < 4
+        assert "id_slot" not in unpinned
+
+    def test_request_passes_generation_time_limit(self):
+        llm = MistralLLM(server_url="http://llm.test")
+
+        limited = llm._request_body("prompt", stream=True, max_tokens=120, t_max_predict_ms=8000)
+
+        assert limited["max_tokens"] == 120
+        assert limited["t_max_predict_ms"] == 8000
+        assert "t_max_predict_ms" not in llm._request_body("prompt", stream=True)
+
+    def test_deadline_shortens_the_http_timeout(self):
+        import time
+        llm = MistralLLM(server_url="http://llm.test")
+        response = MagicMock()
+        response.json.return_value = {"choices": [{"text": "ok"}]}
+        llm._session = MagicMock(post=MagicMock(return_value=response))
+
+        llm.complete("prompt", deadline=time.monotonic() + 5)
+        llm.complete("prompt")
+
+        first, second = llm.session.post.call_args_list
+        assert 1 <= first.kwargs["timeout"] <= 5
+        assert "deadline" not in first.kwargs["json"]
+        assert second.kwargs["timeout"] == llm.timeout
+
+    def test_classify_sends_grammar_and_parses_label(self):
+        from app.models.pedagogical_state import TutoringPhase
+        llm = MistralLLM(server_url="http://llm.test")
+        response = MagicMock()
+        response.json.return_value = {"choices": [{"text": " DEBUGGING"}]}
+        llm._session = MagicMock(post=MagicMock(return_value=response))
+
+        phase = llm.classify("Which phase?", TutoringPhase)
+
+        body = llm.session.post.call_args.kwargs["json"]
+        assert phase is TutoringPhase.DEBUGGING
+        assert '"REFLECTION"' in body["grammar"]
+        assert body["temperature"] == 0.0 and body["max_tokens"] <= 8
+
+    def test_classify_lets_callers_override_defaults(self):
+        from app.services.agent_state import Relevance
+        llm = MistralLLM(server_url="http://llm.test")
+        response = MagicMock()
+        response.json.return_value = {"choices": [{"text": "yes"}]}
+        llm._session = MagicMock(post=MagicMock(return_value=response))
+
+        llm.classify("Relevant?", Relevance, max_tokens=4, stop=["."])
+
+        body = llm.session.post.call_args.kwargs["json"]
+        assert body["max_tokens"] == 4 and body["stop"] == ["."]
+        assert body["temperature"] == 0.0
+
+    def test_classify_rejects_unparseable_output(self):
+        from app.services.agent_state import Relevance
+        llm = MistralLLM(server_url="http://llm.test")
+        response = MagicMock()
+        response.json.return_value = {"choices": [{"text": "maybe"}]}
+        llm._session = MagicMock(post=MagicMock(return_value=response))
+
+        with pytest.raises(ValueError):
+            llm.classify("Relevant?", Relevance)
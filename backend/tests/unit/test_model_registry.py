@@ -0,0 +1,78 @@
+"""
+Unit tests for the shared model registry
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services import model_registry as registry_module
+from app.services.bm25_index import BM25Index
+from app.services.collection_version import CollectionVersion, bump_collection_version
+from app.services.model_registry import ModelRegistry
+
+
+@pytest.mark.unit
+class TestModelRegistry:
+    """Tests that models and DB handles are created once per process"""
+
+    def test_handles_are_loaded_once_and_shared(self):
+        registry = ModelRegistry()
+        client = MagicMock()
+        with patch.object(registry_module, "create_embedding_model", return_value=MagicMock()) as create_embed, \
+                patch.object(registry_module.chromadb, "PersistentClient", return_value=client) as create_client:
+            assert registry.get_embed_model() is registry.get_embed_model()
+            assert registry.get_collection() is registry.get_collection()
+            registry.get_vector_store()
+
+        assert create_embed.call_count == 1
+        assert create_client.call_count == 1
+        assert client.get_or_create_collection.call_count == 1
+        assert set(registry.stats()["loaded"]) >= {"embed_model", "chroma_client"}
+
+    def test_bm25_index_reloaded_after_ingestion(self, tmp_path, monkeypatch):
+        version_path = str(tmp_path / "collection_version.json")
+        index_path = tmp_path / "bm25_index.npz"
+        monkeypatch.setattr(registry_module.settings, "bm25_index_path", str(index_path))
+        registry = ModelRegistry(version=CollectionVersion(version_path))
+
+        assert registry.get_bm25_index() is None  # Server started before the first ingest
+
+        BM25Index.build(["c1"], ["heapify restores the heap"]).save(str(index_path))
+        assert registry.get_bm25_index() is None  # Same collection version: no reload
+        bump_collection_version(version_path)
+
+        index = registry.get_bm25_index()
+        assert index is not None and index.doc_ids == ["c1"]
+        assert registry.get_bm25_index() is index
+
+    def test_bm25_index_served_while_reloading(self, tmp_path, monkeypatch):
+        version_path = str(tmp_path / "collection_version.json")
+        index_path = tmp_path / "bm25_index.npz"
+        monkeypatch.setattr(registry_module.settings, "bm25_index_path", str(index_path))
+        registry = ModelRegistry(version=CollectionVersion(version_path))
+        BM25Index.build(["c1"], ["heapify restores the heap"]).save(str(index_path))
+        old_index = registry.get_bm25_index()
+
+        BM25Index.build(["c2"], ["a stack is last in, first out"]).save(str(index_path))
+        bump_collection_version(version_path)
+        served_during_load = []
+        load = BM25Index.load
+
+        def slow_load(path):
+            served_during_load.append(registry._handles.get("bm25_index"))  # What an unlocked reader sees
+            return load(path)
+
+        with patch.object(registry_module.BM25Index, "load", side_effect=slow_load):
+            new_index = registry.get_bm25_index()
+
+        assert served_during_load == [old_index]
+        assert new_index.doc_ids == ["c2"]
+
+    def test_reset_forgets_handles(self):
+        registry = ModelRegistry()
+        with patch.object(registry_module, "create_embedding_model", side_effect=lambda: MagicMock()) as create_embed:
+            registry.get_embed_model()
+            registry.reset()
+            registry.get_embed_model()
+
+        assert create_embed.call_count == 2
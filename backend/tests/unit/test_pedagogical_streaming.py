@@ -0,0 +1,82 @@
+"""
+Unit tests for the streaming pedagogical phase nodes
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models.pedagogical_state import PedagogicalState, TutoringPhase
+from app.services.llm_scheduler import LLMPriority, LLMScheduler
+from app.services.pedagogical_graph import stream_phase_node
+
+
+def collect(target_phase: str, state):
+    async def run():
+        return [event async for event in stream_phase_node(target_phase, state)]
+    return asyncio.run(run())
+
+
+def streaming_service(tokens):
+    async def stream():
+        for token in tokens:
+            yield MagicMock(text=token)
+
+    service = MagicMock()
+    service.llm.astream_complete = AsyncMock(return_value=stream())
+    return service
+
+
+@pytest.mark.unit
+class TestStreamPhaseNode:
+    """Tokens are forwarded as they arrive; the state update comes last"""
+
+    def test_tokens_then_result(self):
+        service = streaming_service(["Let's ", "plan ", "it."])
+        state = {"pedagogical_state": PedagogicalState(problem_statement="Reverse a list"),
+                 "user_message": "I'm confused", "generation": ""}
+
+        with patch("app.services.pedagogical_graph.get_agentic_rag_service_async", AsyncMock(return_value=service)):
+            events = collect("EXPLANATION", state)
+
+        assert [e["content"] for e in events[:-1]] == ["Let's ", "plan ", "it."]
+        result = events[-1]
+        assert result["type"] == "result"
+        assert result["generation"] == "Let's plan it."
+        assert result["pedagogical_state"].current_phase == TutoringPhase.EXPLANATION
+        assert result["pedagogical_state"].last_ai_response == "Let's plan it."
+        assert state["pedagogical_state"].phase_history == []  # Input state is not mutated
+        assert service.llm.astream_complete.call_args.kwargs["stop"] == []
+
+    def test_queue_position_reported_while_waiting_for_a_slot(self):
+        service = streaming_service(["Hi."])
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, queue_timeout=5)
+        busy = scheduler.submit(LLMPriority.GENERATION)
+        state = {"pedagogical_state": PedagogicalState(), "user_message": "Hello", "generation": ""}
+
+        async def run():
+            events = []
+            async for event in stream_phase_node("INITIAL", state):
+                events.append(event)
+                if event["type"] == "queue":
+                    busy.release()
+            return events
+
+        with patch("app.services.pedagogical_graph.get_agentic_rag_service_async", AsyncMock(return_value=service)), \
+                patch("app.services.pedagogical_graph.llm_scheduler", scheduler):
+            events = asyncio.run(run())
+
+        assert [e["type"] for e in events] == ["queue", "token", "result"]
+        assert events[0]["position"] == 1
+        ticket = service.llm.astream_complete.call_args.kwargs["ticket"]
+        assert ticket.released and scheduler.stats()["running"] == 0
+
+    def test_debugging_phase_needs_no_llm(self):
+        state = {"pedagogical_state": PedagogicalState(), "user_message": "It crashes", "generation": ""}
+
+        with patch("app.services.pedagogical_graph.get_agentic_rag_service_async") as get_service:
+            events = collect("DEBUGGING", state)
+
+        get_service.assert_not_called()
+        assert events[0]["type"] == "token" and "It crashes" in events[0]["content"]
+        assert events[-1]["pedagogical_state"].current_phase == TutoringPhase.DEBUGGING
@@ -0,0 +1,108 @@
+"""
+Unit tests for the embedding-based pedagogical phase router
+"""
+import json
+import sqlite3
+import zlib
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.models.pedagogical_state import PedagogicalState, TutoringPhase
+from app.services.phase_classifier import PhaseClassifier, load_history_examples, load_seed_examples
+
+
+def bag_of_words(text: str):
+    """Deterministic stand-in for the sentence embedding model"""
+    vector = np.zeros(256, dtype=np.float32)
+    for word in text.lower().replace("!", " ").replace("?", " ").replace(",", " ").split():
+        vector[zlib.crc32(word.encode()) % 256] += 1.0
+    return vector.tolist()
+
+
+@pytest.fixture
+def classifier():
+    return PhaseClassifier(embed=bag_of_words, embed_batch=lambda texts: [bag_of_words(t) for t in texts],
+                           min_confidence=0.5).fit(load_seed_examples())
+
+
+@pytest.mark.unit
+class TestPhaseClassifier:
+    """Tests for training, prediction and the route_phase integration"""
+
+    def test_predicts_seed_phases(self, classifier):
+        examples = load_seed_examples()
+        correct = sum(classifier.predict(e.message, e.current_phase)[0] == e.phase for e in examples)
+
+        assert correct / len(examples) > 0.9
+
+    def test_history_examples_use_llm_routed_turns(self, tmp_path):
+        from app.middleware.analytics_middleware import pedagogical_state_snapshot
+
+        def routed(routed_by):
+            # initial -> implementation -> debugging, the last turn routed by routed_by
+            state = PedagogicalState()
+            state.transition_to_phase(TutoringPhase.IMPLEMENTATION)
+            state.routed_from, state.routed_by = state.current_phase.value, routed_by
+            state.transition_to_phase(TutoringPhase.DEBUGGING)
+            return json.dumps(pedagogical_state_snapshot(state))
+
+        db_path = tmp_path / "analytics.db"
+        with sqlite3.connect(db_path) as db:
+            db.execute("CREATE TABLE interactions (user_query TEXT, pedagogical_state TEXT, "
+                       "endpoint_type TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+            db.executemany("INSERT INTO interactions (user_query, pedagogical_state, endpoint_type) VALUES (?, ?, ?)", [
+                ("It crashes", routed("llm"), "pedagogical"),
+                ("It hangs", routed("classifier"), "pedagogical"),
+                ("It loops", routed("keywords"), "pedagogical"),
+                ("[REDACTED]", routed("llm"), "pedagogical"),
+                ("It fails", json.dumps({"current_phase": "debugging", "phase_history": ["initial"]}), "pedagogical"),
+                ("What is a heap?", None, "agentic"),
+            ])
+
+        examples = load_history_examples(str(db_path))
+
+        assert [(e.message, e.current_phase, e.phase) for e in examples] == [("It crashes", "implementation", "DEBUGGING")]
+
+    def test_training_embeds_in_one_batch(self):
+        embed, embed_batch = MagicMock(), MagicMock(side_effect=lambda texts: [bag_of_words(t) for t in texts])
+        examples = load_seed_examples()
+
+        PhaseClassifier(embed=embed, embed_batch=embed_batch).fit(examples)
+
+        embed_batch.assert_called_once_with([e.message for e in examples])
+        embed.assert_not_called()
+
+    def test_route_phase_records_routing_source(self, classifier):
+        from app.services.pedagogical_graph import _finish_phase, route_phase
+        state = {"pedagogical_state": PedagogicalState(current_phase=TutoringPhase.IMPLEMENTATION),
+                 "user_message": "I get a NullPointerException on line 12", "generation": ""}
+
+        with patch("app.services.pedagogical_graph.phase_classifier", classifier):
+            phase = TutoringPhase[route_phase(state)]
+        updated = _finish_phase(state, phase, "reply")["pedagogical_state"]
+
+        assert (updated.routed_from, updated.routed_by) == ("implementation", "classifier")
+
+    def test_route_phase_skips_llm_when_confident(self, classifier):
+        from app.services.pedagogical_graph import route_phase
+        state = {"pedagogical_state": PedagogicalState(current_phase=TutoringPhase.IMPLEMENTATION),
+                 "user_message": "I get a NullPointerException on line 12", "generation": ""}
+
+        with patch("app.services.pedagogical_graph.phase_classifier", classifier), \
+                patch("app.services.pedagogical_graph.get_agentic_rag_service") as get_service:
+            assert route_phase(state) == "DEBUGGING"
+        get_service.assert_not_called()
+
+    def test_route_phase_asks_llm_when_unsure(self, classifier):
+        from app.services.pedagogical_graph import route_phase
+        classifier.min_confidence = 1.01  # Never confident
+        service = MagicMock()
+        service.llm.classify.return_value = TutoringPhase.REFLECTION
+        state = {"pedagogical_state": PedagogicalState(), "user_message": "Hmm", "generation": ""}
+
+        with patch("app.services.pedagogical_graph.phase_classifier", classifier), \
+                patch("app.services.pedagogical_graph.get_agentic_rag_service", return_value=service):
+            assert route_phase(state) == "REFLECTION"
+        assert classifier.stats()["deferred_to_llm"] == 1
@@ -0,0 +1,38 @@
+"""
+Unit tests for the cache-friendly prompt layout
+"""
+import pytest
+
+from app.services import prompts
+
+
+@pytest.mark.unit
+class TestPromptLayout:
+    """Variable content must come after each template's static prefix"""
+
+    QUESTION = "What is a linked list?"
+    DOCUMENTS = ["A linked list is a chain of nodes.", "Each node points to the next."]
+
+    @pytest.mark.parametrize("build, prefix", [
+        (lambda q, d: prompts.build_grading_prompt(q, d), prompts.GRADING_PREFIX),
+        (lambda q, d: prompts.build_document_grading_prompt(q, d[0]), prompts.DOCUMENT_GRADING_PREFIX),
+        (lambda q, d: prompts.build_rewrite_prompt(q), prompts.REWRITE_PREFIX),
+        (lambda q, d: prompts.build_fanout_prompt(q, 3), prompts.FANOUT_PREFIX),
+        (lambda q, d: prompts.build_generation_prompt(q, d), prompts.GENERATION_PREFIX),
+        (lambda q, d: prompts.build_tutor_prompt(prompts.EXPLANATION_PREFIX, q, d[0]), prompts.EXPLANATION_PREFIX),
+        (lambda q, d: prompts.build_routing_prompt("initial", q, d[0]), prompts.ROUTING_PREFIX),
+    ])
+    def test_prompt_starts_with_static_prefix(self, build, prefix):
+        prompt = build(self.QUESTION, self.DOCUMENTS)
+
+        assert prompt.startswith(prefix)
+        assert self.QUESTION in prompt[len(prefix):]
+        assert self.QUESTION not in prefix
+
+    def test_different_questions_share_the_prefix(self):
+        first = prompts.build_generation_prompt("What is a stack?", self.DOCUMENTS)
+        second = prompts.build_generation_prompt("What is a queue?", self.DOCUMENTS[::-1])
+
+        prefix_length = len(prompts.GENERATION_PREFIX)
+        assert first[:prefix_length] == second[:prefix_length]
+        assert first != second
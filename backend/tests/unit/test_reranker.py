@@ -0,0 +1,102 @@
+"""
+Unit tests for the cross-encoder reranking stage
+"""
+from unittest.mock import MagicMock
+
+import pytest
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from app.services.agentic_rag import AgenticRAGService
+from app.services.collection_version import CollectionVersion, bump_collection_version
+from app.services.reranker import CrossEncoderReranker, RerankingRetriever, rerank_enabled
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words the chunk contains; records each batch"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        return [sum(word in text.lower() for word in query.lower().split()) for query, text in pairs]
+
+
+class FakeRetriever(BaseRetriever):
+    def __init__(self, nodes):
+        super().__init__()
+        self.nodes = nodes
+
+    def _retrieve(self, query_bundle):
+        return [NodeWithScore(node=n.node, score=n.score) for n in self.nodes]
+
+
+def make_nodes():
+    texts = ["stacks are lifo", "a heap keeps its minimum at the root", "heap sort uses a binary heap"]
+    return [NodeWithScore(node=TextNode(text=text, id_=f"c{i}"), score=0.9 - i * 0.1)
+            for i, text in enumerate(texts)]
+
+
+@pytest.fixture
+def version(tmp_path):
+    return CollectionVersion(str(tmp_path / "collection_version.json"))
+
+
+@pytest.mark.unit
+class TestCrossEncoderReranker:
+    """Tests for batched scoring, the score cache and the reranking retriever"""
+
+    def test_candidates_scored_in_one_batch_and_cut_to_top_k(self, version):
+        model = FakeCrossEncoder()
+        reranker = CrossEncoderReranker(load_model=lambda: model, version=version)
+        retriever = RerankingRetriever(FakeRetriever(make_nodes()), top_k=2, reranker=reranker)
+
+        nodes = retriever.retrieve("binary heap sort")
+
+        assert [n.node.node_id for n in nodes] == ["c2", "c1"]
+        assert [n.score for n in nodes] == pytest.approx([0.7, 0.8])  # Dense similarity is kept
+        assert model.batches == [3]
+
+    def test_scores_cached_per_query_and_chunk(self, version):
+        model = FakeCrossEncoder()
+        reranker = CrossEncoderReranker(load_model=lambda: model, version=version)
+        nodes = make_nodes()
+
+        reranker.rerank("What is a heap?", nodes[:2], top_k=2)
+        reranker.rerank("what is a HEAP", nodes, top_k=2)
+
+        assert model.batches == [2, 1]  # Only the new chunk is scored the second time
+        assert reranker.stats()["scores"]["hits"] == 2
+
+    def test_collection_version_bump_clears_scores(self, version):
+        model = FakeCrossEncoder()
+        reranker = CrossEncoderReranker(load_model=lambda: model, version=version)
+
+        reranker.rerank("heap", make_nodes(), top_k=1)
+        bump_collection_version(str(version.path))
+        reranker.rerank("heap", make_nodes(), top_k=1)
+
+        assert model.batches == [3, 3]
+
+    def test_rerank_switched_per_endpoint(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "rerank_endpoints", "agentic")
+
+        assert rerank_enabled("agentic")
+        assert not rerank_enabled("simple")
+
+    def test_reranked_order_reaches_the_generation_prompt(self, version, initial_agent_state):
+        """Test that context packing keeps the cross-encoder's order instead of re-sorting by dense score"""
+        reranker = CrossEncoderReranker(load_model=FakeCrossEncoder, version=version)
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.retriever = RerankingRetriever(FakeRetriever(make_nodes()), top_k=2, reranker=reranker)
+        service.llm = MagicMock()
+        service.llm.complete.return_value = MagicMock(text="answer", raw={})
+        initial_agent_state["question"] = "binary heap sort"
+
+        state = service._generate(service._retrieve(initial_agent_state))
+
+        prompt = service.llm.complete.call_args[0][0]
+        assert prompt.index("heap sort uses a binary heap") < prompt.index("a heap keeps its minimum at the root")
+        assert state["document_scores"] == pytest.approx([0.7, 0.8])
@@ -0,0 +1,108 @@
+"""
+Unit tests for the retrieval cache and collection version stamp
+"""
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from app.services.collection_version import CollectionVersion, bump_collection_version
+from app.services.retrieval_cache import CachedRetriever, RetrievalCache, normalize_query
+
+
+class FakeRetriever(BaseRetriever):
+    """Counts calls and records the query embedding it was given"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.embeddings = []
+
+    def _retrieve(self, query_bundle):
+        self.calls += 1
+        self.embeddings.append(query_bundle.embedding)
+        return [NodeWithScore(node=TextNode(text="heapify", id_="c1"), score=0.8)]
+
+
+def make_embed_model():
+    embed_model = MagicMock(model_name="test-model", variant=None)
+    embed_model.get_query_embedding.return_value = [0.1, 0.2]
+    return embed_model
+
+
+@pytest.fixture
+def version(tmp_path):
+    return CollectionVersion(str(tmp_path / "collection_version.json"))
+
+
+@pytest.mark.unit
+class TestRetrievalCache:
+    """Tests for cached retrieval results and query embeddings"""
+
+    def test_repeated_question_is_served_from_cache(self, version):
+        cache = RetrievalCache(maxsize=8, ttl_seconds=60, version=version)
+        inner, embed_model = FakeRetriever(), make_embed_model()
+        retriever = CachedRetriever(inner, embed_model, top_k=3, cache=cache)
+
+        first = retriever.retrieve("What is heapify?")
+        second = retriever.retrieve("  what is HEAPIFY ")
+
+        assert inner.calls == 1
+        assert inner.embeddings == [[0.1, 0.2]]
+        assert [n.node.node_id for n in second] == [n.node.node_id for n in first]
+        assert second[0] is not first[0]
+        stats = cache.stats()
+        assert stats["results"]["hits"] == 1
+        assert stats["results"]["misses"] == 1
+
+    def test_collection_version_bump_invalidates_results_but_not_embeddings(self, version):
+        cache = RetrievalCache(maxsize=8, ttl_seconds=60, version=version)
+        inner, embed_model = FakeRetriever(), make_embed_model()
+        retriever = CachedRetriever(inner, embed_model, top_k=3, cache=cache)
+
+        retriever.retrieve("What is heapify?")
+        bump_collection_version(str(version.path))
+        retriever.retrieve("What is heapify?")
+
+        assert inner.calls == 2
+        assert embed_model.get_query_embedding.call_count == 1
+        assert cache.stats()["collection_version"] != "initial"
+
+    def test_entries_expire_and_are_bounded(self, version):
+        cache = RetrievalCache(maxsize=2, ttl_seconds=0.05, version=version)
+        nodes = [NodeWithScore(node=TextNode(text="x", id_="c1"), score=0.5)]
+
+        for key in ("a", "b", "c"):
+            cache.put_results(key, nodes)
+        assert cache.get_results("a") is None  # Evicted by size
+        assert cache.get_results("c") is not None
+
+        time.sleep(0.1)
+        assert cache.get_results("c") is None  # Expired
+
+    def test_top_k_is_part_of_the_key(self, version):
+        cache = RetrievalCache(maxsize=8, ttl_seconds=60, version=version)
+        inner, embed_model = FakeRetriever(), make_embed_model()
+
+        CachedRetriever(inner, embed_model, top_k=3, cache=cache).retrieve("heapify")
+        CachedRetriever(inner, embed_model, top_k=5, cache=cache).retrieve("heapify")
+
+        assert inner.calls == 2
+        assert embed_model.get_query_embedding.call_count == 1
+
+    def test_query_embeddings_batch_only_misses(self, version):
+        cache = RetrievalCache(maxsize=8, ttl_seconds=60, version=version)
+        embed_model = make_embed_model()
+        embed_model.get_text_embedding_batch.return_value = [[0.3, 0.4], [0.5, 0.6]]
+
+        cache.get_query_embedding(embed_model, "What is heapify?")
+        embeddings = cache.get_query_embeddings(embed_model, ["what is heapify", "heap sort", "binary heap"])
+
+        assert embeddings == [[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]]
+        embed_model.get_text_embedding_batch.assert_called_once_with(["heap sort", "binary heap"])
+        assert cache.get_query_embedding(embed_model, "Heap sort") == [0.3, 0.4]
+
+    def test_normalize_query(self):
+        assert normalize_query("  What  is a\nHEAP?? ") == "what is a heap"
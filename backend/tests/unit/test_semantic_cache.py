@@ -0,0 +1,93 @@
+"""
+Unit tests for the semantic answer cache
+"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.agentic_rag import AgenticRAGService
+from app.services.collection_version import CollectionVersion, bump_collection_version
+from app.services.semantic_cache import SemanticCache, replay_tokens
+
+HEAP = [1.0, 0.0, 0.0]
+HEAP_PARAPHRASE = [0.99, 0.05, 0.0]
+RECURSION = [0.0, 1.0, 0.0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    version = CollectionVersion(str(tmp_path / "collection_version.json"))
+    return SemanticCache(str(tmp_path / "semantic_cache.json"), max_entries=2, threshold=0.95,
+                         snapshot_interval=0, version=version)
+
+
+@pytest.mark.unit
+class TestSemanticCache:
+    """Tests for similarity lookup, eviction and persistence"""
+
+    def test_paraphrase_hits_and_unrelated_question_misses(self, cache):
+        cache.store("agentic", "What is a heap?", HEAP, {"answer": "A heap is..."})
+
+        assert cache.lookup("agentic", HEAP_PARAPHRASE) == {"answer": "A heap is..."}
+        assert cache.lookup("agentic", RECURSION) is None
+        assert cache.lookup("simple", HEAP) is None  # Namespaced per endpoint family
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+    def test_least_frequently_used_entry_is_evicted(self, cache):
+        cache.store("agentic", "heap", HEAP, {"answer": "heap"})
+        cache.store("agentic", "recursion", RECURSION, {"answer": "recursion"})
+        cache.lookup("agentic", HEAP)
+
+        cache.store("agentic", "tuples", [0.0, 0.0, 1.0], {"answer": "tuples"})
+
+        assert cache.lookup("agentic", HEAP) is not None
+        assert cache.lookup("agentic", RECURSION) is None
+        assert cache.stats()["evictions"] == 1
+
+    def test_snapshot_roundtrip_and_version_invalidation(self, cache, tmp_path):
+        cache.store("agentic", "heap", HEAP, {"answer": "heap"})
+        cache.save()
+
+        restored = SemanticCache(str(cache.path), version=cache._version_reader).load()
+        assert restored.lookup("agentic", HEAP) == {"answer": "heap"}
+
+        bump_collection_version(str(cache._version_reader.path))
+        assert restored.lookup("agentic", HEAP) is None
+        assert restored.stats()["entries"] == 0
+
+    def test_replay_tokens_preserve_text(self):
+        answer = "A heap is\na complete  binary tree."
+        assert "".join(replay_tokens(answer)) == answer
+
+
+@pytest.mark.unit
+class TestSemanticCacheStreaming:
+    """Tests for cached answers replayed over the streaming protocol"""
+
+    def test_cache_hit_replays_tokens_without_llm(self, cache):
+        cache.store("agentic", "What is a heap?", HEAP, {
+            "answer": "A heap is a tree.", "sources": [], "num_sources": 0,
+            "workflow_path": "retrieve → grade_documents → generate",
+            "rewrites_used": 0, "was_rewritten": False
+        })
+        service = AgenticRAGService.__new__(AgenticRAGService)
+        service.llm = MagicMock()
+        service.retrieval_graph = MagicMock()
+
+        async def collect():
+            return [event async for event in service.query_stream("what's a heap")]
+
+        with patch("app.services.agentic_rag.settings.semantic_cache_enabled", True), \
+                patch("app.services.agentic_rag.embed_question", return_value=HEAP_PARAPHRASE), \
+                patch("app.services.agentic_rag.semantic_cache", cache):
+            events = asyncio.run(collect())
+
+        tokens = "".join(e["content"] for e in events if e["type"] == "token")
+        assert tokens == "A heap is a tree."
+        assert events[-1]["type"] == "complete"
+        assert events[-1]["question"] == "what's a heap"
+        assert events[-1]["workflow_path"] == "semantic_cache"
+        service.llm.astream_complete.assert_not_called()
+        service.retrieval_graph.astream.assert_not_called()